@@ -0,0 +1,412 @@
+"""
+A stand-in for the maya modules used by quicksearch, backed by a synthetic scene,
+so that search models can be benchmarked outside of maya.
+
+Only the commands and OpenMaya classes that quicksearch uses are implemented,
+and scene callbacks are never called. Use `install` before importing any
+quicksearch module that imports maya.
+"""
+
+import itertools
+import random
+import sys
+import types
+
+
+__all__ = [
+    'install',
+    'SyntheticScene',
+]
+
+
+# the types each node type inherits from, including itself,
+# in the order `nodeType(inherited=True)` returns them
+NODE_TYPE_INHERITANCE = {
+    'node': ['node'],
+    'containerBase': ['node', 'containerBase'],
+    'entity': ['node', 'containerBase', 'entity'],
+    'dagNode': ['node', 'containerBase', 'entity', 'dagNode'],
+    'transform': ['node', 'containerBase', 'entity', 'dagNode', 'transform'],
+    'joint': ['node', 'containerBase', 'entity', 'dagNode', 'transform', 'joint'],
+    'ikHandle': ['node', 'containerBase', 'entity', 'dagNode', 'transform', 'ikHandle'],
+    'shape': ['node', 'containerBase', 'entity', 'dagNode', 'shape'],
+    'geometryShape': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'geometryShape'],
+    'deformableShape': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'geometryShape',
+                        'deformableShape'],
+    'controlPoint': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'geometryShape',
+                     'deformableShape', 'controlPoint'],
+    'surfaceShape': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'geometryShape',
+                     'deformableShape', 'controlPoint', 'surfaceShape'],
+    'mesh': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'geometryShape',
+             'deformableShape', 'controlPoint', 'surfaceShape', 'mesh'],
+    'curveShape': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'geometryShape',
+                   'deformableShape', 'controlPoint', 'curveShape'],
+    'nurbsCurve': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'geometryShape',
+                   'deformableShape', 'controlPoint', 'curveShape', 'nurbsCurve'],
+    'camera': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'camera'],
+    'light': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'light'],
+    'pointLight': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'light', 'pointLight'],
+    'locator': ['node', 'containerBase', 'entity', 'dagNode', 'shape', 'locator'],
+    'shadingDependNode': ['node', 'shadingDependNode'],
+    'lambert': ['node', 'shadingDependNode', 'lambert'],
+    'blinn': ['node', 'shadingDependNode', 'lambert', 'reflect', 'blinn'],
+    'reflect': ['node', 'shadingDependNode', 'lambert', 'reflect'],
+    'file': ['node', 'texture2d', 'file'],
+    'texture2d': ['node', 'texture2d'],
+    'objectSet': ['node', 'entity', 'objectSet'],
+    'shadingEngine': ['node', 'entity', 'objectSet', 'shadingEngine'],
+    'groupId': ['node', 'groupId'],
+    'geometryFilter': ['node', 'geometryFilter'],
+    'skinCluster': ['node', 'geometryFilter', 'skinCluster'],
+    'tweak': ['node', 'geometryFilter', 'tweak'],
+    'animCurve': ['node', 'animCurve'],
+    'animCurveTA': ['node', 'animCurve', 'animCurveTA'],
+    'animCurveTL': ['node', 'animCurve', 'animCurveTL'],
+    'animCurveTU': ['node', 'animCurve', 'animCurveTU'],
+    'multiplyDivide': ['node', 'multiplyDivide'],
+    'plusMinusAverage': ['node', 'plusMinusAverage'],
+    'decomposeMatrix': ['node', 'decomposeMatrix'],
+    'reference': ['node', 'reference'],
+    'time': ['node', 'time'],
+}
+
+ABSTRACT_NODE_TYPES = set([
+    'node', 'containerBase', 'entity', 'dagNode', 'shape', 'geometryShape', 'deformableShape',
+    'controlPoint', 'surfaceShape', 'curveShape', 'light', 'shadingDependNode', 'texture2d',
+    'geometryFilter', 'animCurve',
+])
+
+# `ls` boolean flags that filter by type, and the types they keep
+LS_TYPE_FLAGS = {
+    'cameras': ['camera'],
+    'dagObjects': ['dagNode'],
+    'geometry': ['geometryShape'],
+    'lights': ['light'],
+    'materials': ['lambert'],
+    'sets': ['objectSet'],
+    'shapes': ['shape'],
+    'textures': ['texture2d'],
+    'transforms': ['transform'],
+}
+
+SIDES = ['l', 'r', 'c']
+LIMBS = ['arm', 'leg', 'spine', 'neck', 'head', 'hand', 'foot', 'tail', 'finger', 'toe', 'wing', 'jaw']
+PROPS = ['chair', 'table', 'lamp', 'crate', 'barrel', 'door', 'window', 'rock', 'tree', 'fence']
+
+
+
+class SyntheticScene(object):
+    """
+    A generated scene of nodes that looks like a production shot.
+
+    Most nodes belong to referenced character rigs, each in its own namespace,
+    with deep joint chains, control hierarchies with curve shapes, skinned
+    meshes, and the deformer, utility and anim curve nodes that come with them.
+    Props and set dressing are referenced in their own namespaces, with
+    shallower hierarchies, and a few nodes are not in any namespace.
+    The same size and seed always generate the same scene.
+    """
+
+    def __init__(self, numNodes, seed=0):
+        """
+        Args:
+            numNodes : `int`
+                the approximate number of nodes to generate
+            seed : `int`
+                the seed for the random generator
+        """
+        self.numNodes = numNodes
+        self.seed = seed
+        # list of (long name, type) for all nodes
+        self.nodes = []
+        # mapping of namespaces to their nodes
+        self.namespaceNodes = {}
+        # long names of the currently selected nodes
+        self.selection = []
+        self._random = random.Random(seed)
+        self._generate()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _add(self, namespace, longName, nodeType):
+        node = (longName, nodeType)
+        self.nodes.append(node)
+        self.namespaceNodes.setdefault(namespace, []).append(node)
+        return longName
+
+    def _generate(self):
+        for name in ('time1', 'lambert1', 'initialShadingGroup', 'defaultLightSet'):
+            self._add('', name, {'time1': 'time', 'lambert1': 'lambert'}.get(name, 'objectSet'))
+        for camera in ('persp', 'top', 'front', 'side'):
+            transform = self._add('', '|' + camera, 'transform')
+            self._add('', '{0}|{1}Shape'.format(transform, camera), 'camera')
+        # characters take roughly 80% of the scene, props the rest
+        characterCount = itertools.count(1)
+        propCount = itertools.count(1)
+        while len(self.nodes) < self.numNodes:
+            if self._random.random() < 0.8:
+                self._generateCharacter('char{0:02d}'.format(next(characterCount)))
+            else:
+                prop = self._random.choice(PROPS)
+                self._generateProp('{0}{1:02d}'.format(prop, next(propCount)), prop)
+        self._generateSet()
+
+    def _generateCharacter(self, namespace):
+        rand = self._random
+        ns = namespace + ':'
+        self._add('', '{0}RN'.format(namespace), 'reference')
+        rig = self._add(namespace, '|{0}rig'.format(ns), 'transform')
+        skeleton = self._add(namespace, '{0}|{1}skeleton_grp'.format(rig, ns), 'transform')
+        controls = self._add(namespace, '{0}|{1}controls_grp'.format(rig, ns), 'transform')
+        geometry = self._add(namespace, '{0}|{1}geo_grp'.format(rig, ns), 'transform')
+        root = self._add(namespace, '{0}|{1}root_jnt'.format(skeleton, ns), 'joint')
+        rootCtrl = self._addControl(namespace, controls, '{0}root'.format(ns))
+        for limb in LIMBS:
+            for side in SIDES if limb not in ('spine', 'neck', 'head', 'tail', 'jaw') else ['c']:
+                # joint chains nest deeply, with a control hierarchy to drive them
+                length = rand.randint(3, 12)
+                parent = root
+                ctrlParent = rootCtrl
+                for i in range(length):
+                    name = '{0}{1}_{2}{3:02d}'.format(ns, side, limb, i + 1)
+                    parent = self._add(namespace, '{0}|{1}_jnt'.format(parent, name), 'joint')
+                    if i % 2 == 0:
+                        ctrlParent = self._addControl(namespace, ctrlParent, name + '_fk')
+                self._addControl(namespace, controls, '{0}{1}_{2}_ik'.format(ns, side, limb))
+                self._add(namespace, '{0}|{1}{2}_{3}_ikHandle'.format(rootCtrl, ns, side, limb), 'ikHandle')
+                for i in range(rand.randint(1, 4)):
+                    self._add(namespace, '{0}{1}_{2}_md{3}'.format(ns, side, limb, i + 1), 'multiplyDivide')
+                    self._add(namespace, '{0}{1}_{2}_pma{3}'.format(ns, side, limb, i + 1), 'plusMinusAverage')
+                    self._add(namespace, '{0}{1}_{2}_dcm{3}'.format(ns, side, limb, i + 1), 'decomposeMatrix')
+        for i in range(rand.randint(5, 40)):
+            name = '{0}body_part{1:02d}'.format(ns, i + 1)
+            self._addMesh(namespace, geometry, name)
+            self._add(namespace, '{0}_skinCluster'.format(name), 'skinCluster')
+            self._add(namespace, '{0}_tweak'.format(name), 'tweak')
+            self._add(namespace, '{0}_groupId'.format(name), 'groupId')
+        for i in range(rand.randint(2, 8)):
+            self._add(namespace, '{0}material{1:02d}'.format(ns, i + 1), rand.choice(['lambert', 'blinn']))
+            self._add(namespace, '{0}material{1:02d}SG'.format(ns, i + 1), 'shadingEngine')
+            self._add(namespace, '{0}texture{1:02d}'.format(ns, i + 1), 'file')
+        self._add(namespace, '{0}all_ctrls_set'.format(ns), 'objectSet')
+
+    def _addControl(self, namespace, parent, name):
+        """
+        Add a control with offset and zero groups above it, as rigs usually have
+        """
+        offset = self._add(namespace, '{0}|{1}_offset'.format(parent, name), 'transform')
+        zero = self._add(namespace, '{0}|{1}_zero'.format(offset, name), 'transform')
+        ctrl = self._add(namespace, '{0}|{1}_ctrl'.format(zero, name), 'transform')
+        self._add(namespace, '{0}|{1}_ctrlShape'.format(ctrl, name), 'nurbsCurve')
+        for axis in 'xyz':
+            self._add(namespace, '{0}_ctrl_rotate{1}'.format(name, axis.upper()), 'animCurveTA')
+            self._add(namespace, '{0}_ctrl_translate{1}'.format(name, axis.upper()), 'animCurveTL')
+        return ctrl
+
+    def _addMesh(self, namespace, parent, name):
+        transform = self._add(namespace, '{0}|{1}'.format(parent, name), 'transform')
+        self._add(namespace, '{0}|{1}Shape'.format(transform, name), 'mesh')
+        self._add(namespace, '{0}|{1}ShapeOrig'.format(transform, name), 'mesh')
+        return transform
+
+    def _generateProp(self, namespace, prop):
+        rand = self._random
+        ns = namespace + ':'
+        self._add('', '{0}RN'.format(namespace), 'reference')
+        root = self._add(namespace, '|{0}{1}'.format(ns, prop), 'transform')
+        ctrl = self._addControl(namespace, root, '{0}{1}_main'.format(ns, prop))
+        geometry = self._add(namespace, '{0}|{1}geo_grp'.format(ctrl, ns), 'transform')
+        for i in range(rand.randint(2, 30)):
+            self._addMesh(namespace, geometry, '{0}{1}_part{2:02d}'.format(ns, prop, i + 1))
+        self._add(namespace, '{0}{1}_mat'.format(ns, prop), 'lambert')
+        self._add(namespace, '{0}{1}_matSG'.format(ns, prop), 'shadingEngine')
+
+    def _generateSet(self):
+        env = self._add('', '|env_grp', 'transform')
+        for i in range(max(1, self.numNodes // 2000)):
+            self._addMesh('', env, 'ground{0:03d}'.format(i + 1))
+        self._add('', '|key_light', 'transform')
+        self._add('', '|key_light|key_lightShape', 'pointLight')
+
+    def getNamespaceNodes(self, namespace):
+        """
+        Return the (long name, type) of all nodes in a namespace and its children
+        """
+        prefix = namespace + ':'
+        result = []
+        for ns, nodes in self.namespaceNodes.items():
+            if ns == namespace or ns.startswith(prefix):
+                result.extend(nodes)
+        return result
+
+    def getNamespaces(self):
+        return sorted([ns for ns in self.namespaceNodes if ns])
+
+    def select(self, count, seed=0):
+        """
+        Select a random set of nodes, and return their long names
+        """
+        rand = random.Random(seed)
+        self.selection = [n[0] for n in rand.sample(self.nodes, min(count, len(self.nodes)))]
+        return self.selection
+
+
+
+class _FakeCmds(types.ModuleType):
+    """
+    The subset of maya.cmds used by quicksearch, over a synthetic scene
+    """
+
+    def __init__(self, scene):
+        super(_FakeCmds, self).__init__('maya.cmds')
+        # the scene that commands run on, can be replaced at any time
+        self.scene = scene
+        # the scene that node types were last mapped for, and the mapping
+        self._nodeTypesScene = None
+        self._nodeTypes = None
+
+    def _getNodeTypes(self):
+        if self._nodeTypesScene is not self.scene or len(self._nodeTypes) != len(self.scene.nodes):
+            self._nodeTypes = dict(self.scene.nodes)
+            self._nodeTypesScene = self.scene
+        return self._nodeTypes
+
+    def ls(self, *args, **kwargs):
+        showType = kwargs.pop('showType', kwargs.pop('st', False))
+        selection = kwargs.pop('selection', kwargs.pop('sl', False))
+        nodeTypes = self._getNodeTypes()
+        if selection:
+            nodes = [(n, nodeTypes.get(n, 'transform')) for n in self.scene.selection]
+        elif args and args[0] != '*':
+            names = args[0] if isinstance(args[0], (list, tuple)) else list(args)
+            nodes = [(n, nodeTypes[n]) for n in names if n in nodeTypes]
+        else:
+            nodes = self.scene.nodes
+        includeTypes = set(kwargs.get('type', None) or kwargs.get('typ', None) or [])
+        exactTypes = set(kwargs.get('exactType', None) or kwargs.get('et', None) or [])
+        excludeTypes = set(kwargs.get('excludeType', None) or kwargs.get('ext', None) or [])
+        for flag, flagTypes in LS_TYPE_FLAGS.items():
+            if kwargs.get(flag):
+                includeTypes.update(flagTypes)
+        if includeTypes or exactTypes or excludeTypes:
+            def isIncluded(nodeType):
+                inherited = NODE_TYPE_INHERITANCE.get(nodeType, [nodeType])
+                if (includeTypes or exactTypes) and not (
+                        nodeType in exactTypes or includeTypes.intersection(inherited)):
+                    return False
+                return not excludeTypes.intersection(inherited)
+            nodes = [n for n in nodes if isIncluded(n[1])]
+        if kwargs.get('assemblies'):
+            nodes = [n for n in nodes if n[0].count('|') == 1]
+        if kwargs.get('referencedNodes'):
+            nodes = [n for n in nodes if ':' in n[0]]
+        result = []
+        if showType:
+            for name, nodeType in nodes:
+                result.append(name)
+                result.append(nodeType)
+        else:
+            result = [n[0] for n in nodes]
+        return result
+
+    def select(self, *args, **kwargs):
+        if kwargs.get('clear'):
+            self.scene.selection = []
+        elif args:
+            names = args[0] if isinstance(args[0], (list, tuple)) else list(args)
+            self.scene.selection = list(names)
+
+    def allNodeTypes(self, includeAbstract=False):
+        return ['{0} (abstract)'.format(t) if t in ABSTRACT_NODE_TYPES else t
+                for t in sorted(NODE_TYPE_INHERITANCE) if includeAbstract or t not in ABSTRACT_NODE_TYPES]
+
+    def nodeType(self, node, inherited=False, isTypeName=False):
+        nodeType = node if isTypeName else self._getNodeTypes()[node]
+        if inherited:
+            return list(NODE_TYPE_INHERITANCE.get(nodeType, [nodeType]))
+        return nodeType
+
+    def namespaceInfo(self, namespace, **kwargs):
+        return [n[0] for n in self.scene.getNamespaceNodes(namespace.lstrip(':'))]
+
+    def referenceQuery(self, referenceNode, namespace=False, nodes=False, **kwargs):
+        refNamespace = referenceNode[:-2] if referenceNode.endswith('RN') else ''
+        if namespace:
+            return ':' + refNamespace
+        if nodes:
+            return [n[0] for n in self.scene.getNamespaceNodes(refNamespace)]
+
+    def about(self, version=False, apiVersion=False, **kwargs):
+        if apiVersion:
+            return 20240000
+        return '2024'
+
+    def internalVar(self, **kwargs):
+        return ''
+
+
+
+class _CallbackMessage(object):
+    """
+    Stands in for an OpenMaya message class. Adding a callback returns
+    a new callback id, but no callbacks are ever called.
+    """
+
+    _ids = itertools.count(1)
+
+    def __getattr__(self, name):
+        if name.startswith('add'):
+            return lambda *args, **kwargs: next(self._ids)
+        if name.startswith('remove'):
+            return lambda *args, **kwargs: None
+        if name.startswith('k'):
+            return hash(name) & 0xffff
+        raise AttributeError(name)
+
+
+def _createOpenMaya():
+    om = types.ModuleType('maya.api.OpenMaya')
+    for name in ('MMessage', 'MSceneMessage', 'MDGMessage', 'MDagMessage',
+                 'MNodeMessage', 'MEventMessage', 'MCommandMessage', 'MFn'):
+        setattr(om, name, _CallbackMessage())
+
+    class MObject(object):
+        pass
+
+    om.MObject = MObject
+    return om
+
+
+def install(scene):
+    """
+    Install fake maya modules backed by a scene into `sys.modules`,
+    replacing any previously installed ones.
+
+    Returns:
+        `module`
+            the fake maya.cmds module, whose scene can be replaced with `cmds.scene`
+    """
+    maya = types.ModuleType('maya')
+    cmds = _FakeCmds(scene)
+    mel = types.ModuleType('maya.mel')
+    mel.eval = lambda command: None
+    utils = types.ModuleType('maya.utils')
+    # there is no idle queue, run deferred functions immediately
+    utils.executeDeferred = lambda func, *args: func(*args)
+    api = types.ModuleType('maya.api')
+    om = _createOpenMaya()
+    maya.cmds = cmds
+    maya.mel = mel
+    maya.utils = utils
+    maya.api = api
+    api.OpenMaya = om
+    sys.modules.update({
+        'maya': maya,
+        'maya.cmds': cmds,
+        'maya.mel': mel,
+        'maya.utils': utils,
+        'maya.api': api,
+        'maya.api.OpenMaya': om,
+    })
+    return cmds
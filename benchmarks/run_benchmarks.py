@@ -0,0 +1,255 @@
+"""
+Headless benchmarks for the node search model, run against synthetic scenes
+using the fake maya modules in `fakemaya`.
+
+Requires a Qt binding and Qt.py, but not maya. Qt runs with the offscreen
+platform, so no display is needed. Results are written as json, and can be
+compared with the results of an earlier run.
+
+    python run_benchmarks.py --sizes 10000,100000 --output results.json
+    python run_benchmarks.py --output new.json --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(BENCHMARKS_DIR, os.pardir, 'src', 'quicksearch', 'scripts', 'quicksearch')
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.normpath(SCRIPTS_DIR))
+
+import fakemaya
+
+
+# the version of the results file format
+RESULTS_VERSION = 1
+
+DEFAULT_SIZES = [10000, 100000, 500000, 2000000]
+
+# queries typed one character at a time, covering plain, namespaced,
+# hierarchy scoped, compiled and flag queries
+KEYSTROKE_QUERIES = [
+    'l_arm_fk_ctrl',
+    'char03:r_leg',
+    'rig|*|root_jnt',
+    'ctrl !fk !offset',
+    'hand -type joint',
+    'part -ns char02',
+]
+
+# number of rows displayed when scrolling through results
+SCROLL_ROWS = 2000
+
+# number of selected nodes when syncing the selection
+SELECTION_SIZES = [10, 1000]
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+def timeCall(func, *args):
+    """
+    Return the time in seconds taken to call a function
+    """
+    startTime = _timer()
+    func(*args)
+    return _timer() - startTime
+
+
+def summarize(samples):
+    """
+    Return a dict of statistics of a list of times in seconds
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+    if not count:
+        return dict(count=0)
+    return dict(
+        count=count,
+        total=sum(ordered),
+        mean=sum(ordered) / count,
+        min=ordered[0],
+        median=ordered[count // 2],
+        p95=ordered[min(count - 1, int(count * 0.95))],
+        max=ordered[-1],
+    )
+
+
+
+class SceneBenchmark(object):
+    """
+    Runs every benchmark against a single synthetic scene
+    """
+
+    def __init__(self, scene, cmds, repeat=3, parallel=True):
+        self.scene = scene
+        self.cmds = cmds
+        self.repeat = repeat
+        self.parallel = parallel
+        # mapping of benchmark names to lists of times in seconds
+        self.samples = {}
+
+    def record(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def createModel(self):
+        """
+        Return a new node search model over the scene, that searches
+        synchronously so that each call includes the full search
+        """
+        from engine import MayaNodeSource, NodeSearchEngine
+        from nodecache import NodeEventSource
+        from nodes import NodeSearchModel
+
+        class BenchmarkNodeSource(MayaNodeSource):
+            def getNewEventSource(self): # override
+                # scene events are emitted directly by the benchmarks
+                return NodeEventSource()
+
+        class BenchmarkNodeSearchModel(NodeSearchModel):
+            def getNewSearchEngine(self): # override
+                return NodeSearchEngine(BenchmarkNodeSource())
+
+        model = BenchmarkNodeSearchModel()
+        model.asyncSearch = False
+        if not self.parallel:
+            model.engine.parallelMatchingMinNodes = None
+        return model
+
+    def run(self):
+        for i in range(self.repeat):
+            model = self.createModel()
+            self.runUpdateCachedNodeList(model)
+            self.runKeystrokes(model)
+            self.runScrolling(model)
+            self.runSelectionSync(model)
+            model.engine.close()
+        return self.samples
+
+    def runUpdateCachedNodeList(self, model):
+        self.record('updateCachedNodeList.cold', timeCall(model.updateNodeTable))
+        self.record('updateCachedNodeList.unchanged', timeCall(model.updateNodeTable))
+        # reloading a reference replaces the nodes of its namespace
+        namespace = self.scene.getNamespaces()[0]
+        eventSource = model.engine.nodeCache.eventSource
+        eventSource.emitNamespaceReset(namespace, self.scene.getNamespaceNodes(namespace))
+        self.record('updateCachedNodeList.namespaceReset', timeCall(model.updateNodeTable))
+
+    def runKeystrokes(self, model):
+        for query in KEYSTROKE_QUERIES:
+            # start each query from a clean state, as if the window was just opened
+            model.resultsCache.clear()
+            model.engine.clearLastSearch()
+            model.setQuery('')
+            for i in range(1, len(query) + 1):
+                seconds = timeCall(model.setQuery, query[:i])
+                self.record('setQuery.keystroke', seconds)
+                self.record('setQuery.keystroke[{0}]'.format(query), seconds)
+        model.setQuery('')
+
+    def runScrolling(self, model):
+        # ranked and streamed results
+        for query in ('ctrl', 'c'):
+            model.setQuery(query)
+            parent = model.parent()
+            while model.rowCount() < SCROLL_ROWS and model.canFetchMore(parent):
+                seconds = timeCall(model.fetchMore, parent)
+                self.record('fetchMore', seconds)
+                self.record('fetchMore[{0}]'.format(query), seconds)
+        model.setQuery('')
+
+    def runSelectionSync(self, model):
+        from nodes import NodeSelectionModel
+        selectionModel = NodeSelectionModel(model)
+        model.setQuery('ctrl')
+        for count in SELECTION_SIZES:
+            self.scene.select(count)
+            # half of the selection is in the displayed results
+            displayed = [model.getResultNode(row) for row in range(min(count // 2, model.rowCount()))]
+            self.scene.selection = displayed + self.scene.selection[len(displayed):]
+            selectionModel.clearSceneSelection()
+            self.record('selectionSync.fromScene[{0}]'.format(count), timeCall(selectionModel.updateSelection))
+            self.record('selectionSync.toScene[{0}]'.format(count), timeCall(selectionModel.updateSceneSelection))
+        model.setQuery('')
+        selectionModel.deleteLater()
+
+
+def getEnvironment():
+    from Qt import QtCore
+    import Qt
+    return dict(
+        python=platform.python_version(),
+        platform=platform.platform(),
+        qtBinding=Qt.__binding__,
+        qtVersion=QtCore.qVersion(),
+        time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+    )
+
+
+def compareResults(results, baseline):
+    """
+    Print the median time of each benchmark compared to a baseline run
+    """
+    baselineMedians = dict(((r['size'], r['benchmark']), r.get('median')) for r in baseline['results'])
+    print('{0:>9}  {1:<48} {2:>10} {3:>10} {4:>7}'.format('size', 'benchmark', 'baseline', 'median', 'ratio'))
+    for result in results['results']:
+        baselineMedian = baselineMedians.get((result['size'], result['benchmark']))
+        median = result.get('median')
+        if not baselineMedian or median is None:
+            continue
+        print('{0:>9}  {1:<48} {2:>9.2f}ms {3:>9.2f}ms {4:>6.2f}x'.format(
+            result['size'], result['benchmark'], baselineMedian * 1000, median * 1000, median / baselineMedian))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sizes', default=','.join([str(s) for s in DEFAULT_SIZES]),
+                        help='comma separated numbers of nodes in each synthetic scene')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of times to run the benchmarks for each scene')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for generating the synthetic scenes')
+    parser.add_argument('--no-parallel', dest='parallel', action='store_false',
+                        help='never search in worker processes')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='path of the json results file to write')
+    parser.add_argument('--compare',
+                        help='path of an earlier json results file to compare with')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    # install the fake maya modules before quicksearch imports the real ones
+    cmds = fakemaya.install(fakemaya.SyntheticScene(0, args.seed))
+    from Qt import QtWidgets
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    results = dict(version=RESULTS_VERSION, environment=getEnvironment(), sizes=sizes, results=[])
+    for size in sizes:
+        startTime = _timer()
+        scene = fakemaya.SyntheticScene(size, args.seed)
+        cmds.scene = scene
+        print('{0} nodes, generated in {1:.2f}s'.format(len(scene), _timer() - startTime))
+        samples = SceneBenchmark(scene, cmds, args.repeat, args.parallel).run()
+        for name in sorted(samples):
+            result = dict(size=size, nodes=len(scene), benchmark=name, unit='s')
+            result.update(summarize(samples[name]))
+            results['results'].append(result)
+            print('  {0:<48} median {1:8.2f}ms  p95 {2:8.2f}ms  max {3:8.2f}ms'.format(
+                name, result['median'] * 1000, result['p95'] * 1000, result['max'] * 1000))
+
+    with open(args.output, 'w') as fp:
+        json.dump(results, fp, indent=2, sort_keys=True)
+    print('Results written to {0}'.format(args.output))
+
+    if args.compare:
+        with open(args.compare) as fp:
+            compareResults(results, json.load(fp))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+
+import threading
+
+from nodetable import getNamespace
+
+
+__all__ = [
+    'AttributeIndex',
+    'listMayaNodesWithAttribute',
+    'listMayaTypeAttributes',
+]
+
+
+def listMayaTypeAttributes(nodeType):
+    """
+    Return the long and short names of all static attributes of a node type
+    """
+    import maya.api.OpenMaya as om
+    try:
+        attributes = om.MNodeClass(nodeType).getAttributes()
+    except (RuntimeError, TypeError, ValueError):
+        return []
+    names = []
+    for i in range(len(attributes)):
+        fnAttr = om.MFnAttribute(attributes[i])
+        names.append(fnAttr.name)
+        names.append(fnAttr.shortName)
+    return names
+
+
+def listMayaNodesWithAttribute(name, nodeTypes=None, nodes=None):
+    """
+    Return the long names of all nodes that have an attribute, with a single `ls`
+    of the whole scene, or of the given nodes. Attribute names are matched as maya matches them.
+
+    Args:
+        name : `str`
+            the long or short name of the attribute
+        nodeTypes : `list` of `str`
+            if given, only list nodes of these types
+        nodes : `list` of `str`
+            if given, only check these nodes instead of the whole scene
+    """
+    import maya.cmds as cmds
+    kwargs = {'type': list(nodeTypes)} if nodeTypes else {}
+    if nodes is not None:
+        patterns = ['{0}.{1}'.format(n, name) for n in nodes]
+        if not patterns:
+            return []
+    else:
+        patterns = '*.' + name
+        kwargs['recursive'] = True
+    try:
+        return cmds.ls(patterns, objectsOnly=True, long=True, **kwargs) or []
+    except (RuntimeError, TypeError, ValueError):
+        return []
+
+
+
+class AttributeIndex(object):
+    """
+    An index of which nodes have an attribute, so that searching for nodes
+    with an attribute doesn't need a command per node.
+
+    Static attributes are the same for every node of a type, so they are
+    indexed once per node type, the first time a node of that type is checked.
+    Nodes of the other types that have the attribute dynamically are listed
+    with a single scene wide query per attribute name, the first time the
+    attribute is searched. The cached nodes are kept up to date as nodes
+    change, see the `on...` methods: removed and renamed nodes are updated
+    in place, and added nodes are only checked for the cached attributes
+    the next time they are needed, with a query of just those nodes.
+    Maya only reports attribute changes per node, so dynamic attributes added,
+    removed or renamed on any node still list the nodes again.
+
+    Static attribute names are matched case insensitively, by long or short name.
+    """
+
+    # when more nodes than this were added since they were last checked, the
+    # nodes with each cached attribute are listed again instead of checking them
+    maxCheckedNodes = 1000
+
+    def __init__(self, listTypeAttributes, listNodesWithAttribute):
+        """
+        Args:
+            listTypeAttributes : `callable`
+                returns the names of all static attributes of a node type
+            listNodesWithAttribute : `callable`
+                returns the long names of all nodes of a list of types that have an attribute,
+                checking only a list of nodes if one is given, see `NodeSource.listNodesWithAttribute`
+        """
+        self.listTypeAttributes = listTypeAttributes
+        self.listNodesWithAttribute = listNodesWithAttribute
+        # incremented every time any nodes or attributes change
+        self.generation = 0
+        # mapping of node types to frozensets of their lower case attribute names
+        self._typeAttributes = {}
+        # mapping of (attribute name, node types) to frozensets of the
+        # long names of the nodes of those types that have the attribute
+        self._attributeNodes = {}
+        # mapping of the long names of nodes added since the cached attribute
+        # nodes were listed to their types, which are checked when next needed
+        self._addedNodes = {}
+        # the node table of the last query, and the rows of recent
+        # queries on that table by (attributes, generation)
+        self._rowsTable = None
+        self._rowsCache = {}
+        # events are received on the main thread while rows may be read from a worker
+        self._lock = threading.RLock()
+
+    def getTypeAttributes(self, nodeType):
+        """
+        Return a frozenset of the lower case names of all static attributes of a node type
+        """
+        attributes = self._typeAttributes.get(nodeType)
+        if attributes is None:
+            attributes = frozenset([a.lower() for a in self.listTypeAttributes(nodeType) or []])
+            self._typeAttributes[nodeType] = attributes
+        return attributes
+
+    def _getMissingTypes(self, nodeTable, attribute):
+        """
+        Return a sorted tuple of the types in a node table that don't have an attribute statically
+        """
+        lowerName = attribute.lower()
+        return tuple(sorted([t for t in nodeTable.getRowsByType() if lowerName not in self.getTypeAttributes(t)]))
+
+    def isListed(self, nodeTable, attribute):
+        """
+        Return True if the rows of an attribute can be found without listing
+        any nodes from the source, because no node type in the table lacks it
+        statically, or because its nodes have already been listed
+        """
+        nodeTypes = self._getMissingTypes(nodeTable, attribute)
+        return not nodeTypes or (attribute, nodeTypes) in self._attributeNodes
+
+    def getNodesWithAttribute(self, attribute, nodeTypes):
+        """
+        Return a frozenset of the long names of all nodes of the given types
+        that have an attribute, listing them if they are not cached yet.
+        Must be called on the main thread, since it may use maya commands.
+        """
+        key = (attribute, tuple(nodeTypes))
+        with self._lock:
+            if self._addedNodes:
+                self._checkAddedNodes()
+            nodes = self._attributeNodes.get(key)
+            if nodes is None:
+                nodes = frozenset(self.listNodesWithAttribute(attribute, list(nodeTypes)) or [])
+                self._attributeNodes[key] = nodes
+            return nodes
+
+    def getRows(self, nodeTable, attributes, unlisted=()):
+        """
+        Return the sorted rows of all nodes in a node table that have every one
+        of the given attributes. The table must have node types. Only nodes whose
+        type lacks an attribute statically are listed from the source.
+        Must be called on the main thread, since it may use maya commands.
+
+        Args:
+            nodeTable : `NodeTable`
+                the table to search
+            attributes : `list` of `str`
+                attribute long or short names
+            unlisted : `list` of `str`
+                attributes whose nodes are not listed if they are not cached yet,
+                only nodes whose type has them statically match them
+        """
+        key = (frozenset(attributes), frozenset(unlisted), self.generation)
+        if nodeTable is not self._rowsTable:
+            # don't keep old tables alive
+            self._rowsTable = nodeTable
+            self._rowsCache = {}
+        rows = self._rowsCache.get(key)
+        if rows is not None:
+            return rows
+        rowSet = None
+        for attribute in set(attributes):
+            lowerName = attribute.lower()
+            nodeTypes = self._getMissingTypes(nodeTable, attribute)
+            attributeRows = set()
+            for nodeType, typeRows in nodeTable.getRowsByType().items():
+                if lowerName in self.getTypeAttributes(nodeType):
+                    attributeRows.update(typeRows)
+            if nodeTypes and (attribute not in unlisted or (attribute, nodeTypes) in self._attributeNodes):
+                for longName in self.getNodesWithAttribute(attribute, nodeTypes):
+                    row = nodeTable.getRow(longName)
+                    if row is not None:
+                        attributeRows.add(row)
+            rowSet = attributeRows if rowSet is None else rowSet.intersection(attributeRows)
+        rows = sorted(rowSet or [])
+        self._rowsCache[key] = rows
+        return rows
+
+    def _checkAddedNodes(self):
+        """
+        Add the nodes added since they were last checked to
+        the cached nodes of each attribute that they have
+        """
+        addedNodes, self._addedNodes = self._addedNodes, {}
+        if len(addedNodes) > self.maxCheckedNodes:
+            # one scene wide query per attribute is faster
+            self._attributeNodes = {}
+            return
+        for key, nodes in list(self._attributeNodes.items()):
+            attribute, nodeTypes = key
+            nodeTypeSet = set(nodeTypes)
+            candidates = [n for n, nodeType in addedNodes.items() if nodeType in nodeTypeSet]
+            if candidates:
+                found = self.listNodesWithAttribute(attribute, list(nodeTypes), candidates)
+                if found:
+                    self._attributeNodes[key] = nodes.union(found)
+
+    def _updateNodes(self, update):
+        """
+        Replace the cached nodes of each attribute with the result of calling
+        `update` with them, which returns None if they have not changed
+        """
+        for key, nodes in list(self._attributeNodes.items()):
+            newNodes = update(nodes)
+            if newNodes is not None:
+                self._attributeNodes[key] = newNodes
+
+    def _setChanged(self, clear=True):
+        with self._lock:
+            if clear:
+                self._attributeNodes = {}
+                self._addedNodes = {}
+            self.generation += 1
+            self._rowsCache = {}
+
+    def reset(self):
+        """
+        Clear all cached attributes, e.g. after plugins have registered new node types
+        """
+        with self._lock:
+            self._typeAttributes = {}
+            self._setChanged()
+
+    def onSceneReset(self):
+        self._setChanged()
+
+    def onAttributesChanged(self):
+        """
+        Called when dynamic attributes of any nodes may have been added, removed or renamed
+        """
+        self._setChanged()
+
+    def onNodesAdded(self, nodes):
+        # new nodes may have been duplicated or imported with dynamic attributes
+        with self._lock:
+            if self._attributeNodes:
+                self._addedNodes.update(nodes)
+            self._setChanged(False)
+
+    def onNodesRemoved(self, names):
+        names = frozenset(names)
+        with self._lock:
+            for name in names:
+                self._addedNodes.pop(name, None)
+            self._updateNodes(lambda nodes: nodes.difference(names) if not nodes.isdisjoint(names) else None)
+            self._setChanged(False)
+
+    def onNodeRenamed(self, oldName, newName):
+        # descendants of renamed dag nodes are renamed too
+        prefix = oldName + '|'
+
+        def rename(name):
+            if name == oldName:
+                return newName
+            if name.startswith(prefix):
+                return newName + name[len(oldName):]
+            return name
+
+        def renameNodes(nodes):
+            renamed = frozenset([rename(n) for n in nodes])
+            return renamed if renamed != nodes else None
+
+        with self._lock:
+            self._addedNodes = dict([(rename(n), t) for n, t in self._addedNodes.items()])
+            self._updateNodes(renameNodes)
+            self._setChanged(False)
+
+    def onNamespaceReset(self, namespace, nodes):
+        prefix = namespace + ':'
+
+        def isInNamespace(name):
+            nodeNamespace = getNamespace(name)
+            return nodeNamespace == namespace or nodeNamespace.startswith(prefix)
+
+        def removeNodes(nodes):
+            removed = [n for n in nodes if isInNamespace(n)]
+            return nodes.difference(removed) if removed else None
+
+        with self._lock:
+            self._updateNodes(removeNodes)
+            self._addedNodes = dict([(n, t) for n, t in self._addedNodes.items() if not isInNamespace(n)])
+            if self._attributeNodes:
+                self._addedNodes.update(nodes)
+            self._setChanged(False)
@@ -0,0 +1,97 @@
+
+from collections import OrderedDict
+
+
+__all__ = [
+    'LRUCache',
+]
+
+
+
+class LRUCache(object):
+    """
+    A cache that discards the least recently used items once
+    the total cost of all items exceeds a maximum.
+
+    The cost of each item is given by `getCost`, which defaults to 1 per item,
+    making `maxCost` the maximum number of items. Keeps track of hits and misses.
+    """
+
+    def __init__(self, maxCost, getCost=None):
+        # the maximum total cost of all cached items
+        self.maxCost = maxCost
+        # function that returns the cost of an item
+        self.getCost = getCost if getCost is not None else (lambda value: 1)
+        # the current total cost of all cached items
+        self.totalCost = 0
+        # the number of successful and failed lookups
+        self.hits = 0
+        self.misses = 0
+        # mapping of keys to (value, cost), in order of least to most recently used
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for a key, or `default` if it is not cached
+        """
+        item = self._items.pop(key, None)
+        if item is None:
+            self.misses += 1
+            return default
+        # re-insert to mark as most recently used
+        self._items[key] = item
+        self.hits += 1
+        return item[0]
+
+    def set(self, key, value):
+        """
+        Cache a value, discarding least recently used values if necessary.
+        Values that cost more than `maxCost` on their own are not cached.
+        """
+        self.remove(key)
+        cost = self.getCost(value)
+        if cost > self.maxCost:
+            return
+        self._items[key] = (value, cost)
+        self.totalCost += cost
+        self.trim()
+
+    def remove(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.totalCost -= item[1]
+
+    def trim(self):
+        """
+        Discard least recently used values until under the maximum cost
+        """
+        while self.totalCost > self.maxCost and self._items:
+            key = next(iter(self._items))
+            self.remove(key)
+
+    def clear(self):
+        """
+        Discard all cached values, does not reset the hit and miss counts
+        """
+        self._items.clear()
+        self.totalCost = 0
+
+    def getStats(self):
+        """
+        Return a dict of information about the cache usage
+        """
+        lookups = self.hits + self.misses
+        return dict(
+            count=len(self._items),
+            totalCost=self.totalCost,
+            maxCost=self.maxCost,
+            hits=self.hits,
+            misses=self.misses,
+            hitRate=float(self.hits) / lookups if lookups else 0.0,
+        )
@@ -0,0 +1,293 @@
+
+import hashlib
+import io
+import logging
+import os
+
+
+__all__ = [
+    'buildMayaMenus',
+    'CommandIndex',
+    'findMayaMenuItem',
+    'getMayaCacheKey',
+    'getMayaMenuItemId',
+    'listMayaCommands',
+]
+
+LOG = logging.getLogger(__name__)
+
+
+def getMayaCacheKey():
+    """
+    Return a string that changes whenever the set of available commands
+    may have changed, from the maya version, the loaded plugins,
+    the runtime commands and the labels of the main window menus.
+    """
+    import maya.cmds as cmds
+    items = [cmds.about(version=True), str(cmds.about(apiVersion=True))]
+    for plugin in sorted(cmds.pluginInfo(query=True, listPlugins=True) or []):
+        version = cmds.pluginInfo(plugin, query=True, version=True)
+        items.append('{0}={1}'.format(plugin, version))
+    items.extend(sorted(cmds.runTimeCommand(query=True, commandArray=True) or []))
+    # menus added by scripts, which are not part of any plugin
+    if cmds.window('MayaWindow', exists=True):
+        for menu in cmds.window('MayaWindow', query=True, menuArray=True) or []:
+            items.append(cmds.menu(menu, query=True, label=True) or '')
+    return hashlib.sha1('\n'.join(items).encode('utf-8')).hexdigest()
+
+
+def buildMayaMenus():
+    """
+    Build the items of every menu that is only built when it is first opened,
+    such as most menus of the main window, by running its post menu command
+    """
+    import maya.cmds as cmds
+    import maya.mel as mel
+    for menu in cmds.lsUI(menus=True, long=True) or []:
+        try:
+            if cmds.menu(menu, query=True, numberOfItems=True):
+                continue
+            command = cmds.menu(menu, query=True, postMenuCommand=True)
+            if callable(command):
+                command()
+            elif command:
+                mel.eval(command)
+        except Exception:
+            LOG.warning('Failed to build menu: {0}'.format(menu), exc_info=True)
+
+
+def getMayaMenuItemId(longName, labels=None):
+    """
+    Return an identifier of a menu item that is the same in every session, made of
+    the labels of its menus and itself, since the names of menu items are generated
+    when they are created. Windows and panels are identified by name.
+
+    Args:
+        longName : `str`
+            the long name of the menu item
+        labels : `dict`
+            if given, used to cache the labels of the parents of menu items by long name
+    """
+    import maya.cmds as cmds
+    segments = longName.split('|')
+    ids = []
+    for i in range(len(segments)):
+        path = '|'.join(segments[:i + 1])
+        label = labels.get(path) if labels is not None else None
+        if label is None:
+            if cmds.menuItem(path, exists=True):
+                label = cmds.menuItem(path, query=True, label=True) or ''
+            elif cmds.menu(path, exists=True):
+                label = cmds.menu(path, query=True, label=True) or ''
+            else:
+                label = segments[i]
+            # the identifier must fit in a single field of the cache file
+            label = ' '.join(label.replace('|', '/').split())
+            if labels is not None:
+                labels[path] = label
+        ids.append(label)
+    return '|'.join(ids)
+
+
+def _iterMayaMenuItems():
+    """
+    Yield the long name and label of every menu item that can be run
+    """
+    import maya.cmds as cmds
+    for name in cmds.lsUI(menuItems=True, long=True) or []:
+        try:
+            if (cmds.menuItem(name, query=True, divider=True) or cmds.menuItem(name, query=True, optionBox=True) or
+                    cmds.menuItem(name, query=True, subMenu=True)):
+                continue
+            label = cmds.menuItem(name, query=True, label=True)
+        except RuntimeError:
+            continue
+        if label:
+            yield name, label
+
+
+def findMayaMenuItem(menuItemId):
+    """
+    Return the long name of the menu item with an identifier, see `getMayaMenuItemId`,
+    building any menus that are not built yet if it is not found, or None
+    """
+    lastLabel = menuItemId.split('|')[-1]
+    for attempt in range(2):
+        labels = {}
+        for name, label in _iterMayaMenuItems():
+            if ' '.join(label.replace('|', '/').split()) == lastLabel and getMayaMenuItemId(name, labels) == menuItemId:
+                return name
+        if attempt == 0:
+            buildMayaMenus()
+
+
+def listMayaCommands():
+    """
+    Return a list of (kind, name, label) for all mel and python commands,
+    runtime commands and menu items. Slow, since every runtime command
+    and menu item is queried for its label, and any menus that are not
+    built yet are built. Menu items are named by their identifier, see
+    `getMayaMenuItemId`, and must be found with `findMayaMenuItem` to run them.
+    """
+    import maya.cmds as cmds
+    result = []
+    melCommands = set(cmds.help('*', list=True, language='mel') or [])
+    for name in sorted(melCommands):
+        result.append((CommandIndex.MEL, name, name))
+    for name in sorted(dir(cmds)):
+        if name not in melCommands and not name.startswith('_') and callable(getattr(cmds, name)):
+            result.append((CommandIndex.PYTHON, name, name))
+    for name in sorted(cmds.runTimeCommand(query=True, commandArray=True) or []):
+        try:
+            label = cmds.runTimeCommand(name, query=True, label=True) or name
+        except RuntimeError:
+            label = name
+        result.append((CommandIndex.RUNTIME, name, label))
+    buildMayaMenus()
+    labels = {}
+    menuItemIds = set()
+    for name, label in _iterMayaMenuItems():
+        menuItemId = getMayaMenuItemId(name, labels)
+        if menuItemId not in menuItemIds:
+            menuItemIds.add(menuItemId)
+            result.append((CommandIndex.MENU_ITEM, menuItemId, label))
+    return result
+
+
+
+class CommandIndex(object):
+    """
+    A persistent index of all commands that can be searched and run.
+
+    Collecting commands is slow, so the index is saved to a cache file.
+    The file starts with a format version and a cache key describing the maya
+    version, loaded plugins and menus, and is only rebuilt when either changes.
+    Menu items are stored by identifiers that are the same in every session,
+    see `getMayaMenuItemId`, since their names are generated.
+
+    File format, utf-8 text, one entry per line after the header:
+        quicksearch-command-index <format version>
+        <cache key>
+        <kind>\\t<name>\\t<label>
+    """
+
+    # the version of the cache file format, increment when changing the format
+    formatVersion = 2
+    # the first line of every cache file
+    magic = 'quicksearch-command-index'
+
+    # kinds of commands
+    MEL = 'mel'
+    PYTHON = 'python'
+    RUNTIME = 'runtime'
+    MENU_ITEM = 'menu'
+
+    def __init__(self, path, getCacheKey=None, listCommands=None):
+        """
+        Args:
+            path : `str`
+                the path of the cache file
+            getCacheKey : `callable`
+                returns a string that changes when the available commands change,
+                defaults to `getMayaCacheKey`
+            listCommands : `callable`
+                returns a list of (kind, name, label) for all commands,
+                defaults to `listMayaCommands`
+        """
+        self.path = path
+        self.getCacheKey = getCacheKey or getMayaCacheKey
+        self.listCommands = listCommands or listMayaCommands
+        # the cache key of the currently loaded index
+        self.cacheKey = None
+        # incremented every time the index is loaded or rebuilt
+        self.generation = 0
+        # lists of the kind, name and label of each entry
+        self._entries = self._splitEntries([])
+
+    def update(self):
+        """
+        Load the index from the cache file, or rebuild it if the cache file
+        is missing or out of date. Does nothing if the loaded index is current.
+
+        Returns:
+            `bool`
+                True if the index changed
+        """
+        cacheKey = self.getCacheKey()
+        if cacheKey == self.cacheKey:
+            return False
+        if not self._load(cacheKey):
+            self.rebuild(cacheKey)
+        return True
+
+    def rebuild(self, cacheKey=None):
+        """
+        Collect all commands and save them to the cache file
+        """
+        if cacheKey is None:
+            cacheKey = self.getCacheKey()
+        # tabs and newlines would break the format, they are never needed to find a command
+        commands = [(kind, name, ' '.join(label.split())) for kind, name, label in self.listCommands()]
+        self._write(cacheKey, commands)
+        self._entries = self._splitEntries(commands)
+        self.cacheKey = cacheKey
+        self.generation += 1
+
+    def _write(self, cacheKey, commands):
+        lines = ['{0} {1}'.format(self.magic, self.formatVersion), cacheKey]
+        for kind, name, label in commands:
+            lines.append('\t'.join([kind, name, label]))
+        dirName = os.path.dirname(self.path)
+        tempPath = self.path + '.tmp'
+        try:
+            if dirName and not os.path.isdir(dirName):
+                os.makedirs(dirName)
+            with io.open(tempPath, 'w', encoding='utf-8', newline='\n') as fp:
+                fp.write(u'\n'.join(lines) + u'\n')
+            # replace atomically so other maya sessions never read a partial file
+            if hasattr(os, 'replace'):
+                os.replace(tempPath, self.path)
+            else:
+                if os.path.isfile(self.path):
+                    os.remove(self.path)
+                os.rename(tempPath, self.path)
+        except (IOError, OSError) as e:
+            LOG.warning('Failed to write command index: {0}'.format(e))
+
+    def _load(self, cacheKey):
+        """
+        Read the cache file if it exists and matches the cache key.
+        Returns True if the index was loaded.
+        """
+        try:
+            with io.open(self.path, 'r', encoding='utf-8', newline='\n') as fp:
+                header = fp.readline().split()
+                fileKey = fp.readline().strip()
+                if header != [self.magic, str(self.formatVersion)] or fileKey != cacheKey:
+                    return False
+                commands = [line.rstrip('\n').split('\t') for line in fp]
+        except (IOError, OSError, UnicodeDecodeError):
+            # missing or unreadable file
+            return False
+        self._entries = self._splitEntries([c for c in commands if len(c) == 3])
+        self.cacheKey = cacheKey
+        self.generation += 1
+        return True
+
+    @staticmethod
+    def _splitEntries(commands):
+        return ([c[0] for c in commands], [c[1] for c in commands], [c[2] for c in commands])
+
+    def getEntries(self):
+        """
+        Return the kind, name and label of every command.
+        The returned lists must not be modified.
+
+        Returns:
+            `list` of `str`, `list` of `str`, `list` of `str`
+                kinds, names, labels
+        """
+        return self._entries
+
+    def __len__(self):
+        return len(self.getEntries()[0])
@@ -0,0 +1,239 @@
+
+import __main__
+import logging
+import os
+
+import maya.cmds as cmds
+import maya.mel as mel
+import maya.utils
+from Qt import QtCore, QtGui, QtWidgets
+
+from core import SearchModelBase, SearchWindowBase
+from core import maya_main_window
+from caching import LRUCache
+from commandindex import CommandIndex, findMayaMenuItem
+from matching import MatchStream, RankedResults, getResultsMemoryUsage
+from nodetable import NodeTable
+from queryplan import QueryCompiler
+
+LOG = logging.getLogger(__name__)
+
+
+def getInstance():
+    """
+    Return the persistent CommandSearchWindow, creating it if necessary
+    """
+    if CommandSearchWindow.instance is None:
+        CommandSearchWindow.instance = CommandSearchWindow(maya_main_window())
+    return CommandSearchWindow.instance
+
+def show():
+    getInstance().show()
+
+def hide():
+    if CommandSearchWindow.instance is not None:
+        CommandSearchWindow.instance.close()
+
+def prewarm():
+    """
+    Build the command search window and load or rebuild its command index
+    during idle time, so that the first `show` is fast.
+    Intended to be called from userSetup.py after Maya starts.
+    """
+    def buildWindow():
+        getInstance()
+        maya.utils.executeDeferred(buildCommandIndex)
+
+    def buildCommandIndex():
+        CommandSearchWindow.instance.searchModel.updateCommandIndex()
+
+    maya.utils.executeDeferred(buildWindow)
+
+
+
+class CommandSearchModel(SearchModelBase):
+    """
+    A SearchModelBase object that searches for mel and python commands,
+    runtime commands and menu items, and runs them, or opens the
+    documentation of python commands.
+
+    Commands are listed from a persistent CommandIndex, that is only rebuilt
+    when the maya version, loaded plugins, runtime commands or menus change.
+    Its cache key is checked every time the window is shown, which is cheap,
+    so showing the window only has to list commands when they changed.
+    """
+
+    def __init__(self, parent=None):
+        super(CommandSearchModel, self).__init__(parent)
+        # the persistent index of all commands
+        self.commandIndex = CommandIndex(self.getCommandIndexPath())
+        # table of the label of each command, results are stored as rows into this table
+        self.nodeTable = NodeTable()
+        # the kind and name of each row in the table
+        self.commandKinds = []
+        self.commandNames = []
+        # the command index generation that the table was built for
+        self._tableGeneration = None
+        # when True, match commands containing the characters of the search term in order
+        self.fuzzyMatching = True
+        # search terms shorter than this are streamed in alphabetical order instead of ranked
+        self.minRankedTermLength = 2
+        # compiles queries with multiple terms, negation, globs or regexes
+        self.queryCompiler = QueryCompiler()
+        # cache of recent results by search term, fuzzy matching and table generation
+        self.resultsCache = LRUCache(64 * 1024 * 1024, getResultsMemoryUsage)
+        # mapping of menu item identifiers to the long names of the menu items in this session
+        self._menuItemNames = {}
+
+    @staticmethod
+    def getCommandIndexPath():
+        """
+        Return the path of the command index cache file, in the user prefs folder
+        """
+        return os.path.join(cmds.internalVar(userPrefDir=True), 'quicksearch', 'commandIndex.txt')
+
+    def updateCommandIndex(self):
+        """
+        Load the command index, rebuilding it if it is out of date, and update
+        the table of commands. Only the cache key of the index is computed
+        if the available commands have not changed since the last update.
+        """
+        self.commandIndex.update()
+        if self._tableGeneration == self.commandIndex.generation:
+            return
+        kinds, names, labels = self.commandIndex.getEntries()
+        # sort by label, so that streamed results are alphabetical
+        rows = sorted(range(len(labels)), key=lambda i: labels[i].lower())
+        self.commandKinds = [kinds[i] for i in rows]
+        self.commandNames = [names[i] for i in rows]
+        # labels are stored as single segment names, and must not look like paths
+        self.nodeTable = NodeTable([labels[i].replace('|', ' ') for i in rows])
+        self._tableGeneration = self.commandIndex.generation
+        self.resultsCache.clear()
+        self._menuItemNames = {}
+
+    def getItemData(self, index, role=QtCore.Qt.DisplayRole): # override
+        row = self.results[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return '{0}  ({1})'.format(self.nodeTable.getShortName(row), self.commandKinds[row])
+        elif role == QtCore.Qt.ToolTipRole:
+            return self.commandNames[row]
+
+    def _updateResults(self): # override
+        searchTerm = self.query.strip()
+        if not searchTerm:
+            self.results = []
+            return
+        cacheKey = (searchTerm, self.fuzzyMatching, self._tableGeneration)
+        results = self.resultsCache.get(cacheKey)
+        if results is None:
+            results = self._searchCommands(searchTerm)
+            if not isinstance(results, MatchStream):
+                self.resultsCache.set(cacheKey, results)
+        self.results = results
+
+    def _searchCommands(self, searchTerm):
+        """
+        Return the rows of all commands matching a search term, ranked by how well they match
+        """
+        return self.queryCompiler.search(self.nodeTable, searchTerm, self.fuzzyMatching, self.minRankedTermLength)[0]
+
+    def prepareResults(self, count): # override
+        if isinstance(self.results, RankedResults):
+            self.results.rankTo(count)
+
+    def runResult(self, row):
+        """
+        Run the command in the given row of the results.
+        Python commands usually need arguments, so their documentation is opened instead.
+        Errors raised by the command are logged instead of raised.
+        """
+        tableRow = self.results[row]
+        kind = self.commandKinds[tableRow]
+        name = self.commandNames[tableRow]
+        try:
+            if kind == CommandIndex.MENU_ITEM:
+                self._runMenuItem(name)
+            elif kind == CommandIndex.PYTHON:
+                cmds.help(name, documentation=True)
+            else:
+                # mel commands and runtime commands can both be run by name
+                mel.eval(name)
+        except Exception:
+            LOG.exception('Failed to run command: {0}'.format(self.nodeTable.getShortName(tableRow)))
+
+    def getMenuItemName(self, menuItemId):
+        """
+        Return the long name of a menu item in this session from its identifier
+        in the command index, or None if the menu item doesn't exist
+        """
+        name = self._menuItemNames.get(menuItemId)
+        if name is None or not cmds.menuItem(name, exists=True):
+            name = findMayaMenuItem(menuItemId)
+            if name is None:
+                return None
+            self._menuItemNames[menuItemId] = name
+        return name
+
+    def _runMenuItem(self, menuItemId):
+        name = self.getMenuItemName(menuItemId)
+        if name is None:
+            LOG.warning('Menu item not found: {0}'.format(menuItemId.replace('|', ' > ')))
+            return
+        # menu items can have python or mel commands, or python callables
+        command = cmds.menuItem(name, query=True, command=True)
+        if not command:
+            return
+        if callable(command):
+            command()
+        elif cmds.menuItem(name, query=True, sourceType=True) == 'python':
+            # menu python commands run in the global namespace, the same as in the script editor
+            exec(command, __main__.__dict__)
+        else:
+            mel.eval(command)
+
+    def forceUpdateResults(self): # override
+        """
+        Update the command table and the search results
+        """
+        self.updateCommandIndex()
+        super(CommandSearchModel, self).forceUpdateResults()
+
+    def getStatusText(self): # override
+        return '{0} / {1} commands{2}'.format(self.getResultCountText(), len(self.nodeTable), self.getTimingText())
+
+
+
+
+class CommandSearchWindow(SearchWindowBase):
+    """
+    A search window that searches for maya commands and menu items,
+    and runs the activated result.
+    """
+
+    # static instance of a CommandSearchWindow for persistent use
+    instance = None
+
+    def __init__(self, parent=None):
+        super(CommandSearchWindow, self).__init__(parent)
+        self.titleLabel.setText("Command Search")
+        self.listView.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.listView.activated.connect(self.runCommand)
+        self.inputField.returnPressed.connect(self.runFirstCommand)
+
+    def getDesiredObjectName(self): # override
+        return "maya_quicksearch_commandsearchwindow"
+
+    def getNewSearchModel(self): # override
+        return CommandSearchModel(self)
+
+    def runCommand(self, index):
+        """
+        Close the window and run the command at the given index
+        """
+        self.close()
+        self.searchModel.runResult(index.row())
+
+    def runFirstCommand(self):
+        if self.searchModel.rowCount():
+            self.runCommand(self.searchModel.index(0))
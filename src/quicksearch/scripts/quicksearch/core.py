@@ -1,14 +1,22 @@
 
 
+import logging
+import threading
+
 from Qt import QtCore, QtGui, QtWidgets
 
+from instrumentation import NULL_STATS, SearchStats
+
 
 __all__ = [
     'maya_main_window',
     'SearchModelBase',
+    'SearchWorker',
     'SearchWindowBase',
 ]
 
+LOG = logging.getLogger(__name__)
+
 
 def maya_main_window():
     """
@@ -21,8 +29,70 @@ def maya_main_window():
 
 
 
+class SearchWorker(threading.Thread):
+    """
+    A worker thread that runs search jobs one at a time,
+    and counts streamed results so the main thread doesn't have to.
+
+    Only the most recently submitted job is kept, any job that was
+    submitted but not yet started is dropped when a new one arrives.
+    Jobs must not use maya commands, since they do not run on the main thread.
+    """
+
+    def __init__(self):
+        super(SearchWorker, self).__init__(name='maya_quicksearch_worker')
+        self.daemon = True
+        self._condition = threading.Condition()
+        self._pending = None
+
+    def submit(self, job, isCancelled, callback):
+        """
+        Schedule a job to run on the worker thread.
+
+        Args:
+            job : `callable`
+                called with `isCancelled`, returns the search results
+            isCancelled : `callable`
+                returns True if the job is no longer needed
+            callback : `callable`
+                called on the worker thread with the job results,
+                unless the job was cancelled
+        """
+        with self._condition:
+            self._pending = (job, isCancelled, callback)
+            self._condition.notify()
+
+    def run(self): # override
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                job, isCancelled, callback = self._pending
+                self._pending = None
+            if isCancelled():
+                continue
+            try:
+                results = job(isCancelled)
+            except Exception:
+                LOG.exception('Search failed')
+                continue
+            if not isCancelled():
+                callback(results)
+
+
+
 class SearchModelBase(QtCore.QAbstractListModel):
 
+    # emitted from the search worker thread when results are ready,
+    # always received on the main thread through a queued connection
+    asyncResultsReady = QtCore.Signal(int, object)
+    # emitted from the search worker thread when streamed results have been
+    # counted, with the results and their count, see `_countResultsAsync`
+    asyncCountReady = QtCore.Signal(object, object)
+    # emitted after the results, or any information
+    # shown in the status text, have changed
+    resultsChanged = QtCore.Signal()
+
     def __init__(self, parent=None):
         super(SearchModelBase, self).__init__(parent)
 
@@ -37,6 +107,49 @@ class SearchModelBase(QtCore.QAbstractListModel):
         self.query = None
         # the current list of results
         self.results = []
+        # incremented every time the results change
+        self.resultsGeneration = 0
+        # ids of the currently displayed results, see `getResultId`
+        self._displayedResultIds = []
+        # LRUCache of recent results, so that repeating a query is instant,
+        # or None if results are not cached. set by subclasses, which decide
+        # its keys, see `getResultsCacheStats`
+        self.resultsCache = None
+        # the streamed results being counted on the search worker thread
+        self._countingResults = None
+
+        # when True, searches are run on a worker thread after a short
+        # delay, and only the results of the latest query are kept.
+        # subclasses must implement `_getSearchJob` to support this
+        self.asyncSearch = False
+        # milliseconds to wait after the query changes before searching
+        # when using async search, so that fast typing only searches once
+        self.searchDebounceTime = 40
+
+        # id of the latest search, incremented to cancel running searches
+        self._searchId = 0
+        # whether the next async results should emit a change regardless
+        self._forceEmitChange = False
+        self._searchWorker = None
+        self._searchTimer = QtCore.QTimer(self)
+        self._searchTimer.setSingleShot(True)
+        self._searchTimer.timeout.connect(self._startAsyncSearch)
+        self.asyncResultsReady.connect(self._onAsyncResultsReady, QtCore.Qt.QueuedConnection)
+        self.asyncCountReady.connect(self._onAsyncCountReady, QtCore.Qt.QueuedConnection)
+
+        # when True, timings and counters are recorded for every query,
+        # see `getLastStats`. when False, instrumented code records into
+        # NULL_STATS, which does nothing
+        self.instrumentationEnabled = False
+        # when True, and instrumentation is enabled, the total time
+        # of the last query is appended to the status text
+        self.showTimingsInStatus = False
+        # list of StatsSinks that receive the stats of every query
+        self.statsSinks = []
+        # the stats being recorded for the current query
+        self._stats = NULL_STATS
+        # the stats of the last query whose results were displayed
+        self._lastStats = None
 
     def index(self, row, column=0, parent=None): # override
         return self.createIndex(row, column)
@@ -71,17 +184,174 @@ class SearchModelBase(QtCore.QAbstractListModel):
         search results. Returns the length of the results by default.
         Override in subclass to add more customized information
         """
-        return len(self.results)
+        return self.getResultCountText() + self.getTimingText()
+
+    def getTimingText(self):
+        """
+        Return the total time of the last query as text to append to the
+        status text, or an empty string unless `showTimingsInStatus` is set
+        """
+        stats = self._lastStats
+        if not self.showTimingsInStatus or stats is None or stats.totalTime is None:
+            return ''
+        return '  [{0:.1f} ms]'.format(stats.totalTime * 1000)
+
+    def setInstrumentationEnabled(self, enabled):
+        """
+        Enable or disable recording stats for every query
+        """
+        self.instrumentationEnabled = enabled
+        if not enabled:
+            self._stats = NULL_STATS
+            self._lastStats = None
+
+    def addStatsSink(self, sink):
+        """
+        Add a StatsSink that receives the stats of every query
+        """
+        if sink not in self.statsSinks:
+            self.statsSinks.append(sink)
+
+    def removeStatsSink(self, sink):
+        if sink in self.statsSinks:
+            self.statsSinks.remove(sink)
+            sink.close()
+
+    def getLastStats(self):
+        """
+        Return the SearchStats of the last query whose results were displayed,
+        or None if instrumentation is disabled or no query has finished yet.
+        Rows fetched while scrolling are added to these stats afterwards.
+        """
+        return self._lastStats
+
+    def recordPhase(self, name):
+        """
+        Return a context manager that adds the time spent in it to a phase
+        of the stats of the current query, e.g. for work done by views.
+        Does nothing if instrumentation is disabled.
+
+        Args:
+            name : `str`
+                the name of the phase
+        """
+        return self._stats.phase(name)
+
+    def _startStats(self):
+        """
+        Start recording stats for the current query, if enabled
+        """
+        if self.instrumentationEnabled:
+            self._stats = SearchStats(self.query)
+        else:
+            self._stats = NULL_STATS
+
+    def _finishStats(self):
+        """
+        Finish the stats of the current query and send them to all sinks
+        """
+        stats = self._stats
+        if not stats.enabled or stats is self._lastStats:
+            return
+        stats.finish()
+        self._lastStats = stats
+        for sink in self.statsSinks:
+            try:
+                sink.write(stats)
+            except Exception:
+                LOG.exception('Failed to write search stats')
+
+    def getResultCountText(self):
+        """
+        Return the number of results as text. If the results are a stream
+        that has not been fully counted yet, returns e.g. '100+'
+        """
+        getCount = getattr(self.results, 'getCount', None)
+        if getCount is not None and getCount() is None:
+            return '{0}+'.format(len(self.results))
+        return str(len(self.results) if getCount is None else getCount())
+
+    def isResultsComplete(self):
+        """
+        Return False if the results are a stream that may have more results
+        than have been fetched so far, see `MatchStream`
+        """
+        return getattr(self.results, 'isComplete', True)
+
+    def _fetchResults(self, count):
+        """
+        Make sure the first `count` results are available for display,
+        fetching from result streams if necessary
+        """
+        if not self.isResultsComplete():
+            self.results.fetchTo(count)
+        self.prepareResults(count)
+
+    def _countResultsAsync(self):
+        """
+        Count the current results on the search worker thread if they are
+        a stream that has not been counted, see `MatchStream.countAll`.
+        Counting is abandoned if the results change before it finishes.
+        """
+        results = self.results
+        if not hasattr(results, 'countAll') or results.getCount() is not None or self._countingResults is results:
+            return
+        self._countingResults = results
+        self._getSearchWorker().submit(
+            results.countAll,
+            lambda: self.results is not results,
+            lambda count: self.asyncCountReady.emit(results, count))
+
+    def _onAsyncCountReady(self, results, count):
+        """
+        Called on the main thread when streamed results have been counted
+        """
+        if results is self._countingResults:
+            self._countingResults = None
+        if results is self.results and count is not None:
+            results.setCount(count)
+            self.resultsChanged.emit()
+
+    def getResultsCacheStats(self):
+        """
+        Return a dict of information about the results cache,
+        including its hit rate and estimated memory use in bytes,
+        or None if results are not cached
+        """
+        if self.resultsCache is not None:
+            return self.resultsCache.getStats()
+
+    def getResultId(self, row):
+        """
+        Return a value that identifies the result at the given row,
+        used to find which displayed rows have changed when the results change.
+        Returns the result itself by default.
+        """
+        return self.results[row]
 
     def canFetchMore(self, parent): # override
-        return self.numItemsDisplayed < len(self.results)
+        return self.numItemsDisplayed < len(self.results) or not self.isResultsComplete()
 
     def fetchMore(self, parent): # override
-        numRemaining = len(self.results) - self.numItemsDisplayed
-        fetchCount = min(self.numItemsToFetch, numRemaining)
-        self.beginInsertRows(QtCore.QModelIndex(), self.numItemsDisplayed, self.numItemsDisplayed + fetchCount)
+        with self._stats.phase('fetch'):
+            fetchCount = self._fetchMoreInternal()
+        self._stats.count('rowsEmitted', fetchCount)
+
+    def _fetchMoreInternal(self):
+        """
+        Display the next page of results, and return the number of rows added
+        """
+        first = self.numItemsDisplayed
+        self._fetchResults(first + self.numItemsToFetch)
+        fetchCount = min(self.numItemsToFetch, len(self.results) - first)
+        if fetchCount <= 0:
+            return 0
+        last = first + fetchCount - 1
+        self.beginInsertRows(QtCore.QModelIndex(), first, last)
         self.numItemsDisplayed += fetchCount
+        self._displayedResultIds.extend([self.getResultId(row) for row in range(first, last + 1)])
         self.endInsertRows()
+        return fetchCount
 
     def setQuery(self, query=None):
         """
@@ -89,33 +359,169 @@ class SearchModelBase(QtCore.QAbstractListModel):
         """
         if query is not None:
             self.query = query
-        self._updateResultsInternal()
+        self._startStats()
+        if self.asyncSearch:
+            self._requestAsyncSearch(self.searchDebounceTime)
+        else:
+            self._updateResultsInternal()
 
     def forceUpdateResults(self):
         """
         Refreshes the current results.
         """
-        self._updateResultsInternal(True)
+        self._startStats()
+        if self.asyncSearch:
+            self._forceEmitChange = True
+            self._requestAsyncSearch(0)
+        else:
+            self._updateResultsInternal(True)
+
+    def _requestAsyncSearch(self, delay):
+        """
+        Cancel any running search and schedule a new one to start
+        on the main thread after the given delay in milliseconds.
+        """
+        self._searchId += 1
+        self._searchTimer.start(delay)
+
+    def _startAsyncSearch(self):
+        """
+        Prepare a search job on the main thread, where maya commands
+        are safe to use, and submit it to the search worker thread.
+        """
+        searchId = self._searchId
+        job = self._getSearchJob() if self.query else None
+        if job is None:
+            # nothing to run in the background
+            forceEmitChange, self._forceEmitChange = self._forceEmitChange, False
+            self._updateResultsInternal(forceEmitChange)
+            return
+        # a count that hasn't started yet is dropped by the worker
+        self._countingResults = None
+        self._getSearchWorker().submit(
+            job,
+            lambda: self._searchId != searchId,
+            lambda results: self.asyncResultsReady.emit(searchId, results))
+
+    def _getSearchWorker(self):
+        """
+        Return the search worker thread, starting it if necessary
+        """
+        if self._searchWorker is None:
+            self._searchWorker = SearchWorker()
+            self._searchWorker.start()
+        return self._searchWorker
+
+    def _onAsyncResultsReady(self, searchId, results):
+        """
+        Called on the main thread when a search job has finished
+        """
+        if searchId != self._searchId:
+            # a newer search has started since
+            return
+        forceEmitChange, self._forceEmitChange = self._forceEmitChange, False
+        lastResults = self.results
+        self._applySearchJobResults(results)
+        self._onResultsUpdated(lastResults, forceEmitChange)
+
+    def _getSearchJob(self):
+        """
+        Return a callable that computes the results for the current query
+        on a worker thread, or None to update the results synchronously.
+        Called on the main thread, so any work that needs maya commands
+        should be done here before returning the job.
+
+        The job is called with an `isCancelled` function and should stop
+        early and return None if it returns True. The return value is given
+        to `_applySearchJobResults` on the main thread.
+        """
+        return None
+
+    def _applySearchJobResults(self, results):
+        """
+        Store the results returned by a search job.
+        Sets self.results by default.
+        """
+        self.results = results
 
     def _updateResultsInternal(self, forceEmitChange=False):
         """
         Update the current list of results by calling _updateResults.
-
-        Returns True if the results have changed.
         """
         lastResults = self.results
         if not self.query:
             self.results = []
         else:
             self._updateResults()
-        if self.results != lastResults or forceEmitChange:
-            self.numItemsDisplayed = min(len(self.results), self.numItemsInitiallyDisplayed)
-            self.dataChanged.emit(QtCore.QModelIndex(), QtCore.QModelIndex(), None)
+        self._onResultsUpdated(lastResults, forceEmitChange)
+
+    def _onResultsUpdated(self, lastResults, forceEmitChange=False):
+        """
+        Update the displayed items and notify views if the results have changed.
+        Results are only considered changed if a new results object was set.
+        """
+        if self.results is lastResults and not forceEmitChange:
+            self._finishStats()
+            self._countResultsAsync()
+            return
+        stats = self._stats
+        self.resultsGeneration += 1
+        with stats.phase('rank'):
+            self._fetchResults(self.numItemsInitiallyDisplayed)
+        count = min(len(self.results), self.numItemsInitiallyDisplayed)
+        with stats.phase('rows'):
+            self._updateDisplayedRows([self.getResultId(row) for row in range(count)])
+        with stats.phase('signals'):
+            self.resultsChanged.emit()
+        stats.count('matches', len(self.results))
+        stats.count('rowsEmitted', count)
+        self._finishStats()
+        self._countResultsAsync()
+
+    def _updateDisplayedRows(self, resultIds):
+        """
+        Display the results with the given ids, emitting the minimal row signals.
+        Only rows added or removed at the end are handled incrementally,
+        any other change resets the model, which is cheap since only
+        the first page of results is displayed at this point.
+        """
+        lastIds = self._displayedResultIds
+        lastCount = len(lastIds)
+        count = len(resultIds)
+        parent = QtCore.QModelIndex()
+        if resultIds == lastIds:
+            pass
+        elif count > lastCount and resultIds[:lastCount] == lastIds:
+            self.beginInsertRows(parent, lastCount, count - 1)
+            self.numItemsDisplayed = count
+            self._displayedResultIds = resultIds
+            self.endInsertRows()
+        elif count < lastCount and lastIds[:count] == resultIds:
+            self.beginRemoveRows(parent, count, lastCount - 1)
+            self.numItemsDisplayed = count
+            self._displayedResultIds = resultIds
+            self.endRemoveRows()
+        else:
+            self.beginResetModel()
+            self.numItemsDisplayed = count
+            self._displayedResultIds = resultIds
+            self.endResetModel()
+
+    def prepareResults(self, count):
+        """
+        Called before the first `count` results are displayed, so that
+        subclasses can lazily order or compute results as they are needed.
+        Time spent here is recorded in the 'rank' phase of the query stats.
+        Does nothing by default.
+        """
+        pass
 
     def _updateResults(self):
         """
         Update self.results using the current search query.
-        Should be overridden by base classes, self.results must always be a list.
+        Should be overridden by base classes. self.results must support `len` and
+        indexing, e.g. a list, `RankedResults`, or a `MatchStream`, which is fetched
+        as results are displayed and counted on the search worker thread.
         """
         raise NotImplementedError
 
@@ -147,7 +553,7 @@ class SearchWindowBase(QtWidgets.QDialog):
 
         # create search model and connect it to the list view
         self.searchModel = self.getNewSearchModel()
-        self.searchModel.dataChanged.connect(self.updateStatusLabel)
+        self.searchModel.resultsChanged.connect(self.updateStatusLabel)
         self.listView.setModel(self.searchModel)
         # connect input field to the search query
         self.inputField.textChanged.connect(self.searchModel.setQuery)
@@ -258,6 +664,7 @@ class SearchWindowBase(QtWidgets.QDialog):
         # selectable list view for showing all results
         self.listView = QtWidgets.QListView(parent)
         self.listView.setAlternatingRowColors(True)
+        self.listView.setUniformItemSizes(True)
         self.listView.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
         self.listView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.listView.setObjectName("listView")
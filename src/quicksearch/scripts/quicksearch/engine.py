@@ -0,0 +1,1066 @@
+
+from collections import OrderedDict
+
+from attrindex import AttributeIndex, listMayaNodesWithAttribute, listMayaTypeAttributes
+from caching import LRUCache
+from instrumentation import NULL_STATS
+from matching import RankedResults, getFuzzyRegex, getResultsMemoryUsage
+from nodecache import MayaNodeEventSource, NodeCache, NodeEventSource
+from nodetable import NodeTable
+from nodetypes import NodeTypeTable
+from parallel import ParallelMatcher
+from pathtable import PathTable
+from queryparser import QueryFlagParser
+from queryplan import QueryCompiler, isSimpleQuery
+
+
+__all__ = [
+    'MayaNodeSource',
+    'NodeSearchEngine',
+    'NodeSource',
+    'PreparedSearch',
+    'StaticNodeSource',
+]
+
+
+
+class NodeSource(object):
+    """
+    Lists the nodes, node types and attributes that a NodeSearchEngine searches.
+    Subclass to search something other than the open maya scene.
+    """
+
+    def listNodes(self, kwargs):
+        """
+        Return a list of (long name, type) of the nodes that match a set of `ls` kwargs.
+        Type kwargs are never given, they are applied by the engine in memory.
+        """
+        raise NotImplementedError
+
+    def listNodeTypes(self):
+        """
+        Return a list of all node type names, including abstract types
+        """
+        return []
+
+    def listInheritedNodeTypes(self, nodeType):
+        """
+        Return the list of types a node type inherits from, including itself
+        """
+        return [nodeType]
+
+    def listSelection(self):
+        """
+        Return the long names of the selected nodes
+        """
+        return []
+
+    def listTypeAttributes(self, nodeType):
+        """
+        Return the names of all static attributes of a node type
+        """
+        return []
+
+    def listNodesWithAttribute(self, name, nodeTypes=None, nodes=None):
+        """
+        Return the long names of all nodes that have an attribute,
+        only including nodes of the given types if any are given,
+        and only checking the given nodes if a list of long names is given
+        """
+        return []
+
+    def getNewEventSource(self):
+        """
+        Return a new NodeEventSource that reports changes to the nodes,
+        or None to list all nodes again every time they are needed
+        """
+        return None
+
+
+
+class MayaNodeSource(NodeSource):
+    """
+    Lists the nodes of the open maya scene, in the maya gui or in mayapy
+    """
+
+    def listNodes(self, kwargs): # override
+        import maya.cmds as cmds
+        try:
+            result = cmds.ls('*', showType=True, **kwargs) or []
+        except:
+            return []
+        return list(zip(result[::2], result[1::2]))
+
+    def listNodeTypes(self): # override
+        import maya.cmds as cmds
+        # abstract types are listed as e.g. 'shape (abstract)'
+        return [t.split(' ')[0] for t in cmds.allNodeTypes(includeAbstract=True)]
+
+    def listInheritedNodeTypes(self, nodeType): # override
+        import maya.cmds as cmds
+        return cmds.nodeType(nodeType, inherited=True, isTypeName=True)
+
+    def listSelection(self): # override
+        import maya.cmds as cmds
+        return cmds.ls(sl=True, long=True) or []
+
+    def listTypeAttributes(self, nodeType): # override
+        return listMayaTypeAttributes(nodeType)
+
+    def listNodesWithAttribute(self, name, nodeTypes=None, nodes=None): # override
+        return listMayaNodesWithAttribute(name, nodeTypes, nodes)
+
+    def getNewEventSource(self): # override
+        return MayaNodeEventSource()
+
+
+
+class StaticNodeSource(NodeSource):
+    """
+    Lists a given set of nodes, e.g. to search nodes outside of maya in plain python,
+    or nodes gathered from somewhere other than the open scene.
+
+    Boolean `ls` kwargs that only depend on node types, e.g. '-transforms',
+    are answered using the given type inheritance, '-assemblies' lists
+    top level dag nodes, and '-referencedNodes' lists `referencedNodes`.
+    Kwargs that depend on the state of a scene, e.g. '-visible', match no nodes.
+    Call `setNodes` to replace the nodes, which resets the engine using this source,
+    or `addNodes` to add nodes, which the engine updates incrementally.
+    """
+
+    # types of the nodes listed by each `ls` boolean kwarg that can be answered from node types
+    nodeKwargTypes = dict(
+        cameras=['camera'], dagObjects=['dagNode'], geometry=['geometryShape'],
+        lights=['light'], materials=['shadingDependNode'], partitions=['partition'],
+        planes=['plane'], sets=['objectSet'], shapes=['shape'],
+        textures=['texture2d', 'texture3d'], transforms=['transform'],
+    )
+
+    def __init__(self, nodes=None, inheritedTypes=None, typeAttributes=None, dynamicAttributes=None,
+                 selection=None):
+        """
+        Args:
+            nodes : `list` of (`str`, `str`)
+                the long name and type of each node
+            inheritedTypes : `dict`
+                mapping of node types to the list of types they inherit from,
+                types that are not in the mapping only inherit from themselves
+            typeAttributes : `dict`
+                mapping of node types to the names of their static attributes
+            dynamicAttributes : `dict`
+                mapping of node long names to the names of their dynamic attributes
+            selection : `list` of `str`
+                the long names of the selected nodes
+        """
+        self.nodes = list(nodes or [])
+        self.inheritedTypes = inheritedTypes or {}
+        self.typeAttributes = typeAttributes or {}
+        self.dynamicAttributes = dynamicAttributes or {}
+        self.selection = list(selection or [])
+        # set of the long names of nodes that are referenced
+        self.referencedNodes = set()
+        # the event source of the node cache listing these nodes
+        self._eventSource = None
+        # mapping of long names to node types, built when needed
+        self._nodeTypes = None
+
+    def setNodes(self, nodes, dynamicAttributes=None, referencedNodes=None):
+        """
+        Replace the nodes, and report the change to the engine using this source
+        """
+        self.nodes = list(nodes)
+        self.dynamicAttributes = dynamicAttributes or {}
+        self.referencedNodes = set(referencedNodes or [])
+        self._nodeTypes = None
+        if self._eventSource is not None:
+            self._eventSource.emitSceneReset()
+
+    def addNodes(self, nodes, dynamicAttributes=None):
+        """
+        Add nodes, and report them to the engine using this source
+
+        Args:
+            nodes : `list` of (`str`, `str`)
+                the long name and type of each new node
+            dynamicAttributes : `dict`
+                mapping of the long names of new nodes to the names of their dynamic attributes
+        """
+        nodes = list(nodes)
+        self.nodes.extend(nodes)
+        self.dynamicAttributes.update(dynamicAttributes or {})
+        if self._nodeTypes is not None:
+            self._nodeTypes.update(nodes)
+        if self._eventSource is not None:
+            self._eventSource.emitNodesAdded(nodes)
+
+    def inheritsAny(self, nodeType, nodeTypes):
+        """
+        Return True if a node type is or inherits from any of the given types
+        """
+        return bool(set(nodeTypes).intersection(self.listInheritedNodeTypes(nodeType)))
+
+    def listNodes(self, kwargs): # override
+        nodes = self.nodes
+        for key, value in kwargs.items():
+            if not value or key in ('long', 'recursive'):
+                continue
+            if key in self.nodeKwargTypes:
+                kwargTypes = self.nodeKwargTypes[key]
+                matchesType = {}
+                for nodeType in set([n[1] for n in nodes]):
+                    matchesType[nodeType] = self.inheritsAny(nodeType, kwargTypes)
+                nodes = [n for n in nodes if matchesType[n[1]]]
+            elif key == 'assemblies':
+                nodes = [n for n in nodes if n[0].count('|') == 1]
+            elif key in ('referencedNodes', 'readOnly'):
+                nodes = [n for n in nodes if n[0] in self.referencedNodes]
+            else:
+                return []
+        return list(nodes)
+
+    def listNodeTypes(self): # override
+        nodeTypes = set([n[1] for n in self.nodes])
+        for nodeType, inheritedTypes in self.inheritedTypes.items():
+            nodeTypes.add(nodeType)
+            nodeTypes.update(inheritedTypes)
+        return sorted(nodeTypes)
+
+    def listInheritedNodeTypes(self, nodeType): # override
+        inheritedTypes = self.inheritedTypes.get(nodeType)
+        if inheritedTypes is None:
+            return [nodeType]
+        return list(inheritedTypes) + [nodeType]
+
+    def listSelection(self): # override
+        return list(self.selection)
+
+    def listTypeAttributes(self, nodeType): # override
+        return self.typeAttributes.get(nodeType, [])
+
+    def listNodesWithAttribute(self, name, nodeTypes=None, nodes=None): # override
+        name = name.lower()
+        if nodes is not None:
+            dynamicAttributes = self.dynamicAttributes
+            items = [(n, dynamicAttributes[n]) for n in nodes if n in dynamicAttributes]
+        else:
+            items = self.dynamicAttributes.items()
+        longNames = [n for n, names in items if name in [a.lower() for a in names]]
+        if nodeTypes:
+            if self._nodeTypes is None:
+                self._nodeTypes = dict(self.nodes)
+            nodeTypes = set(nodeTypes)
+            longNames = [n for n in longNames if self._nodeTypes.get(n) in nodeTypes]
+        return longNames
+
+    def getNewEventSource(self): # override
+        # reports nothing on its own, see `setNodes`
+        self._eventSource = NodeEventSource()
+        return self._eventSource
+
+
+
+class PreparedSearch(object):
+    """
+    A parsed query, and everything it needs from the node source, gathered
+    on the main thread by `NodeSearchEngine.prepare`, so that it can be
+    searched from any thread with `NodeSearchEngine.search`.
+    """
+
+    def __init__(self, query):
+        # the full query
+        self.query = query
+        # the body of the query, or None if there should be no results
+        self.searchTerm = None
+        # `ls` kwargs given in the query
+        self.nodeKwargs = {}
+        # namespaces given with the namespace flag
+        self.namespaces = ()
+        # whether the under selection flag was given, and the selected nodes if so
+        self.underSelection = False
+        self.roots = None
+        # attribute names given with the attribute flag
+        self.attributes = ()
+        # the attribute names, attribute index generation and unlisted attributes
+        # the search is limited to, and the sorted rows of the nodes with those attributes
+        self.scopeAttributes = None
+        self.attributeRows = None
+        # True if the last attribute may still be being typed, and its nodes
+        # were not listed, so only nodes whose type has it statically match it
+        self.attributesIncomplete = False
+        # the node table to search
+        self.nodeTable = None
+        # whether to use fuzzy matching
+        self.fuzzyMatching = True
+        # the key for caching the results, or None if they should not be cached
+        self.cacheKey = None
+
+    def __repr__(self):
+        return '<PreparedSearch {0!r}>'.format(self.query)
+
+
+
+class NodeSearchEngine(object):
+    """
+    Searches for nodes with the same queries as the node search window,
+    without Qt, e.g. from mayapy or from validation scripts.
+
+    Nodes are listed from a NodeSource and stored in NodeTables, which are
+    cached per set of `ls` kwargs and rebuilt only when the nodes change.
+    Searching a query is split into `prepare`, which parses the query and
+    lists anything it needs from the source on the main thread, and `search`,
+    which is safe to run on a worker thread. `searchMany` searches many
+    queries at once and returns the matching nodes of each.
+    """
+
+    def __init__(self, nodeSource=None):
+        """
+        Args:
+            nodeSource : `NodeSource`
+                the source of the nodes to search, defaults to the open maya scene
+        """
+        self.nodeSource = nodeSource if nodeSource is not None else MayaNodeSource()
+        # table of the nodes for the current `ls` kwargs and their search keys,
+        # results are stored as rows into this table. None until first listed
+        self.nodeTable = None
+        # the node cache generation that the node table was listed in
+        self._nodeTableNodeGeneration = None
+        # minimum number of nodes for which a trigram index is built
+        # to speed up searching, set to None to never build the index.
+        # see `nodeTable.trigramIndex.buildTime` when tuning this value
+        self.trigramIndexMinNodes = 200000
+        # when True, match nodes containing the characters of the search term
+        # in order, instead of only nodes containing the exact search term.
+        # results are ranked by how well they match in both cases
+        self.fuzzyMatching = True
+        # search terms shorter than this match too many nodes to be worth
+        # ranking, their results are streamed in alphabetical order instead
+        self.minRankedTermLength = 2
+        # minimum number of nodes for which full searches are split
+        # across a pool of worker processes, set to None to always search
+        # in this process. below this size starting the pool and merging
+        # results costs more than it saves
+        self.parallelMatchingMinNodes = 1000000
+        # the parallel matcher, created the first time it is needed
+        self.parallelMatcher = None
+        # incremented every time the node table changes,
+        # used to invalidate anything derived from the node table
+        self.nodeTableGeneration = 0
+        # cache of node tables for recently used `ls` kwargs, so that switching
+        # between filters doesn't need to list nodes again. cleared whenever the
+        # nodes change, the cost of each table is its estimated size in bytes
+        self.nodeTableCache = LRUCache(256 * 1024 * 1024, lambda t: t.getMemoryUsage())
+        # the node cache generation for which the node table cache is valid
+        self._nodeTableCacheGeneration = None
+        # node tables of each namespace partition of the node cache, so that
+        # only changed namespaces are rebuilt. (namespace: (generation, table))
+        self._partitionTables = {}
+        # the path table shared by all partition tables, recreated
+        # once it holds too many paths of nodes that no longer exist
+        self._pathTable = None
+        # cache of recent results, keys include everything other than
+        # the query that the results depend on, see `_getResultsCacheKey`.
+        # the cost of each result set is its estimated size in bytes
+        self.resultsCache = LRUCache(64 * 1024 * 1024, getResultsMemoryUsage)
+
+        # the last node search, used to narrow down results when the new
+        # search term extends the last one. stored as a single tuple so it
+        # can be swapped safely from a worker thread.
+        # (search term, fuzzy matching, node table, scope,
+        #  unranked results, ranked results)
+        self._lastSearch = None
+
+        # `ls` command kwargs that are necessary for the search to work
+        self.persistentNodeKwargs = dict(
+            long=True, recursive=True
+        )
+        # `ls` command kwargs that can be set by the user
+        self.nodeKwargs = {}
+        # `ls` command kwargs of the last prepared query, that the node table was listed for
+        self._queryNodeKwargs = {}
+
+        # list of `ls` boolean kwargs that can be set by the user
+        self.boolNodeKwargKeys = [
+            'assemblies', 'cameras', 'dagObjects',
+            'geometry', 'invisible', 'lights',
+            'live', 'lockedNodes', 'materials',
+            'modified', 'partitions', 'planes',
+            'readOnly', 'referencedNodes', 'selection',
+            'sets', 'shapes', 'textures',
+            'transforms', 'untemplated', 'visible',
+        ]
+        # list of `ls` kwargs that expect node types as values
+        self.typeNodeKwargKeys = [
+            'type', 'exactType', 'excludeType'
+        ]
+        # list of `ls` kwargs whose results depend on more than which nodes
+        # exist in the scene, node lists using these are never cached
+        self.volatileNodeKwargKeys = [
+            'invisible', 'live', 'lockedNodes',
+            'modified', 'selection', 'untemplated',
+            'visible',
+        ]
+        self.allValidKwargKeys = self.boolNodeKwargKeys + self.typeNodeKwargKeys
+        # cache of all nodes, kept up to date from the events of the node source,
+        # used whenever no additional `ls` kwargs are given
+        self.nodeCache = NodeCache(self._listAllNodes, self.nodeSource.getNewEventSource())
+        # table of node type inheritance, used to filter nodes by type in memory
+        self.nodeTypeTable = NodeTypeTable(self.nodeSource.listNodeTypes, self.nodeSource.listInheritedNodeTypes)
+        # index of which attributes nodes have, kept up to date from the events of the node cache
+        eventSource = self.nodeCache.eventSource
+        self.attributeIndex = AttributeIndex(self.nodeSource.listTypeAttributes, self.nodeSource.listNodesWithAttribute)
+        if eventSource is not None:
+            eventSource.addListener(self.attributeIndex)
+
+        # mapping of short names to long names for accepted ls flags
+        self.nodeKwargLongNameMap = {
+            'ca':'cameras', 'dag':'dagObjects',
+            'g':'geometry', 'iv':'invisible', 'lt':'lights',
+            'lv':'live', 'ln':'lockedNodes', 'mat':'materials',
+            'mod':'modified', 'pr':'partitions', 'pl':'planes',
+            'ro':'readOnly', 'rn':'referencedNodes', 'sl':'selection',
+            'set':'sets', 's':'shapes', 'tex':'textures',
+            'tr':'transforms', 'ut':'untemplated', 'v':'visible',
+            # query kwargs long name mapping
+            'typ':'type', 'et':'exactType', 'ext':'excludeType',
+        }
+        # setup a parser for the search query to handle advanced kwargs,
+        # node types are only listed the first time a type flag is used.
+        # the namespace, under selection and attribute flags are handled by the search instead of `ls`
+        queryShortNames = dict(self.nodeKwargLongNameMap, ns='namespace', us='underSelection', attr='attribute')
+        self.queryParser = QueryFlagParser(
+            self.boolNodeKwargKeys + ['underSelection'], self.typeNodeKwargKeys,
+            queryShortNames, self.nodeTypeTable.isValidType, ['namespace', 'attribute'])
+        # compiles query bodies with multiple terms, negation, globs or regexes
+        self.queryCompiler = QueryCompiler()
+
+    def close(self):
+        """
+        Stop listening for node events and stop any worker processes
+        """
+        self.nodeCache.close()
+        if self.parallelMatcher is not None:
+            self.parallelMatcher.close()
+            self.parallelMatcher = None
+
+    def getFullNodeKwargs(self, queryKwargs=None):
+        """
+        Return the combined set of node kwargs that will be used
+        to retrieve the full list of nodes, for the kwargs of a query,
+        or of the last prepared query if not given.
+        """
+        result = {}
+        result.update(self._queryNodeKwargs if queryKwargs is None else queryKwargs)
+        result.update(self.nodeKwargs)
+        result.update(self.persistentNodeKwargs)
+        return result
+
+    def setNodeKwargs(self, **kwargs):
+        """
+        Set one or more user customizeable node kwargs.
+        Returns True if the node kwargs changed.
+        """
+        lastNodeKwargs = self.nodeKwargs.copy()
+        self.normalizeNodeKwargs(self.nodeKwargs, **kwargs)
+        return lastNodeKwargs != self.nodeKwargs
+
+    def normalizeNodeKwargs(self, obj, **kwargs):
+        """
+        Set node kwargs on the given object.
+        Convert short name flags to long ones and
+        make sure the keys are valid node kwargs.
+        Also prunes values that are defaults.
+        """
+        for key, val in kwargs.items():
+            # convert to long name if applicable
+            if key in self.nodeKwargLongNameMap:
+                key = self.nodeKwargLongNameMap[key]
+            # make sure its a valid key
+            if key in self.allValidKwargKeys:
+                if val:
+                    obj[key] = val
+                elif key in obj:
+                    del obj[key]
+
+    def parseQueryString(self, queryString):
+        """
+        Parse the given query string and return its body and kwargs.
+        Retrieves the body by simply splitting at the first '-' character,
+        the rest is parsed by the query flag parser.
+
+        >>> parseQueryString('my search -flag1 -flag2 -invalidFlag ignored text')
+        ('my search', {'flag1': True, 'flag2': True})
+
+        Returns:
+            `str`, `dict`
+                query body, query kwargs
+        """
+        argsIndex = queryString.find('-')
+        if argsIndex < 0:
+            # no kwargs
+            return queryString, {}
+        # split into body and args string
+        resultBody = queryString[:argsIndex]
+        queryArgsString = queryString[argsIndex:]
+        resultKwargs = {}
+        self.normalizeNodeKwargs(resultKwargs, **self.queryParser.parse(queryArgsString))
+        # prune any values that already exist in nodeKwargs
+        for key, val in list(resultKwargs.items()):
+            if key in self.nodeKwargs and val == self.nodeKwargs[key]:
+                del resultKwargs[key]
+        return resultBody, resultKwargs
+
+    def parseQuerySearchFlags(self, queryString):
+        """
+        Return the values of the flags in a query string that are handled
+        by the search instead of `ls`, see `getSearchScope`.
+
+        >>> parseQuerySearchFlags('ctl -ns char01 char02 -us -attr ikBlend')
+        (('char01', 'char02'), True, ('ikBlend',))
+
+        Returns:
+            `tuple` of `str`, `bool`, `tuple` of `str`
+                namespaces, under selection, attributes
+        """
+        argsIndex = queryString.find('-')
+        if argsIndex < 0:
+            return (), False, ()
+        flags = self.queryParser.parse(queryString[argsIndex:])
+        return (tuple(flags.get('namespace', ())), flags.get('underSelection', False),
+                tuple(flags.get('attribute', ())))
+
+    def prepare(self, query, stats=NULL_STATS, listIncompleteAttributes=True):
+        """
+        Parse a query and gather everything needed to search it, updating
+        the node table if it has not been listed yet, if the nodes have changed,
+        or if the query kwargs have changed since the last prepared query.
+        Must be called on the main thread.
+
+        Args:
+            query : `str`
+                the query to prepare
+            stats : `SearchStats`
+                records the timings of each phase
+            listIncompleteAttributes : `bool`
+                if False, the nodes with the last attribute of the attribute flag
+                are not listed while it may still be being typed, i.e. when it ends
+                the query, unless they are already cached.
+                See `PreparedSearch.attributesIncomplete`
+
+        Returns:
+            `PreparedSearch`
+        """
+        prepared = self._parse(query, stats)
+        if (self.nodeTable is None or prepared.nodeKwargs != self._queryNodeKwargs or
+                self.nodeCache.getGeneration() != self._nodeTableNodeGeneration):
+            with stats.phase('listNodes'):
+                self.updateNodeTable(prepared.nodeKwargs)
+        self._prepareScope(prepared, self.nodeTable, stats, listIncompleteAttributes)
+        if prepared.searchTerm is not None:
+            prepared.cacheKey = self._getResultsCacheKey(prepared)
+        return prepared
+
+    def _parse(self, query, stats=NULL_STATS):
+        """
+        Return a PreparedSearch of a parsed query, that has no node table yet
+        """
+        prepared = PreparedSearch(query)
+        with stats.phase('parse'):
+            queryBody, prepared.nodeKwargs = self.parseQueryString(query)
+            prepared.namespaces, prepared.underSelection, prepared.attributes = self.parseQuerySearchFlags(query)
+        if (queryBody or prepared.nodeKwargs or prepared.namespaces or prepared.underSelection or
+                prepared.attributes):
+            # create results if kwargs exist, even if main query is empty.
+            # the term is lowercased when searching, except for regexes
+            prepared.searchTerm = queryBody.strip()
+        return prepared
+
+    def _prepareScope(self, prepared, nodeTable, stats=NULL_STATS, listIncompleteAttributes=True):
+        """
+        Set the node table of a parsed search, and list the selection
+        and the nodes with the query attributes within it
+        """
+        prepared.nodeTable = nodeTable
+        prepared.fuzzyMatching = self.fuzzyMatching
+        if prepared.underSelection:
+            prepared.roots = tuple(self.nodeSource.listSelection())
+        if prepared.attributes:
+            # dynamic attributes may be listed, which needs the node source
+            with stats.phase('attributes'):
+                if self.nodeCache.eventSource is None:
+                    # nothing keeps dynamic attributes up to date
+                    self.attributeIndex.onSceneReset()
+                unlisted = ()
+                lastAttribute = prepared.attributes[-1]
+                query = prepared.query
+                if (not listIncompleteAttributes and query == query.rstrip() and query.split()[-1] == lastAttribute and
+                        not self.attributeIndex.isListed(nodeTable, lastAttribute)):
+                    # the query ends with the attribute, which may still be being typed
+                    unlisted = (lastAttribute,)
+                    prepared.attributesIncomplete = True
+                prepared.attributeRows = self.attributeIndex.getRows(nodeTable, prepared.attributes, unlisted)
+                prepared.scopeAttributes = (prepared.attributes, self.attributeIndex.generation, unlisted)
+
+    def _getResultsCacheKey(self, prepared):
+        """
+        Return the key for caching the results of a prepared search with the
+        current `ls` kwargs and node table, or None if they should not be cached.
+        Streamed results are cheap to create and are never cached,
+        neither are results limited to the current selection.
+        """
+        if len(prepared.searchTerm) < self.minRankedTermLength or prepared.underSelection:
+            return None
+        kwargsKey = self._getNodeKwargsCacheKey(self.getFullNodeKwargs(prepared.nodeKwargs))
+        if kwargsKey is None:
+            return None
+        return (prepared.searchTerm, prepared.fuzzyMatching, kwargsKey, prepared.namespaces,
+                prepared.scopeAttributes, self._nodeTableCacheGeneration)
+
+    def getCachedResults(self, prepared, stats=NULL_STATS):
+        """
+        Return the cached results of a prepared search, or None
+        """
+        if prepared.cacheKey is None:
+            return None
+        results = self.resultsCache.get(prepared.cacheKey)
+        if results is not None:
+            stats.count('cacheHits')
+        return results
+
+    def cacheResults(self, prepared, results):
+        """
+        Cache the results of a prepared search, if they can be cached.
+        Must be called on the main thread.
+        """
+        if prepared.cacheKey is not None and results is not None:
+            self.resultsCache.set(prepared.cacheKey, results)
+
+    def clearLastSearch(self):
+        """
+        Forget the last search, so that the next search is not narrowed down from its results
+        """
+        self._lastSearch = None
+
+    def search(self, prepared, isCancelled=None, stats=NULL_STATS):
+        """
+        Return the rows of all nodes in the node table of a prepared search
+        that match its query, ranked by how well they match, see `searchNodes`.
+        Safe to call from a worker thread.
+
+        Returns None if the search was cancelled.
+        """
+        if prepared.searchTerm is None:
+            return []
+        return self.searchNodes(prepared.searchTerm, prepared.nodeTable, prepared.fuzzyMatching, isCancelled,
+                                prepared.namespaces, prepared.roots, stats,
+                                prepared.scopeAttributes, prepared.attributeRows)
+
+    def searchNodes(self, searchTerm, nodeTable, fuzzyMatching, isCancelled=None, namespaces=(), roots=None,
+                    stats=NULL_STATS, attributes=None, attributeRows=None):
+        """
+        Return the rows of all nodes in a node table that match the given
+        search term, ranked by how well they match. Safe to call from
+        a worker thread.
+
+        If the node table has not changed and the last search term is
+        contained in the new one, only the last results are searched,
+        since every match of the new term must also match the last one.
+        If the search is scoped to namespaces or part of the hierarchy,
+        see `getSearchScope`, only the rows within the scope are searched.
+        Search terms that are not a single plain term are compiled into
+        a QueryPlan, see `QueryPlan` for the query syntax.
+
+        Args:
+            namespaces : `tuple` of `str`
+                namespaces given with the namespace flag
+            roots : `tuple` of `str`
+                if given, only search nodes below these long names
+            stats : `SearchStats`
+                records the time spent searching and scoring, and the number of rows scanned
+            attributes : (`tuple` of `str`, `int`, `tuple` of `str`)
+                if given, the attribute names given with the attribute flag, the attribute
+                index generation they were looked up in, and those whose nodes were not listed
+            attributeRows : `list` of `int`
+                the sorted rows of the nodes that have the given attributes
+
+        Returns None if the search was cancelled.
+        """
+        scope, searchTerm = self.getSearchScope(searchTerm, namespaces, roots, attributes)
+        # hierarchy scoped searches only match the short names of nodes
+        shortNames = scope is not None and (scope[2] is not None or scope[4] is not None)
+        plan = None
+        if isSimpleQuery(searchTerm):
+            searchTerm = searchTerm.lower()
+        else:
+            plan = self.queryCompiler.compile(searchTerm, fuzzyMatching)
+        lastSearch = self._lastSearch
+        lastResults = None
+        lastScope = None
+        if lastSearch is not None:
+            lastTerm, lastFuzzyMatching, lastNodeTable, lastScope, lastUnranked, lastRanked = lastSearch
+            # results of an unscoped search can be narrowed down to a namespace scope,
+            # but not the other way, and not to a hierarchy scope, which matches short names
+            canNarrow = lastScope == scope or (lastScope is None and not shortNames)
+            if lastNodeTable is nodeTable and lastFuzzyMatching == fuzzyMatching and lastTerm in searchTerm and canNarrow:
+                if lastTerm == searchTerm and lastScope == scope:
+                    return lastRanked
+                # the results of compiled queries are never narrowed down,
+                # since e.g. extending a negated term matches more nodes
+                if plan is None:
+                    lastResults = lastUnranked
+                    stats.count('narrowed')
+        scopeRows = None
+        if scope is not None:
+            with stats.phase('scope'):
+                scopeRows = self._getScopeRows(nodeTable, scope, fuzzyMatching, attributeRows)
+            if lastResults is None:
+                lastResults = scopeRows
+            elif lastScope != scope:
+                scopeRowSet = set(scopeRows)
+                lastResults = [i for i in lastResults if i in scopeRowSet]
+        if (plan is None and len(searchTerm) >= self.minRankedTermLength and lastResults is None and
+                self._shouldUseParallelMatching(nodeTable, fuzzyMatching)):
+            with stats.phase('search'):
+                parallelResults = self.parallelMatcher.search(nodeTable, searchTerm, fuzzyMatching, isCancelled)
+            if parallelResults is not None:
+                stats.count('nodesScanned', len(nodeTable))
+                results, scores = parallelResults
+                with stats.phase('score'):
+                    ranked = RankedResults(results, scores)
+                self._lastSearch = (searchTerm, fuzzyMatching, nodeTable, scope, results, ranked)
+                return ranked
+            if isCancelled is not None and isCancelled():
+                return None
+        # streams and the results of compiled queries cannot be narrowed down,
+        # since they are not fully searched, or may match more nodes when extended
+        results, unranked = self.queryCompiler.search(nodeTable, searchTerm, fuzzyMatching, self.minRankedTermLength,
+                                                      lastResults, isCancelled, shortNames, stats)
+        if results is None:
+            return None
+        self._lastSearch = (searchTerm, fuzzyMatching, nodeTable, scope, unranked, results)
+        return results
+
+    def searchMany(self, queries, isCancelled=None):
+        """
+        Search for many queries against a single snapshot of the nodes,
+        e.g. to check every node against a set of naming rules.
+
+        The nodes are listed once, and once more for each distinct set of `ls`
+        kwargs in the queries. Every query is matched against the same node
+        tables, sharing their search keys and scope rows, and matches are
+        neither ranked nor streamed. Repeated queries are only searched once.
+        The node table and last search of interactive searches, see `prepare`,
+        are left as they are.
+
+        >>> searchMany(['*_ctl', '!_jnt -type joint'])
+        OrderedDict([('*_ctl', ['|rig|arm_ctl']), ('!_jnt -type joint', ['|rig|root'])])
+
+        Args:
+            queries : `list` of `str`
+                queries using the same syntax as the node search window
+            isCancelled : `callable`
+                if given, called periodically and the search is
+                abandoned when it returns True
+
+        Returns:
+            `OrderedDict`
+                mapping of each query to the long names of the matching nodes,
+                in the order of the node table, or None if cancelled
+        """
+        self._updateNodeTableCache()
+        # node tables of each set of `ls` kwargs, so that each is only listed once
+        nodeTables = {}
+        prepared = OrderedDict()
+        for query in queries:
+            if query in prepared:
+                continue
+            search = self._parse(query)
+            kwargs = self.getFullNodeKwargs(search.nodeKwargs)
+            kwargsKey = tuple(sorted([(k, tuple(sorted(v)) if isinstance(v, list) else v) for k, v in kwargs.items()]))
+            nodeTable = nodeTables.get(kwargsKey)
+            if nodeTable is None:
+                nodeTable = nodeTables[kwargsKey] = self._getNodeTable(kwargs)
+            self._prepareScope(search, nodeTable)
+            prepared[query] = search
+        results = OrderedDict()
+        scopeRowsCache = {}
+        for query in queries:
+            if query in results:
+                continue
+            rows = self._matchRows(prepared[query], scopeRowsCache, isCancelled)
+            if rows is None:
+                return None
+            nodeTable = prepared[query].nodeTable
+            results[query] = [nodeTable.getLongName(row) for row in rows]
+        return results
+
+    def _matchRows(self, prepared, scopeRowsCache, isCancelled=None):
+        """
+        Return the sorted rows of all nodes that match a prepared search, unranked.
+
+        Args:
+            scopeRowsCache : `dict`
+                rows of each scope that has been searched, shared between searches
+        """
+        nodeTable = prepared.nodeTable
+        if prepared.searchTerm is None:
+            return []
+        fuzzyMatching = prepared.fuzzyMatching
+        scope, searchTerm = self.getSearchScope(prepared.searchTerm, prepared.namespaces,
+                                                prepared.roots, prepared.scopeAttributes)
+        shortNames = scope is not None and (scope[2] is not None or scope[4] is not None)
+        scopeRows = None
+        if scope is not None:
+            scopeKey = (nodeTable, scope, fuzzyMatching)
+            scopeRows = scopeRowsCache.get(scopeKey)
+            if scopeRows is None:
+                scopeRows = self._getScopeRows(nodeTable, scope, fuzzyMatching, prepared.attributeRows)
+                scopeRowsCache[scopeKey] = scopeRows
+        if not isSimpleQuery(searchTerm):
+            plan = self.queryCompiler.compile(searchTerm, fuzzyMatching)
+            return plan.search(nodeTable, scopeRows, isCancelled, shortNames)
+        if not searchTerm:
+            return list(scopeRows if scopeRows is not None else range(len(nodeTable)))
+        if fuzzyMatching:
+            return nodeTable.searchFuzzy(searchTerm.lower(), scopeRows, isCancelled, shortNames)
+        return nodeTable.search(searchTerm.lower(), scopeRows, isCancelled, shortNames)
+
+    @staticmethod
+    def getSearchScope(searchTerm, namespaces=(), roots=None, attributes=None):
+        """
+        Return the part of the scene a search is limited to, and the term
+        to match within it.
+
+        A search is scoped by:
+            - the namespaces given with the namespace flag, e.g. '-ns char01',
+              which includes their child namespaces
+            - a namespace in the last segment of the search term, e.g. 'char01:ctl',
+              which only matches nodes whose own namespace ends with that namespace
+            - a hierarchy pattern, when any parent segment of the search term is a glob,
+              e.g. 'riga|*|hand' matches nodes named like 'hand' two levels below 'rigA'.
+              '**' matches any number of levels, and a leading '|' starts at the dag root.
+              the last segment can be any query, e.g. 'riga|**|l_* !fk'
+            - the roots given with the under selection flag, e.g. '-us hand',
+              which only matches nodes below the selected nodes
+            - the attributes given with the attribute flag, e.g. '-attr ikBlend',
+              which only matches nodes that have all of the attributes
+
+        Hierarchy scoped searches only match the last segment of the search term
+        against the short names of nodes in the scope. A namespace is only taken
+        from the search term if it is a single plain term, see `isSimpleQuery`.
+
+        >>> getSearchScope('riga|*|hand')
+        (('', (), ('riga', '*', '*'), False, None, None), 'hand')
+
+        Returns:
+            (`tuple`, `str`)
+                the scope or None if the search is not limited, and the search term.
+                the scope is (term namespace, flag namespaces, hierarchy pattern or None,
+                pattern is anchored, roots or None, attributes or None)
+        """
+        pattern = None
+        anchored = False
+        segments = searchTerm.split('|')
+        # regexes can contain '|' and '*', but are not hierarchy patterns
+        if '/' not in searchTerm and len(segments) > 1 and [s for s in segments[:-1] if '*' in s or '?' in s]:
+            anchored = not segments[0]
+            pattern = [s.lower() for s in (segments[1:-1] if anchored else segments[:-1])]
+            # match the last segment against the children of the pattern matches,
+            # a glob in the last segment is matched as a query term
+            searchTerm = segments[-1]
+            pattern = tuple(pattern + ['*'])
+        termNamespace = ''
+        if isSimpleQuery(searchTerm):
+            segment = searchTerm[searchTerm.rfind('|') + 1:].lower()
+            index = segment.rfind(':')
+            termNamespace = segment[:index].lstrip(':') if index >= 0 else ''
+        if termNamespace or namespaces or pattern is not None or roots is not None or attributes is not None:
+            return (termNamespace, tuple(namespaces), pattern, anchored, roots, attributes), searchTerm
+        return None, searchTerm
+
+    @staticmethod
+    def _getScopeRows(nodeTable, scope, fuzzyMatching, attributeRows=None):
+        """
+        Return the sorted rows of a node table that are within a search scope.
+        The rows of nodes with the scope attributes must be given if it has any,
+        since they are looked up on the main thread.
+        """
+        termNamespace, namespaces, pattern, anchored, roots, attributes = scope
+        rows = None
+        if pattern is not None or roots is not None:
+            rows = nodeTable.getHierarchyRows(pattern, anchored, roots)
+        if attributes is not None:
+            if rows is None:
+                rows = attributeRows
+            else:
+                attributeRowSet = set(attributeRows)
+                rows = [i for i in rows if i in attributeRowSet]
+        if not termNamespace and not namespaces:
+            return rows
+        namespaces = [n.strip(':') for n in namespaces]
+        if fuzzyMatching:
+            termRegex = getFuzzyRegex(termNamespace)
+            matchesTerm = lambda namespace: termRegex.search(namespace.lower()) is not None
+        else:
+            matchesTerm = lambda namespace: namespace.lower().endswith(termNamespace)
+
+        def isInScope(namespace):
+            if namespaces and not [n for n in namespaces if namespace == n or namespace.startswith(n + ':')]:
+                return False
+            return matchesTerm(namespace)
+
+        namespaceRows = nodeTable.getNamespaceRows(isInScope)
+        if rows is None:
+            return namespaceRows
+        namespaceRowSet = set(namespaceRows)
+        return [i for i in rows if i in namespaceRowSet]
+
+    def _shouldUseParallelMatching(self, nodeTable, fuzzyMatching):
+        """
+        Return True if a full search of the given node table should use
+        the parallel matcher. Exact searches that can use a trigram index
+        are faster in this process.
+        """
+        return (self.parallelMatcher is not None and
+                self.parallelMatcher.nodeTable is nodeTable and
+                (fuzzyMatching or nodeTable.trigramIndex is None))
+
+    def _updateParallelMatcher(self):
+        """
+        Pack the current node table for the parallel matcher if it is large enough
+        """
+        if self.parallelMatchingMinNodes is None or not ParallelMatcher.isAvailable():
+            return
+        if len(self.nodeTable) < self.parallelMatchingMinNodes:
+            return
+        if self.parallelMatcher is None:
+            self.parallelMatcher = ParallelMatcher()
+        self.parallelMatcher.load(self.nodeTable)
+
+    def _listAllNodes(self):
+        return self.nodeSource.listNodes(self.persistentNodeKwargs)
+
+    def _getNodeKwargsCacheKey(self, kwargs):
+        """
+        Return a hashable key for a set of `ls` kwargs, or None
+        if the node list for the kwargs should not be cached.
+        """
+        items = []
+        for key, val in kwargs.items():
+            if key in self.volatileNodeKwargKeys and val:
+                return None
+            if isinstance(val, (list, tuple)):
+                val = tuple(sorted(val))
+            items.append((key, val))
+        return frozenset(items)
+
+    def updateNodeTable(self, queryKwargs=None):
+        """
+        List the nodes for the given query kwargs, or for the kwargs of the
+        last prepared query, and store them in the node table. Uses the node
+        cache when no additional `ls` kwargs are set, and reuses recently built
+        node tables while the nodes are unchanged.
+
+        Returns:
+            `bool`
+                True if the node table changed
+        """
+        if queryKwargs is not None:
+            self._queryNodeKwargs = queryKwargs
+        self._updateNodeTableCache()
+        self._nodeTableNodeGeneration = self._nodeTableCacheGeneration
+        nodeTable = self._getNodeTable(self.getFullNodeKwargs())
+        if nodeTable is self.nodeTable:
+            # nothing has changed
+            return False
+        self.nodeTable = nodeTable
+        self._updateParallelMatcher()
+        self.nodeTableGeneration += 1
+        return True
+
+    def _updateNodeTableCache(self):
+        """
+        Clear the node table cache if the nodes have changed since it was filled
+        """
+        generation = self.nodeCache.getGeneration()
+        if generation != self._nodeTableCacheGeneration:
+            self.nodeTableCache.clear()
+            self._nodeTableCacheGeneration = generation
+
+    def _getNodeTable(self, kwargs):
+        """
+        Return a node table for the given `ls` kwargs, from the node table cache
+        if possible. Type kwargs are applied in memory to the node table
+        for the remaining kwargs, instead of listing nodes again.
+        """
+        cacheKey = self._getNodeKwargsCacheKey(kwargs)
+        if cacheKey is not None:
+            nodeTable = self.nodeTableCache.get(cacheKey)
+            if nodeTable is not None:
+                return nodeTable
+        typeKwargs = dict([(k, v) for k, v in kwargs.items() if k in self.typeNodeKwargKeys])
+        if typeKwargs:
+            baseKwargs = dict([(k, v) for k, v in kwargs.items() if k not in self.typeNodeKwargKeys])
+            nodeTable = self._filterNodeTableByType(self._getNodeTable(baseKwargs), **typeKwargs)
+        else:
+            # build a new table instead of rebuilding the current one,
+            # since it may still be in use by a worker thread
+            if kwargs == self.persistentNodeKwargs:
+                nodeTable = self._getPartitionedNodeTable()
+            else:
+                nodes = sorted(self.nodeSource.listNodes(kwargs), key=lambda n: NodeTable.getSortKey(n[0]))
+                names = [n[0] for n in nodes]
+                nodeTypes = [n[1] for n in nodes]
+                nodeTable = NodeTable(names, self._shouldUseTrigramIndex(len(names)), nodeTypes)
+        if cacheKey is not None:
+            self.nodeTableCache.set(cacheKey, nodeTable)
+        return nodeTable
+
+    def _getPartitionedNodeTable(self):
+        """
+        Return a node table of all nodes in the node cache, built from a table
+        per namespace partition. Only the tables of partitions that changed since
+        the last call are rebuilt, the rest are reused.
+        """
+        partitions = self.nodeCache.getPartitions()
+        nodeCount = sum([len(p[2]) for p in partitions])
+        if self._pathTable is None or len(self._pathTable) > nodeCount * 2 + 1000:
+            self._pathTable = PathTable()
+            self._partitionTables = {}
+        # each partition has its own trigram index, which the full table reuses
+        useTrigramIndex = self._shouldUseTrigramIndex(nodeCount)
+        partitionTables = {}
+        tables = []
+        for namespace, generation, names, nodeTypes in partitions:
+            partitionTable = self._partitionTables.get(namespace)
+            if (partitionTable is None or partitionTable[0] != generation or
+                    (useTrigramIndex and names and partitionTable[1].trigramIndex is None)):
+                partitionTable = (generation, NodeTable(names, useTrigramIndex, nodeTypes, self._pathTable))
+            partitionTables[namespace] = partitionTable
+            tables.append((namespace, partitionTable[1]))
+        self._partitionTables = partitionTables
+        return NodeTable.concatenate(tables, useTrigramIndex)
+
+    def _shouldUseTrigramIndex(self, nodeCount):
+        return self.trigramIndexMinNodes is not None and nodeCount >= self.trigramIndexMinNodes
+
+    def _filterNodeTableByType(self, nodeTable, type=None, exactType=None, excludeType=None):
+        """
+        Return a new node table containing only the nodes that match the given
+        type filters, the same way the `ls` kwargs of the same names would.
+        Nodes matching either `type` or `exactType` are included,
+        then nodes matching `excludeType` are removed.
+        """
+        typeTable = self.nodeTypeTable
+        includeMask = typeTable.getTypesMask(type or [])
+        exactTypes = set(exactType or [])
+        excludeMask = typeTable.getTypesMask(excludeType or [])
+        rowsByType = nodeTable.getRowsByType()
+        rows = []
+        for nodeType, typeRows in rowsByType.items():
+            if (type or exactType) and not (nodeType in exactTypes or typeTable.inheritsAny(nodeType, includeMask)):
+                continue
+            if excludeMask and typeTable.inheritsAny(nodeType, excludeMask):
+                continue
+            rows.extend(typeRows)
+        rows.sort()
+        return nodeTable.getSubTable(rows, self._shouldUseTrigramIndex(len(rows)))
@@ -0,0 +1,73 @@
+
+import os
+
+from Qt import QtCore
+
+from engine import NodeSearchEngine
+from mayaascii import MayaAsciiNodeSource
+from nodes import NodeSearchModel
+
+
+
+class FileSearchModel(NodeSearchModel):
+    """
+    A NodeSearchModel that searches for nodes in maya ascii files on disk,
+    without opening them. Accepts the same queries as NodeSearchModel.
+
+    Files are indexed by a MayaAsciiNodeSource, and the nodes of all files are
+    searched together, so each result is a node long name along with the
+    files that contain it, see `getResultFiles`. The nodes of loaded
+    references are included in the namespace of each reference.
+
+    `ls` flags are applied using the node types in the files, flags that
+    depend on the state of an open scene, e.g. '-selection' or '-visible',
+    match no nodes, and so does '-underSelection'.
+    """
+
+    def __init__(self, parent=None):
+        super(FileSearchModel, self).__init__(parent)
+        # the node source listing the nodes of the searched files
+        self.fileSource = self.engine.nodeSource
+
+    @staticmethod
+    def getFileIndexCacheDir():
+        """
+        Return the folder to save the index of each file in, in the user prefs folder
+        """
+        import maya.cmds as cmds
+        return os.path.join(cmds.internalVar(userPrefDir=True), 'quicksearch', 'fileIndex')
+
+    def getNewSearchEngine(self): # override
+        # the files are only indexed again when `updateFileIndex` is called
+        return NodeSearchEngine(MayaAsciiNodeSource(self.getFileIndexCacheDir()))
+
+    def setFiles(self, paths):
+        """
+        Set the maya ascii files to search, and index them
+        """
+        self.fileSource.setFiles(paths)
+        self.forceUpdateResults()
+
+    def updateFileIndex(self, force=False):
+        """
+        Index any searched files that have changed on disk, and update the results
+        """
+        if self.fileSource.update(force):
+            self.forceUpdateResults()
+
+    def getItemData(self, index, role=QtCore.Qt.DisplayRole): # override
+        """
+        Return the short name of the result at the index, and the files that contain it as a tooltip
+        """
+        if role == QtCore.Qt.ToolTipRole:
+            return '\n'.join(self.getResultFiles(index.row()))
+        return super(FileSearchModel, self).getItemData(index, role)
+
+    def getResultFiles(self, row):
+        """
+        Return the paths of the files that contain the node in the given row of the results
+        """
+        return self.fileSource.getNodeFiles(self.getResultNode(row))
+
+    def getResultCountText(self): # override
+        return '{0} in {1} files'.format(super(FileSearchModel, self).getResultCountText(), len(self.fileSource.filePaths))
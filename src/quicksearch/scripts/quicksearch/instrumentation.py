@@ -0,0 +1,209 @@
+
+import io
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+__all__ = [
+    'FileStatsSink',
+    'LoggingStatsSink',
+    'NULL_STATS',
+    'NullSearchStats',
+    'SearchStats',
+    'StatsSink',
+]
+
+LOG = logging.getLogger(__name__)
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+
+class _Phase(object):
+    """
+    Adds the time spent inside a `with` block to a phase of a SearchStats
+    """
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+        self.startTime = None
+
+    def __enter__(self):
+        self.startTime = _timer()
+
+    def __exit__(self, *args):
+        self.stats.addTime(self.name, _timer() - self.startTime)
+
+
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+
+class NullSearchStats(object):
+    """
+    Stats that record nothing, used while instrumentation is disabled,
+    so that instrumented code costs a method call and nothing more.
+    """
+
+    enabled = False
+
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def addTime(self, name, seconds):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+
+# the shared stats used while instrumentation is disabled
+NULL_STATS = NullSearchStats()
+
+
+
+class SearchStats(object):
+    """
+    Timings and counters recorded while searching for and displaying
+    the results of a single query.
+
+    Time is recorded per named phase, e.g. 'parse' or 'search', and is
+    summed if a phase runs more than once. Phases may be nested, e.g.
+    'selectionSync' runs while the 'signals' phase is emitting results.
+    Counters are named the same way, e.g. 'nodesScanned' or 'rowsEmitted'.
+
+    Phases of async searches are recorded on the search worker thread,
+    so recording is guarded by a lock.
+    """
+
+    enabled = True
+
+    def __init__(self, query):
+        # the query these stats were recorded for
+        self.query = query
+        # the time the query was set
+        self.startTime = _timer()
+        # the time in seconds from setting the query until its results were
+        # displayed, including any search delay, or None if not finished yet
+        self.totalTime = None
+        # mapping of phase names to time in seconds, in the order they first ran
+        self.timings = OrderedDict()
+        # mapping of counter names to values
+        self.counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<SearchStats {0!r} {1}>'.format(self.query, self.format())
+
+    def phase(self, name):
+        """
+        Return a context manager that records the time spent inside it to a phase
+
+        >>> with stats.phase('search'):
+        ...     results = search()
+        """
+        return _Phase(self, name)
+
+    def addTime(self, name, seconds):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        """
+        Record the total time, called once the results have been displayed
+        """
+        self.totalTime = _timer() - self.startTime
+
+    def asDict(self):
+        """
+        Return the stats as a dict that can be serialized as json
+        """
+        return OrderedDict([
+            ('query', self.query),
+            ('totalTime', self.totalTime),
+            ('timings', OrderedDict(self.timings)),
+            ('counters', OrderedDict(self.counters)),
+        ])
+
+    def format(self):
+        """
+        Return the stats as a short line of text, with times in milliseconds
+        """
+        items = ['{0} {1:.1f}ms'.format(k, v * 1000) for k, v in self.timings.items()]
+        items.extend(['{0} {1}'.format(k, v) for k, v in self.counters.items()])
+        return ', '.join(items)
+
+
+
+class StatsSink(object):
+    """
+    Receives the stats of every query once its results are displayed.
+    Subclass and implement `write` to collect stats elsewhere.
+    """
+
+    def write(self, stats):
+        """
+        Args:
+            stats : `SearchStats`
+                the finished stats of a query
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+
+class LoggingStatsSink(StatsSink):
+    """
+    Logs the stats of every query
+    """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or LOG
+        self.level = level
+
+    def write(self, stats): # override
+        self.logger.log(self.level, '%r %.1fms (%s)', stats.query, (stats.totalTime or 0.0) * 1000, stats.format())
+
+
+
+class FileStatsSink(StatsSink):
+    """
+    Appends the stats of every query to a file, as one json object per line
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def write(self, stats): # override
+        if self._file is None:
+            self._file = io.open(self.path, 'a', encoding='utf-8')
+        data = json.dumps(stats.asDict())
+        if not isinstance(data, type(u'')):
+            data = data.decode('utf-8')
+        self._file.write(data + u'\n')
+        self._file.flush()
+
+    def close(self): # override
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,313 @@
+
+import heapq
+import re
+
+
+__all__ = [
+    'fuzzyScore',
+    'getFuzzyRegex',
+    'getFuzzyRegexSource',
+    'getResultsMemoryUsage',
+    'MatchStream',
+    'RankedResults',
+]
+
+
+# characters after which a match is considered to be at the start of a word
+BOUNDARY_CHARS = '|_:. -'
+
+# score given for each matched character
+SCORE_MATCH = 16
+# bonus for matching the first character of a word
+BONUS_BOUNDARY = 10
+# bonus for matching an upper case character following a lower case one
+BONUS_CAMEL_CASE = 8
+# bonus for a character matched directly after the previous one
+BONUS_CONSECUTIVE = 6
+# bonus for matching a character in the short name rather than the parent path
+BONUS_SHORT_NAME = 4
+# maximum penalty for the gap between two matched characters
+MAX_GAP_PENALTY = 6
+
+
+def getFuzzyRegexSource(pattern, stopChars=''):
+    """
+    Return the source of a regex that matches the characters of the given
+    pattern in order, without crossing any of the given stop characters.
+
+    Each gap only matches up to the next occurrence of the following character,
+    instead of using `.*?`, which backtracks through every combination of
+    positions when a long key almost matches a long pattern.
+    """
+    parts = []
+    for i, c in enumerate(pattern):
+        if i > 0:
+            parts.append('[^{0}]*'.format(re.escape(stopChars + c)))
+        parts.append(re.escape(c))
+    return ''.join(parts)
+
+
+def getFuzzyRegex(pattern):
+    """
+    Return a compiled regex that matches any string containing the
+    characters of the given pattern in order, e.g. 'ctl' matches 'control'.
+    """
+    return re.compile(getFuzzyRegexSource(pattern))
+
+
+def fuzzyScore(pattern, key, name):
+    """
+    Return a score for how well the given pattern matches a node name,
+    or None if the characters of the pattern are not all found in order.
+
+    Characters are matched as close to the end of the name as possible,
+    so that matches in the short name are preferred over the parent path.
+    Matches at the start of words (after '_', '|', etc), on camelCase humps,
+    and consecutive matches are scored higher, gaps are penalized.
+
+    Args:
+        pattern : `str`
+            lower case pattern to search for
+        key : `str`
+            lower case search key of the node
+        name : `str`
+            the original node name, used to find camelCase humps
+    """
+    # find positions of each pattern character, scanning backwards
+    positions = []
+    end = len(key)
+    for c in reversed(pattern):
+        end = key.rfind(c, 0, end)
+        if end < 0:
+            return None
+        positions.append(end)
+    positions.reverse()
+
+    shortNameStart = key.rfind('|') + 1
+    score = 0
+    prev = -1
+    for pos in positions:
+        score += SCORE_MATCH
+        if pos == 0 or key[pos - 1] in BOUNDARY_CHARS:
+            score += BONUS_BOUNDARY
+        elif name[pos].isupper() and name[pos - 1].islower():
+            score += BONUS_CAMEL_CASE
+        if prev >= 0:
+            if pos == prev + 1:
+                score += BONUS_CONSECUTIVE
+            else:
+                score -= min(pos - prev - 1, MAX_GAP_PENALTY)
+        if pos >= shortNameStart:
+            score += BONUS_SHORT_NAME
+        prev = pos
+    return score
+
+
+def getResultsMemoryUsage(results):
+    """
+    Return a rough estimate of the memory used by a set of search results in bytes,
+    either a list of rows, or results that estimate their own size, e.g. RankedResults
+    """
+    getMemoryUsage = getattr(results, 'getMemoryUsage', None)
+    if getMemoryUsage is not None:
+        return getMemoryUsage()
+    return 64 + len(results) * 8
+
+
+
+class RankedResults(object):
+    """
+    A list-like set of search results that are ordered by score lazily.
+
+    Only the best items are ranked as they are requested, with a bounded
+    `heapq.nsmallest`, and the rest are kept unranked in their original order
+    for later pages, so that ordering the first page of results costs
+    O(n log k) instead of sorting every match. The number of items ranked
+    at least doubles each time more are needed, so ranking every item is
+    still O(n log n). Items with equal scores keep their original order.
+    """
+
+    # the minimum number of items ranked at once
+    minRankCount = 100
+
+    def __init__(self, items, scores):
+        """
+        Args:
+            items : `list` of `int`
+                the matched items, in their original order
+            scores : `list` of `int`
+                the score of each item, higher is better
+        """
+        self._items = items
+        self._scores = scores
+        # indices into items that have not been ranked yet, in order, None if no item is ranked
+        self._unranked = None
+        self._ranked = []
+        self._length = len(items)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._length
+        self.rankTo(index + 1)
+        return self._ranked[index]
+
+    def __iter__(self):
+        self.rankTo(self._length)
+        return iter(self._ranked)
+
+    def __contains__(self, item):
+        self.rankTo(self._length)
+        return item in self._ranked
+
+    def index(self, item):
+        self.rankTo(self._length)
+        return self._ranked.index(item)
+
+    def getMemoryUsage(self):
+        """
+        Return a rough estimate of the memory used by these results in bytes
+        """
+        # the items and scores, their ints, and the unranked or ranked lists
+        return self._length * 80
+
+    @property
+    def numRanked(self):
+        """
+        The number of items that have been put in their final order
+        """
+        return len(self._ranked)
+
+    def rankTo(self, count):
+        """
+        Make sure at least the first `count` items are in their final order
+        """
+        ranked = self._ranked
+        if count <= len(ranked) or len(ranked) >= self._length:
+            return
+        count = min(max(count, 2 * len(ranked), self.minRankCount), self._length)
+        unranked = self._unranked if self._unranked is not None else range(self._length)
+        scores = self._scores
+        key = lambda i: -scores[i]
+        numMore = count - len(ranked)
+        if numMore >= len(unranked):
+            best = sorted(unranked, key=key)
+            unranked = []
+        else:
+            best = heapq.nsmallest(numMore, unranked, key=key)
+            bestSet = set(best)
+            unranked = [i for i in unranked if i not in bestSet]
+        items = self._items
+        ranked.extend([items[i] for i in best])
+        self._unranked = unranked
+        if not unranked:
+            # every item is ranked, the scores are no longer needed
+            self._items = self._scores = None
+
+
+
+class MatchStream(object):
+    """
+    A list-like set of search results that is searched lazily.
+
+    Only the items that have been requested with `fetchTo` are searched
+    for and stored, so that broad searches cost time and memory proportional
+    to the number of results displayed. The total number of matches can be
+    counted separately with `countAll`, without storing them, which doesn't
+    change the stream so that it can run on another thread.
+    """
+
+    # number of items checked at once when fetching or counting
+    chunkSize = 20000
+
+    def __init__(self, items, match=None):
+        """
+        Args:
+            items : `list`
+                the items to search, in the order results should be returned
+            match : `callable`
+                returns True if an item is a match, if None every item matches
+        """
+        self._items = items
+        self._match = match
+        # items found so far
+        self._matches = []
+        # index of the next item to check when fetching
+        self._position = 0
+        # the total number of matches, if counted before all were fetched
+        self._count = None
+
+    def __len__(self):
+        """
+        Return the number of matches fetched so far
+        """
+        return len(self._matches)
+
+    def __getitem__(self, index):
+        return self._matches[index]
+
+    def __iter__(self):
+        self.fetchTo(None)
+        return iter(self._matches)
+
+    @property
+    def isComplete(self):
+        """
+        True if every item has been searched and all matches fetched
+        """
+        return self._position >= len(self._items)
+
+    def getCount(self):
+        """
+        Return the total number of matches, or None if not known yet
+        """
+        if self.isComplete:
+            return len(self._matches)
+        return self._count
+
+    def fetchTo(self, count):
+        """
+        Search until at least `count` matches have been found,
+        or until all items have been searched if count is None.
+        """
+        items = self._items
+        match = self._match
+        while (count is None or len(self._matches) < count) and self._position < len(items):
+            chunk = items[self._position:self._position + self.chunkSize]
+            self._position += len(chunk)
+            if match is None:
+                self._matches.extend(chunk)
+            else:
+                self._matches.extend([i for i in chunk if match(i)])
+
+    def countAll(self, isCancelled=None):
+        """
+        Count all matches without storing them.
+        Does not change the stream, see `setCount` to store the result.
+
+        Args:
+            isCancelled : `callable`
+                if given, called before each chunk of items and
+                counting is abandoned when it returns True
+
+        Returns:
+            `int`
+                the total number of matches, or None if cancelled
+        """
+        items = self._items
+        match = self._match
+        count = 0
+        for start in range(0, len(items), self.chunkSize):
+            if isCancelled is not None and isCancelled():
+                return None
+            chunk = items[start:start + self.chunkSize]
+            count += len(chunk) if match is None else len([i for i in chunk if match(i)])
+        return count
+
+    def setCount(self, count):
+        """
+        Store the total number of matches, as returned by `countAll`
+        """
+        self._count = count
@@ -0,0 +1,805 @@
+
+import atexit
+import hashlib
+import io
+import logging
+import mmap
+import multiprocessing
+import os
+import re
+
+from engine import MayaNodeSource, StaticNodeSource
+from parallel import getMayapyExecutable
+
+
+__all__ = [
+    'MayaAsciiFile',
+    'MayaAsciiIndex',
+    'MayaAsciiNodeSource',
+    'parseMayaAscii',
+]
+
+LOG = logging.getLogger(__name__)
+
+# matches the start of every statement that creates, names, selects or parents
+# a node, adds an attribute to the selected node, or references a file.
+# these statements always start a line, and addAttr is indented by a tab
+_STATEMENT_REGEX = re.compile(br'\n(createNode|rename|select|parent|file|\taddAttr) ')
+# matches the arguments of a statement up to its ';', skipping quoted strings
+_STATEMENT_ARGS_REGEX = re.compile(br'(?:[^;"]|"(?:[^"\\]|\\.)*")*;')
+# matches each argument of a statement, either quoted or not
+_ARG_REGEX = re.compile(br'"((?:[^"\\]|\\.)*)"|([^\s;]+)')
+_ESCAPE_REGEX = re.compile(r'\\(.)')
+
+# common dag node types, used to decide whether a node without parents
+# or children is a dag node when the node type table is not available
+DAG_TYPES = frozenset([
+    'ambientLight', 'camera', 'directionalLight', 'follicle', 'ikEffector',
+    'ikHandle', 'joint', 'locator', 'mesh', 'nurbsCurve', 'nurbsSurface',
+    'pointLight', 'spotLight', 'transform',
+])
+
+# all file indices with worker processes, which are stopped when python exits
+_openIndices = set()
+
+
+@atexit.register
+def _closeIndices():
+    for index in list(_openIndices):
+        index.close()
+
+
+def _splitArgs(data):
+    """
+    Return a list of (value, is quoted) for each argument of a statement
+    """
+    result = []
+    for match in _ARG_REGEX.finditer(data):
+        quoted = match.group(1)
+        if quoted is not None:
+            value = _ESCAPE_REGEX.sub(r'\1', quoted.decode('utf-8', 'replace'))
+            result.append((value, True))
+        else:
+            result.append((match.group(2).decode('utf-8', 'replace'), False))
+    return result
+
+
+def _getFlagValues(args, flags):
+    """
+    Return the value following the first of any of the given flags, or None,
+    and the positional arguments, assuming every other flag takes no value
+    """
+    value = None
+    positional = []
+    i = 0
+    while i < len(args):
+        arg, quoted = args[i]
+        if not quoted and arg.startswith('-'):
+            if arg in flags and i + 1 < len(args):
+                if value is None:
+                    value = args[i + 1][0]
+                i += 1
+        else:
+            positional.append(arg)
+        i += 1
+    return value, positional
+
+
+
+class MayaAsciiFile(object):
+    """
+    The nodes and references of a single maya ascii file, as written in the file.
+    Node names include their namespaces but not their parents, the parent of
+    each node is stored separately, see `MayaAsciiIndex.getNodes` for long names.
+    """
+
+    def __init__(self, path, size=0, mtime=0.0):
+        # the path, size and modification time of the file when it was parsed
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        # the name, type and parent index of each node, or -1 if the node has no
+        # parent in this file, in the order they are created
+        self.names = []
+        self.types = []
+        self.parents = []
+        # mapping of node indices to the names of parents that are not created
+        # in this file, e.g. referenced nodes
+        self.externalParents = {}
+        # mapping of node indices to the additional parents of instanced nodes,
+        # each either a node index or the name of a parent not created in this file
+        self.instanceParents = {}
+        # mapping of node indices to the long and short names of their dynamic attributes
+        self.attributes = {}
+        # list of (namespace, path as written, is loaded) for each reference
+        self.references = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def addNode(self, name, nodeType, parent=-1):
+        self.names.append(name)
+        self.types.append(nodeType)
+        self.parents.append(parent)
+        return len(self.names) - 1
+
+
+
+class _Parser(object):
+    """
+    Reads the statements of a maya ascii file into a MayaAsciiFile
+    """
+
+    def __init__(self, result):
+        self.result = result
+        # mapping of node names to the indices of nodes with that name,
+        # since dag nodes are only unique by their parents
+        self.nodesByName = {}
+        # the index of the node that addAttr applies to, or None
+        self.current = None
+
+    def findNode(self, path):
+        """
+        Return the index of the last created node matching a name or partial path
+        """
+        segments = path.lstrip(':').split('|')
+        candidates = self.nodesByName.get(segments[-1])
+        if not candidates:
+            return None
+        if len(segments) == 1:
+            return candidates[-1]
+        parents = self.result.parents
+        names = self.result.names
+        for index in reversed(candidates):
+            # compare the parents of the candidate with the path
+            node = index
+            for segment in reversed(segments[:-1]):
+                if not segment:
+                    # a leading '|', the path must start at the root
+                    if parents[node] < 0:
+                        return index
+                    break
+                node = parents[node]
+                if node < 0 or names[node] != segment:
+                    break
+            else:
+                return index
+        return None
+
+    def parse(self, data):
+        pos = 0
+        while True:
+            match = _STATEMENT_REGEX.search(data, pos)
+            if match is None:
+                return
+            argsMatch = _STATEMENT_ARGS_REGEX.match(data, match.end())
+            if argsMatch is None:
+                # an unterminated string, skip the statement
+                pos = match.end()
+                continue
+            pos = argsMatch.end()
+            args = _splitArgs(argsMatch.group(0))
+            command = match.group(1)
+            if command == b'createNode':
+                self.createNode(args)
+            elif command == b'\taddAttr':
+                self.addAttr(args)
+            elif command == b'select':
+                name, positional = _getFlagValues(args, ('-ne',))
+                self.current = self.findNode(name) if name else None
+            elif command == b'rename':
+                self.rename(args)
+            elif command == b'parent':
+                self.parent(args)
+            elif command == b'file':
+                self.addReference(args)
+
+    def createNode(self, args):
+        if not args:
+            return
+        result = self.result
+        nodeType = args[0][0]
+        name = parentName = None
+        i = 1
+        while i < len(args):
+            if args[i][0] == '-n' and i + 1 < len(args):
+                name = args[i + 1][0]
+                i += 1
+            elif args[i][0] == '-p' and i + 1 < len(args):
+                parentName = args[i + 1][0]
+                i += 1
+            i += 1
+        if not name:
+            name = nodeType + '1'
+        parent = -1
+        if parentName:
+            parent = self.findNode(parentName)
+            if parent is None:
+                parent = -1
+        index = result.addNode(name, nodeType, parent)
+        if parentName and parent < 0:
+            result.externalParents[index] = parentName
+        self.nodesByName.setdefault(name, []).append(index)
+        self.current = index
+
+    def addAttr(self, args):
+        if self.current is None:
+            return
+        names = []
+        for i in range(len(args) - 1):
+            if args[i][0] in ('-ln', '-sn'):
+                names.append(args[i + 1][0])
+        if names:
+            self.result.attributes.setdefault(self.current, []).extend(names)
+
+    def rename(self, args):
+        # uuids are set with `rename -uid`, and are not needed
+        uid, positional = _getFlagValues(args, ('-uid',))
+        if not positional:
+            return
+        if len(positional) == 1:
+            index = self.current
+        else:
+            index = self.findNode(positional[0])
+        if index is None:
+            return
+        oldName = self.result.names[index]
+        newName = positional[-1].split('|')[-1]
+        self.nodesByName[oldName].remove(index)
+        self.nodesByName.setdefault(newName, []).append(index)
+        self.result.names[index] = newName
+
+    def parent(self, args):
+        """
+        Reparent nodes, or add instances of them to another parent with `-add`.
+        Only nodes created in this file are reparented or instanced, changes to
+        referenced nodes are stored as reference edits instead.
+        """
+        flags = [a for a, quoted in args if not quoted and a.startswith('-')]
+        positional = [a for a, quoted in args if quoted or not a.startswith('-')]
+        if '-rm' in flags or '-removeObject' in flags:
+            return
+        toWorld = '-w' in flags or '-world' in flags
+        if toWorld:
+            parentName = None
+        elif len(positional) < 2:
+            return
+        else:
+            parentName = positional.pop()
+        result = self.result
+        parent = self.findNode(parentName) if parentName else None
+        if parent is None:
+            parent = -1
+        for childName in positional:
+            index = self.findNode(childName)
+            if index is None or index == parent:
+                continue
+            if '-add' in flags or '-addObject' in flags:
+                if parentName:
+                    result.instanceParents.setdefault(index, []).append(parent if parent >= 0 else parentName)
+                continue
+            result.parents[index] = parent
+            if parentName and parent < 0:
+                result.externalParents[index] = parentName
+            else:
+                result.externalParents.pop(index, None)
+
+    def addReference(self, args):
+        # `file -rdi` describes the load state of nested references,
+        # which are read from the referenced files themselves
+        flags = [a for a, quoted in args if not quoted]
+        if '-r' not in flags or not args or not args[-1][1]:
+            return
+        namespace, positional = _getFlagValues(args, ('-ns',))
+        deferred, positional = _getFlagValues(args, ('-dr',))
+        self.result.references.append((namespace or '', args[-1][0], deferred != '1'))
+
+
+def parseMayaAscii(path):
+    """
+    Return a MayaAsciiFile with the nodes and references of a maya ascii file.
+
+    The file is memory-mapped and only the statements that create, name, parent
+    or add attributes to nodes, or reference files, are read. Everything else, such as
+    setAttr and connectAttr, is skipped without decoding.
+    """
+    stat = os.stat(path)
+    result = MayaAsciiFile(path, stat.st_size, stat.st_mtime)
+    if not stat.st_size:
+        return result
+    with open(path, 'rb') as fp:
+        data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        _Parser(result).parse(data)
+    finally:
+        data.close()
+    return result
+
+
+def _indexFile(args):
+    """
+    Parse a maya ascii file and save its index, in a worker process
+
+    Returns:
+        `MayaAsciiFile`
+            the parsed file, or None if it could not be read
+    """
+    path, cachePath = args
+    try:
+        result = parseMayaAscii(path)
+    except (IOError, OSError) as e:
+        LOG.warning('Failed to read {0}: {1}'.format(path, e))
+        return None
+    if cachePath:
+        MayaAsciiIndex.writeCacheFile(cachePath, result)
+    return result
+
+
+
+class MayaAsciiIndex(object):
+    """
+    An index of the nodes in maya ascii files on disk, that can be searched
+    without opening the files in maya.
+
+    Each file is parsed once, see `parseMayaAscii`, and its index is saved
+    to a cache file that is only used while the size and modification time
+    of the file are unchanged. Files that need parsing are split across a pool
+    of worker processes. Referenced maya ascii files are indexed along with the
+    files that reference them, so that the nodes of loaded references are
+    included in the nodes of a file, in the namespace of the reference.
+    Instanced dag nodes are listed once for every path to them.
+
+    Cache file format, utf-8 text, one entry per line after the header:
+        quicksearch-ma-index <format version>
+        <size>\\t<mtime>\\t<path>
+        R\\t<namespace>\\t<is loaded>\\t<reference path>
+        N\\t<type>\\t<parent index>\\t<name>\\t<space separated attributes>
+        P\\t<node index>\\t<external parent name>
+        I\\t<node index>\\t<instance parent index, or -1>\\t<external instance parent name>
+    """
+
+    # the version of the cache file format, increment when changing the format
+    formatVersion = 2
+    # the first line of every cache file
+    magic = 'quicksearch-ma-index'
+
+    def __init__(self, cacheDir=None, processes=None):
+        """
+        Args:
+            cacheDir : `str`
+                the folder to save the index of each file in,
+                if None, files are parsed again every time they are loaded
+            processes : `int`
+                number of worker processes, defaults to the number of cpus
+        """
+        self.cacheDir = cacheDir
+        self.processes = processes or multiprocessing.cpu_count()
+        # minimum number of files to parse at once for which the pool is used,
+        # starting the workers takes longer than parsing a few files
+        self.minParallelFiles = 4
+        # incremented every time any indexed file changes
+        self.generation = 0
+        # mapping of normalized paths to their MayaAsciiFile
+        self._files = {}
+        self._pool = None
+
+    def close(self):
+        """
+        Stop the worker processes
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        _openIndices.discard(self)
+
+    def _getPool(self):
+        if self._pool is None:
+            context = multiprocessing.get_context('spawn')
+            executable = getMayapyExecutable()
+            if executable:
+                context.set_executable(executable)
+            self._pool = context.Pool(self.processes)
+            _openIndices.add(self)
+        return self._pool
+
+    @staticmethod
+    def normalizePath(path):
+        return os.path.normpath(os.path.abspath(os.path.expandvars(path)))
+
+    def getCachePath(self, path):
+        """
+        Return the path of the cache file for a maya ascii file, or None if not caching
+        """
+        if not self.cacheDir:
+            return None
+        key = hashlib.sha1(os.path.normcase(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cacheDir, key + '.txt')
+
+    def getFile(self, path):
+        """
+        Return the MayaAsciiFile of an indexed file, or None
+        """
+        return self._files.get(self.normalizePath(path))
+
+    def resolveReferencePath(self, referencePath, path):
+        """
+        Return the normalized path of a file referenced by a file, or None
+        if it is not a maya ascii file. Relative paths are relative to the
+        folder of the referencing file.
+        """
+        # copy numbers are appended to the paths of files referenced more than once
+        referencePath = os.path.expandvars(re.sub(r'\{\d+\}$', '', referencePath))
+        if not referencePath.lower().endswith('.ma'):
+            return None
+        if not os.path.isabs(referencePath):
+            referencePath = os.path.join(os.path.dirname(path), referencePath)
+        return self.normalizePath(referencePath)
+
+    def update(self, paths):
+        """
+        Index the given files and the maya ascii files they reference.
+        Files that have not changed since they were last indexed are kept.
+
+        Returns:
+            `bool`
+                True if any file changed
+        """
+        changed = False
+        pending = [self.normalizePath(p) for p in paths]
+        visited = set()
+        while pending:
+            paths = []
+            for path in pending:
+                if path not in visited:
+                    visited.add(path)
+                    paths.append(path)
+            toParse = []
+            for path in paths:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    if self._files.pop(path, None) is not None:
+                        changed = True
+                    continue
+                current = self._files.get(path)
+                if current is not None and (current.size, current.mtime) == (stat.st_size, stat.st_mtime):
+                    continue
+                cached = self.readCacheFile(self.getCachePath(path), path, stat)
+                if cached is not None:
+                    self._files[path] = cached
+                    changed = True
+                else:
+                    toParse.append(path)
+            for result in self._parseFiles(toParse):
+                if result is not None:
+                    self._files[result.path] = result
+                    changed = True
+            # index referenced files next
+            pending = []
+            for path in paths:
+                indexedFile = self._files.get(path)
+                if indexedFile is None:
+                    continue
+                for namespace, referencePath, isLoaded in indexedFile.references:
+                    referencePath = self.resolveReferencePath(referencePath, path)
+                    if isLoaded and referencePath and referencePath not in visited:
+                        pending.append(referencePath)
+        if changed:
+            self.generation += 1
+        return changed
+
+    def _parseFiles(self, paths):
+        """
+        Parse files and save their indices, in parallel if there are enough of them
+        """
+        args = [(p, self.getCachePath(p)) for p in paths]
+        if len(args) < self.minParallelFiles or self.processes < 2:
+            return [_indexFile(a) for a in args]
+        try:
+            return self._getPool().map(_indexFile, args)
+        except Exception:
+            LOG.warning('Failed to index files in parallel', exc_info=True)
+            return [_indexFile(a) for a in args]
+
+    def getNodes(self, path, isDagType=None):
+        """
+        Return the nodes of an indexed file, including the nodes of its loaded
+        references, which are renamed into the namespace of each reference.
+
+        Long names are only built for dag nodes, the way maya lists them.
+        A node is a dag node if it has a parent or children, or else if
+        its type is a dag type.
+
+        Args:
+            path : `str`
+                the path of an indexed file
+            isDagType : `callable`
+                returns True if a node type is a dag node type, defaults to
+                checking a few common types, see `DAG_TYPES`
+
+        Returns:
+            `list` of (`str`, `str`, `list` of `str`, `bool`)
+                the long name, type, dynamic attributes,
+                and whether the node is referenced, of each node
+        """
+        return self._getNodes(self.normalizePath(path), isDagType or DAG_TYPES.__contains__, set())
+
+    def _getNodes(self, path, isDagType, visiting):
+        indexedFile = self._files.get(path)
+        if indexedFile is None or path in visiting:
+            return []
+        visiting.add(path)
+        referencedNodes = []
+        for namespace, referencePath, isLoaded in indexedFile.references:
+            referencePath = self.resolveReferencePath(referencePath, path)
+            if not isLoaded or not referencePath:
+                continue
+            for longName, nodeType, attributes, isReferenced in self._getNodes(referencePath, isDagType, visiting):
+                if namespace:
+                    longName = '|'.join([s and namespace + ':' + s for s in longName.split('|')])
+                referencedNodes.append((longName, nodeType, attributes, True))
+        visiting.discard(path)
+
+        names = indexedFile.names
+        parents = indexedFile.parents
+        externalParents = indexedFile.externalParents
+        instanceParents = indexedFile.instanceParents
+        hasChildren = set(parents)
+        hasChildren.update(externalParents)
+        hasChildren.update(instanceParents)
+        for indexParents in instanceParents.values():
+            hasChildren.update(p for p in indexParents if isinstance(p, int))
+        # the long names of every path to each node
+        longNames = [None] * len(names)
+        # mapping of the short names of referenced dag nodes to their long names,
+        # to find the long names of external parents
+        referencedDagNodes = {}
+        if externalParents or instanceParents:
+            for longName, nodeType, attributes, isReferenced in referencedNodes:
+                if longName.startswith('|'):
+                    referencedDagNodes.setdefault(longName[longName.rfind('|') + 1:], []).append(longName)
+
+        def getExternalParentName(parentName):
+            if parentName.startswith('|'):
+                return parentName
+            for longName in referencedDagNodes.get(parentName[parentName.rfind('|') + 1:], []):
+                if longName.endswith('|' + parentName):
+                    return longName
+            return '|' + parentName
+
+        def getParentLongNames(parent):
+            if isinstance(parent, int):
+                return getLongNames(parent)
+            return [getExternalParentName(parent)]
+
+        def getLongNames(index):
+            indexLongNames = longNames[index]
+            if indexLongNames is None:
+                name = names[index]
+                parent = parents[index]
+                if parent >= 0:
+                    indexLongNames = [p + '|' + name for p in getLongNames(parent)]
+                elif index in externalParents:
+                    indexLongNames = [getExternalParentName(externalParents[index]) + '|' + name]
+                elif index in hasChildren or isDagType(indexedFile.types[index]):
+                    indexLongNames = ['|' + name]
+                else:
+                    indexLongNames = [name]
+                for instanceParent in instanceParents.get(index, []):
+                    indexLongNames.extend([p + '|' + name for p in getParentLongNames(instanceParent)])
+                longNames[index] = indexLongNames
+            return indexLongNames
+
+        result = []
+        for index in range(len(names)):
+            attributes = indexedFile.attributes.get(index, [])
+            for longName in getLongNames(index):
+                result.append((longName, indexedFile.types[index], attributes, False))
+        result.extend(referencedNodes)
+        return result
+
+    @classmethod
+    def writeCacheFile(cls, cachePath, indexedFile):
+        lines = [
+            '{0} {1}'.format(cls.magic, cls.formatVersion),
+            '\t'.join([str(indexedFile.size), repr(indexedFile.mtime), indexedFile.path]),
+        ]
+        for namespace, referencePath, isLoaded in indexedFile.references:
+            lines.append('\t'.join(['R', namespace, str(int(isLoaded)), referencePath]))
+        attributes = indexedFile.attributes
+        for index, name in enumerate(indexedFile.names):
+            lines.append('\t'.join(['N', indexedFile.types[index], str(indexedFile.parents[index]), name,
+                                    ' '.join(attributes.get(index, []))]))
+        for index, parentName in sorted(indexedFile.externalParents.items()):
+            lines.append('\t'.join(['P', str(index), parentName]))
+        for index, instanceParents in sorted(indexedFile.instanceParents.items()):
+            for parent in instanceParents:
+                if isinstance(parent, int):
+                    lines.append('\t'.join(['I', str(index), str(parent), '']))
+                else:
+                    lines.append('\t'.join(['I', str(index), '-1', parent]))
+        dirName = os.path.dirname(cachePath)
+        tempPath = '{0}.{1}.tmp'.format(cachePath, os.getpid())
+        try:
+            if dirName and not os.path.isdir(dirName):
+                try:
+                    os.makedirs(dirName)
+                except OSError:
+                    # created by another worker
+                    pass
+            with io.open(tempPath, 'w', encoding='utf-8', newline='\n') as fp:
+                fp.write(u'\n'.join(lines) + u'\n')
+            # replace atomically so other processes never read a partial file
+            if hasattr(os, 'replace'):
+                os.replace(tempPath, cachePath)
+            else:
+                if os.path.isfile(cachePath):
+                    os.remove(cachePath)
+                os.rename(tempPath, cachePath)
+        except (IOError, OSError) as e:
+            LOG.warning('Failed to write maya ascii index: {0}'.format(e))
+
+    @classmethod
+    def readCacheFile(cls, cachePath, path, stat):
+        """
+        Return the MayaAsciiFile saved in a cache file, or None if the cache file
+        is missing, or does not match the path, size and mtime of the file
+        """
+        if not cachePath:
+            return None
+        try:
+            with io.open(cachePath, 'r', encoding='utf-8', newline='\n') as fp:
+                header = fp.readline().split()
+                fileKey = fp.readline().rstrip('\n').split('\t', 2)
+                if header != [cls.magic, str(cls.formatVersion)] or len(fileKey) != 3:
+                    return None
+                if fileKey[2] != path or fileKey[:2] != [str(stat.st_size), repr(stat.st_mtime)]:
+                    return None
+                lines = fp.read().split('\n')
+        except (IOError, OSError, ValueError):
+            return None
+        result = MayaAsciiFile(path, stat.st_size, stat.st_mtime)
+        for line in lines:
+            items = line.split('\t')
+            if items[0] == 'N' and len(items) == 5:
+                index = result.addNode(items[3], items[1], int(items[2]))
+                if items[4]:
+                    result.attributes[index] = items[4].split(' ')
+            elif items[0] == 'R' and len(items) == 4:
+                result.references.append((items[1], items[3], items[2] == '1'))
+            elif items[0] == 'P' and len(items) == 3:
+                result.externalParents[int(items[1])] = items[2]
+            elif items[0] == 'I' and len(items) == 4:
+                parent = int(items[2])
+                result.instanceParents.setdefault(int(items[1]), []).append(parent if parent >= 0 else items[3])
+        return result
+
+
+
+class MayaAsciiNodeSource(StaticNodeSource):
+    """
+    A NodeSource that lists the nodes of maya ascii files on disk, so that
+    a NodeSearchEngine can search them without opening them, with or without maya.
+
+    The nodes of all files are listed together, see `getNodeFiles` for the
+    files that contain each node. Node types are taken from maya when it is
+    available, otherwise only the types of the nodes in the files are known,
+    and dag types are guessed, see `DAG_TYPES`.
+
+    `ls` flags that depend on the state of an open scene, e.g. '-selection'
+    or '-visible', match no nodes, and so does '-underSelection'.
+    """
+
+    def __init__(self, cacheDir=None, processes=None):
+        """
+        Args:
+            cacheDir : `str`
+                the folder to save the index of each file in, see `MayaAsciiIndex`
+            processes : `int`
+                number of worker processes used to index files
+        """
+        super(MayaAsciiNodeSource, self).__init__()
+        # the index of all searched files and the files they reference
+        self.fileIndex = MayaAsciiIndex(cacheDir, processes)
+        # the normalized paths of the searched files
+        self.filePaths = []
+        # mapping of node long names to the indices of the files that contain them
+        self._nodeFiles = {}
+        # the maya node source used to list node types, or None if maya is not available
+        self._mayaSource = MayaNodeSource()
+        # cached inherited types of each node type, including itself
+        self._inheritedTypesCache = {}
+
+    def setFiles(self, paths):
+        """
+        Set the maya ascii files to search, and index them
+        """
+        self.filePaths = [self.fileIndex.normalizePath(p) for p in paths]
+        self.update(force=True)
+
+    def update(self, force=False):
+        """
+        Index any searched files that have changed on disk, and list their nodes.
+
+        Returns:
+            `bool`
+                True if the nodes were listed again
+        """
+        if not self.fileIndex.update(self.filePaths) and not force:
+            return False
+        dagTypes = ['dagNode']
+        isDagTypeCache = {}
+
+        def isDagType(nodeType):
+            result = isDagTypeCache.get(nodeType)
+            if result is None:
+                result = isDagTypeCache[nodeType] = self.inheritsAny(nodeType, dagTypes)
+            return result
+
+        nodeTypes = {}
+        nodeFiles = {}
+        nodeAttributes = {}
+        localNodes = set()
+        for fileIndex, path in enumerate(self.filePaths):
+            for longName, nodeType, attributes, isReferenced in self.fileIndex.getNodes(path, isDagType):
+                files = nodeFiles.get(longName)
+                if files is None:
+                    # the type of a node is taken from the first file that contains it
+                    nodeTypes[longName] = nodeType
+                    files = nodeFiles[longName] = []
+                if not files or files[-1] != fileIndex:
+                    files.append(fileIndex)
+                if attributes:
+                    nodeAttributes.setdefault(longName, set()).update(attributes)
+                if not isReferenced:
+                    localNodes.add(longName)
+        self._nodeFiles = nodeFiles
+        # nodes are referenced if they are referenced in every file that contains them
+        self.setNodes(list(nodeTypes.items()), nodeAttributes, set(nodeTypes).difference(localNodes))
+        return True
+
+    def getNodeFiles(self, longName):
+        """
+        Return the paths of the files that contain a node
+        """
+        fileIndices = self._nodeFiles.get(longName, [])
+        return [self.filePaths[i] for i in fileIndices if i < len(self.filePaths)]
+
+    def listNodeTypes(self): # override
+        if self._mayaSource is not None:
+            try:
+                return self._mayaSource.listNodeTypes()
+            except ImportError:
+                self._mayaSource = None
+        return super(MayaAsciiNodeSource, self).listNodeTypes() + ['dagNode']
+
+    def listInheritedNodeTypes(self, nodeType): # override
+        inheritedTypes = self._inheritedTypesCache.get(nodeType)
+        if inheritedTypes is None:
+            if self._mayaSource is not None:
+                try:
+                    inheritedTypes = self._mayaSource.listInheritedNodeTypes(nodeType)
+                except ImportError:
+                    self._mayaSource = None
+                except RuntimeError:
+                    # e.g. types of plugins that are not loaded
+                    pass
+            if not inheritedTypes:
+                inheritedTypes = ['dagNode', nodeType] if nodeType in DAG_TYPES else [nodeType]
+            self._inheritedTypesCache[nodeType] = inheritedTypes
+        return inheritedTypes
+
+    def listTypeAttributes(self, nodeType): # override
+        if self._mayaSource is None:
+            return []
+        try:
+            return self._mayaSource.listTypeAttributes(nodeType)
+        except ImportError:
+            self._mayaSource = None
+            return []
+
+    def close(self):
+        """
+        Stop the worker processes of the file index
+        """
+        self.fileIndex.close()
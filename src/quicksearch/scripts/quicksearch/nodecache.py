@@ -0,0 +1,590 @@
+
+from nodetable import getNamespace
+
+
+__all__ = [
+    'MayaNodeEventSource',
+    'NodeCache',
+    'NodeEventSource',
+]
+
+
+
+class NodeCache(object):
+    """
+    A cache of all node long names and types in the scene that is kept
+    up to date from scene events, so the full node list only has to be
+    queried when a scene is opened or created.
+
+    Nodes are partitioned by namespace, and each partition keeps track of
+    the generation it last changed in, so that loading or unloading a
+    reference only invalidates the partitions of its namespace.
+
+    Events are reported by a NodeEventSource, which can be replaced
+    to drive the cache from something other than maya callbacks.
+    """
+
+    def __init__(self, listNodes, eventSource=None):
+        """
+        Args:
+            listNodes : `callable`
+                returns a list of (long name, node type) for all nodes in the scene
+            eventSource : `NodeEventSource`
+                the source of scene events that keep this cache up to date,
+                if None the full node list is queried every time
+        """
+        self.listNodes = listNodes
+        self.eventSource = eventSource
+        # incremented every time the set of nodes changes
+        self.generation = 0
+        # mapping of namespaces to a mapping of node long names to their type,
+        # or None if a full update is needed
+        self._partitions = None
+        # mapping of namespaces to the generation their partition last changed in
+        self._partitionGenerations = {}
+        # mapping of namespaces to sorted lists of their node names and types
+        self._sortedPartitions = {}
+        # lists of the current node names and types, built when needed
+        self._sortedNodes = None
+        if self.eventSource is not None:
+            self.eventSource.start(self)
+
+    def close(self):
+        """
+        Stop listening for scene events
+        """
+        if self.eventSource is not None:
+            self.eventSource.stop()
+
+    def getGeneration(self):
+        """
+        Return the current generation of the cache, which changes whenever
+        any node in the scene is added, removed or renamed.
+        Always changes if there is no event source.
+        """
+        if self.eventSource is None:
+            self.onSceneReset()
+        else:
+            self.eventSource.flush()
+        return self.generation
+
+    def _getPartitions(self):
+        if self.eventSource is None:
+            self.onSceneReset()
+        else:
+            self.eventSource.flush()
+        if self._partitions is None:
+            self._partitions = {}
+            # a full update is part of the current generation
+            for namespace in self._addNodes(self.listNodes()):
+                self._partitionGenerations[namespace] = self.generation
+        return self._partitions
+
+    def getPartitions(self):
+        """
+        Return the nodes of each namespace in the scene, sorted by namespace.
+        The returned lists must not be modified.
+
+        Returns:
+            `list` of (`str`, `int`, `list` of `str`, `list` of `str`)
+                namespace, generation the partition last changed in,
+                sorted node long names, node types
+        """
+        partitions = self._getPartitions()
+        result = []
+        for namespace in sorted(partitions):
+            sortedPartition = self._sortedPartitions.get(namespace)
+            if sortedPartition is None:
+                nodes = partitions[namespace]
+                names = sorted(nodes)
+                sortedPartition = (names, [nodes[n] for n in names])
+                self._sortedPartitions[namespace] = sortedPartition
+            names, nodeTypes = sortedPartition
+            result.append((namespace, self._partitionGenerations[namespace], names, nodeTypes))
+        return result
+
+    def getNodes(self):
+        """
+        Return a list of all node long names in the scene, sorted by
+        namespace and then by name, and a list of the type of each node.
+        The returned lists must not be modified.
+
+        Returns:
+            `list` of `str`, `list` of `str`
+                node long names, node types
+        """
+        partitions = self.getPartitions()
+        if self._sortedNodes is None:
+            names = []
+            nodeTypes = []
+            for namespace, generation, partitionNames, partitionTypes in partitions:
+                names.extend(partitionNames)
+                nodeTypes.extend(partitionTypes)
+            self._sortedNodes = (names, nodeTypes)
+        return self._sortedNodes
+
+    def _addNodes(self, nodes):
+        """
+        Add nodes to their partitions and return the set of changed namespaces
+        """
+        partitions = self._partitions
+        changed = set()
+        for name, nodeType in nodes:
+            namespace = getNamespace(name)
+            partition = partitions.get(namespace)
+            if partition is None:
+                partition = partitions[namespace] = {}
+            partition[name] = nodeType
+            changed.add(namespace)
+        return changed
+
+    def _setChanged(self, namespaces):
+        self.generation += 1
+        for namespace in namespaces:
+            self._partitionGenerations[namespace] = self.generation
+            self._sortedPartitions.pop(namespace, None)
+            if not self._partitions.get(namespace, True):
+                # remove empty partitions
+                del self._partitions[namespace]
+        self._sortedNodes = None
+
+    def onSceneReset(self):
+        """
+        Called when a scene is opened or created, or whenever
+        the cache cannot be updated incrementally.
+        """
+        self._partitions = None
+        self._partitionGenerations = {}
+        self._sortedPartitions = {}
+        self._sortedNodes = None
+        self.generation += 1
+
+    def onNodesAdded(self, nodes):
+        """
+        Called when nodes are added to the scene.
+
+        Args:
+            nodes : `list` of (`str`, `str`)
+                the long name and type of each added node
+        """
+        if self._partitions is None:
+            return
+        self._setChanged(self._addNodes(nodes))
+
+    def onNodesRemoved(self, names):
+        partitions = self._partitions
+        if partitions is None:
+            return
+        changed = set()
+        for name in names:
+            namespace = getNamespace(name)
+            partition = partitions.get(namespace)
+            if partition is not None and partition.pop(name, None) is not None:
+                changed.add(namespace)
+        if changed:
+            self._setChanged(changed)
+
+    def onNodeRenamed(self, oldName, newName):
+        """
+        Called when a node is renamed or reparented. Also updates
+        the long names of all descendants of the node.
+        """
+        partitions = self._partitions
+        if partitions is None:
+            return
+        oldNamespace = getNamespace(oldName)
+        partition = partitions.get(oldNamespace)
+        if partition is None or oldName not in partition:
+            return
+        nodeType = partition.pop(oldName)
+        changed = self._addNodes([(newName, nodeType)])
+        changed.add(oldNamespace)
+        if oldName.startswith('|'):
+            # descendants keep their own namespace, only their parent path changes
+            prefix = oldName + '|'
+            for namespace, partition in partitions.items():
+                descendants = [n for n in partition if n.startswith(prefix)]
+                for name in descendants:
+                    partition[newName + name[len(oldName):]] = partition.pop(name)
+                if descendants:
+                    changed.add(namespace)
+        self._setChanged(changed)
+
+    def onNamespaceReset(self, namespace, nodes):
+        """
+        Called when all nodes in a namespace and its child namespaces
+        have changed at once, e.g. when a reference is loaded or unloaded.
+        Only the partitions of those namespaces are replaced.
+
+        Args:
+            namespace : `str`
+                the namespace, without a leading ':'
+            nodes : `list` of (`str`, `str`)
+                the long name and type of every node now in the namespace
+        """
+        partitions = self._partitions
+        if partitions is None:
+            return
+        prefix = namespace + ':'
+        changed = set([ns for ns in partitions if ns == namespace or ns.startswith(prefix)])
+        for ns in changed:
+            partitions[ns] = {}
+        changed.update(self._addNodes(nodes))
+        self._setChanged(changed)
+
+
+
+class NodeEventSource(object):
+    """
+    Reports scene changes to a NodeCache, and to any other listeners,
+    such as an AttributeIndex. Listeners implement any of the same `on...`
+    methods as the cache, plus `onAttributesChanged`.
+
+    This base class never reports anything on its own, but the emit
+    methods can be called directly to simulate scene events,
+    e.g. to test a NodeCache outside of maya.
+    """
+
+    def __init__(self):
+        self.cache = None
+        self.listeners = []
+
+    def start(self, cache):
+        """
+        Start reporting events to the given cache
+        """
+        self.cache = cache
+
+    def stop(self):
+        """
+        Stop reporting events
+        """
+        self.cache = None
+
+    def addListener(self, listener):
+        """
+        Report events to a listener as well as to the cache, until removed
+        """
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def removeListener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def flush(self):
+        """
+        Report any events that have been buffered.
+        Called by the cache before its nodes are used.
+        """
+        pass
+
+    def _notify(self, methodName, *args):
+        if self.cache is None:
+            return
+        method = getattr(self.cache, methodName, None)
+        if method is not None:
+            method(*args)
+        for listener in self.listeners:
+            method = getattr(listener, methodName, None)
+            if method is not None:
+                method(*args)
+
+    def emitSceneReset(self):
+        self._notify('onSceneReset')
+
+    def emitNodesAdded(self, nodes):
+        if nodes:
+            self._notify('onNodesAdded', nodes)
+
+    def emitNodesRemoved(self, names):
+        if names:
+            self._notify('onNodesRemoved', names)
+
+    def emitNodeRenamed(self, oldName, newName):
+        if oldName != newName:
+            self._notify('onNodeRenamed', oldName, newName)
+
+    def emitNamespaceReset(self, namespace, nodes):
+        self._notify('onNamespaceReset', namespace, nodes)
+
+    def emitAttributesChanged(self):
+        """
+        Report that dynamic attributes of any nodes may have been added, removed or renamed
+        """
+        self._notify('onAttributesChanged')
+
+
+
+class MayaNodeEventSource(NodeEventSource):
+    """
+    Reports scene changes to a NodeCache using OpenMaya callbacks.
+
+    Added nodes are buffered and named when flushed, since new dag
+    nodes are often parented or renamed right after being created.
+
+    While a file is opened, imported, or a reference loaded or unloaded,
+    the callbacks that run for every node are removed, so that they don't
+    slow down reading large files. The changed nodes are reported at once
+    when the file operation has finished. If a file operation fails without
+    reporting that it has finished, the callbacks are added again and all
+    nodes are listed once maya is idle, or when a new scene is opened.
+
+    Dynamic attribute changes are reported for the whole scene from the
+    commands that change attributes, and from undo and redo, instead of
+    watching every node. Attributes changed through the API without
+    a command are not reported.
+    """
+
+    # commands that add, remove or rename dynamic attributes
+    attributeCommands = ('addAttr', 'deleteAttr', 'renameAttr')
+
+    def __init__(self):
+        super(MayaNodeEventSource, self).__init__()
+        self._callbackIds = []
+        # ids of the callbacks that run for every node, see `_suspendNodeCallbacks`
+        self._nodeCallbackIds = []
+        # number of file operations in progress, that node callbacks are suspended for
+        self._suspendCount = 0
+        # incremented every time node callbacks are suspended
+        self._suspendId = 0
+        # handles of nodes added since the last flush
+        self._addedNodes = []
+        # old long names of nodes whose parent was removed, by node handle hash
+        self._unparentedNames = {}
+        # namespace of the reference currently being unloaded
+        self._unloadingNamespace = None
+
+    def start(self, cache): # override
+        import maya.api.OpenMaya as om
+        super(MayaNodeEventSource, self).start(cache)
+        self._callbackIds = [
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeOpen, self._onBeforeSceneReset),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kAfterOpen, self._onSceneReset),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeNew, self._onBeforeSceneReset),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kAfterNew, self._onSceneReset),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeImport, self._suspendNodeCallbacks),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kAfterImport, self._onImported),
+            om.MSceneMessage.addReferenceCallback(om.MSceneMessage.kBeforeLoadReference, self._suspendNodeCallbacks),
+            om.MSceneMessage.addReferenceCallback(om.MSceneMessage.kAfterLoadReference, self._onReferenceLoaded),
+            om.MSceneMessage.addReferenceCallback(om.MSceneMessage.kBeforeUnloadReference, self._onReferenceUnloading),
+            om.MSceneMessage.addReferenceCallback(om.MSceneMessage.kAfterUnloadReference, self._onReferenceUnloaded),
+            om.MCommandMessage.addCommandCallback(self._onCommand),
+            om.MEventMessage.addEventCallback('Undo', self._onUndoOrRedo),
+            om.MEventMessage.addEventCallback('Redo', self._onUndoOrRedo),
+        ]
+        self._suspendCount = 0
+        self._addNodeCallbacks()
+
+    def stop(self): # override
+        import maya.api.OpenMaya as om
+        if self._callbackIds:
+            om.MMessage.removeCallbacks(self._callbackIds)
+        self._callbackIds = []
+        self._removeNodeCallbacks()
+        self._addedNodes = []
+        self._unparentedNames = {}
+        super(MayaNodeEventSource, self).stop()
+
+    def flush(self): # override
+        import maya.api.OpenMaya as om
+        addedNodes, self._addedNodes = self._addedNodes, []
+        nodes = []
+        for handle in addedNodes:
+            if handle.isValid():
+                node = handle.object()
+                nodes.append((self._getLongName(node), om.MFnDependencyNode(node).typeName))
+        self.emitNodesAdded(nodes)
+
+    def _addNodeCallbacks(self):
+        import maya.api.OpenMaya as om
+        if not self._nodeCallbackIds:
+            self._nodeCallbackIds = [
+                om.MDGMessage.addNodeAddedCallback(self._onNodeAdded, 'dependNode'),
+                om.MDGMessage.addNodeRemovedCallback(self._onNodeRemoved, 'dependNode'),
+                om.MNodeMessage.addNameChangedCallback(om.MObject(), self._onNameChanged),
+                om.MDagMessage.addParentRemovedCallback(self._onParentRemoved),
+                om.MDagMessage.addParentAddedCallback(self._onParentAdded),
+            ]
+
+    def _removeNodeCallbacks(self):
+        import maya.api.OpenMaya as om
+        if self._nodeCallbackIds:
+            om.MMessage.removeCallbacks(self._nodeCallbackIds)
+        self._nodeCallbackIds = []
+
+    def _suspendNodeCallbacks(self, *args):
+        """
+        Stop running callbacks for every node until the file operation
+        that is starting has finished, see `_resumeNodeCallbacks`
+        """
+        import maya.utils
+        if not self._suspendCount:
+            self.flush()
+            self._removeNodeCallbacks()
+            self._unparentedNames = {}
+            self._suspendId += 1
+            # file operations always finish before maya is idle again, unless they failed
+            maya.utils.executeDeferred(self._resumeFailedNodeCallbacks, self._suspendId)
+        self._suspendCount += 1
+
+    def _resumeNodeCallbacks(self):
+        """
+        Run callbacks for every node again once all file operations have finished.
+        Returns True if they have, and the changed nodes should be reported.
+        """
+        self._suspendCount = max(self._suspendCount - 1, 0)
+        if self._suspendCount:
+            return False
+        if self.cache is not None:
+            self._addNodeCallbacks()
+        return True
+
+    def _resumeFailedNodeCallbacks(self, suspendId):
+        """
+        Run callbacks for every node again, and list all nodes, if they are still
+        suspended for file operations that failed without reporting that they finished
+        """
+        if self._suspendCount and suspendId == self._suspendId and self.cache is not None:
+            self._onSceneReset()
+
+    @staticmethod
+    def _getLongName(node):
+        import maya.api.OpenMaya as om
+        if node.hasFn(om.MFn.kDagNode):
+            return om.MFnDagNode(node).fullPathName()
+        return om.MFnDependencyNode(node).name()
+
+    @staticmethod
+    def _getReferenceNamespace(referenceNode):
+        """
+        Return the namespace of a reference without a leading ':',
+        or an empty string if its nodes are not in their own namespace.
+        """
+        import maya.cmds as cmds
+        import maya.api.OpenMaya as om
+        refNodeName = om.MFnDependencyNode(referenceNode).name()
+        try:
+            namespace = cmds.referenceQuery(refNodeName, namespace=True) or ''
+        except RuntimeError:
+            return ''
+        return namespace.lstrip(':')
+
+    @staticmethod
+    def _getNamespaceNodes(namespace):
+        """
+        Return a list of (long name, type) of all nodes in a namespace and its child namespaces
+        """
+        import maya.cmds as cmds
+        try:
+            nodes = cmds.namespaceInfo(':' + namespace, listOnlyDependencyNodes=True,
+                                       recurse=True, dagPath=True) or []
+        except RuntimeError:
+            return []
+        result = cmds.ls(nodes, long=True, showType=True) or []
+        return list(zip(result[::2], result[1::2]))
+
+    @staticmethod
+    def _getReferenceNodes(referenceNode, withTypes=False):
+        import maya.cmds as cmds
+        import maya.api.OpenMaya as om
+        refNodeName = om.MFnDependencyNode(referenceNode).name()
+        try:
+            nodes = cmds.referenceQuery(refNodeName, nodes=True, dagPath=True) or []
+        except RuntimeError:
+            return []
+        if not withTypes:
+            return cmds.ls(nodes, long=True) or []
+        result = cmds.ls(nodes, long=True, showType=True) or []
+        return list(zip(result[::2], result[1::2]))
+
+    def _onBeforeSceneReset(self, clientData=None):
+        # file operations that failed without finishing no longer matter for the new scene
+        self._suspendCount = 0
+        self._suspendNodeCallbacks()
+
+    def _onSceneReset(self, clientData=None):
+        # any file operations that were in progress ended with the old scene
+        self._suspendCount = 1
+        self._resumeNodeCallbacks()
+        self._addedNodes = []
+        self._unparentedNames = {}
+        self.emitSceneReset()
+
+    def _onImported(self, clientData=None):
+        if self._resumeNodeCallbacks():
+            # imported nodes can be in any namespace, so list every node once
+            self.emitSceneReset()
+
+    def _onReferenceLoaded(self, referenceNode, referenceFile, clientData=None):
+        if not self._resumeNodeCallbacks():
+            # loaded while opening or importing a file, which reports all nodes when finished
+            return
+        namespace = self._getReferenceNamespace(referenceNode)
+        if namespace:
+            # replace only the partitions of the reference namespace
+            self.flush()
+            self.emitNamespaceReset(namespace, self._getNamespaceNodes(namespace))
+        else:
+            self.emitNodesAdded(self._getReferenceNodes(referenceNode, withTypes=True))
+
+    def _onReferenceUnloading(self, referenceNode, referenceFile, clientData=None):
+        self.flush()
+        self._unloadingNamespace = self._getReferenceNamespace(referenceNode)
+        if not self._unloadingNamespace:
+            self.emitNodesRemoved(self._getReferenceNodes(referenceNode))
+        self._suspendNodeCallbacks()
+
+    def _onReferenceUnloaded(self, referenceNode, referenceFile, clientData=None):
+        namespace, self._unloadingNamespace = self._unloadingNamespace, None
+        if self._resumeNodeCallbacks() and namespace:
+            # non-referenced nodes may remain in the namespace
+            self.flush()
+            self.emitNamespaceReset(namespace, self._getNamespaceNodes(namespace))
+
+    def _onNodeAdded(self, node, clientData=None):
+        import maya.api.OpenMaya as om
+        self._addedNodes.append(om.MObjectHandle(node))
+
+    def _onNodeRemoved(self, node, clientData=None):
+        self.flush()
+        self.emitNodesRemoved([self._getLongName(node)])
+
+    def _onCommand(self, command, clientData=None):
+        if command.lstrip().startswith(self.attributeCommands):
+            self.emitAttributesChanged()
+
+    def _onUndoOrRedo(self, clientData=None):
+        self.emitAttributesChanged()
+
+    def _onNameChanged(self, node, prevName, clientData=None):
+        import maya.api.OpenMaya as om
+        if not prevName or node.hasFn(om.MFn.kReference):
+            return
+        self.flush()
+        newName = self._getLongName(node)
+        if node.hasFn(om.MFn.kDagNode):
+            # only the last segment of the long name has changed
+            oldName = newName[:newName.rfind('|') + 1] + prevName
+        else:
+            oldName = prevName
+        self.emitNodeRenamed(oldName, newName)
+
+    def _onParentRemoved(self, child, parent, clientData=None):
+        import maya.api.OpenMaya as om
+        self.flush()
+        childName = child.partialPathName().split('|')[-1]
+        parentName = parent.fullPathName() if parent.length() else ''
+        key = om.MObjectHandle(child.node()).hashCode()
+        self._unparentedNames[key] = '{0}|{1}'.format(parentName, childName)
+
+    def _onParentAdded(self, child, parent, clientData=None):
+        import maya.api.OpenMaya as om
+        key = om.MObjectHandle(child.node()).hashCode()
+        oldName = self._unparentedNames.pop(key, None)
+        if oldName is None:
+            # a new node being parented, it will be named when flushed
+            return
+        childName = oldName.split('|')[-1]
+        parentName = parent.fullPathName() if parent.length() else ''
+        self.emitNodeRenamed(oldName, '{0}|{1}'.format(parentName, childName))
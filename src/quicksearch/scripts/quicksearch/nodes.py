@@ -1,106 +1,133 @@
 
-import argparse
-import pymel.core as pm
+import time
+_importStartTime = time.time()
+
+import functools
+from collections import OrderedDict
+
+import maya.cmds as cmds
+import maya.utils
 from Qt import QtCore, QtGui, QtWidgets
 
 from core import SearchModelBase, SearchWindowBase
 from core import maya_main_window
+from engine import MayaNodeSource, NodeSearchEngine
+from matching import RankedResults
+from nodetable import NodeTable
 
 
-def show():
+# time in seconds taken by each phase of importing, building
+# and prewarming the node search window, by phase name
+startupTimings = OrderedDict()
+
+
+def getInstance():
+    """
+    Return the persistent NodeSearchWindow, creating it if necessary
+    """
     if NodeSearchWindow.instance is None:
+        startTime = time.time()
         NodeSearchWindow.instance = NodeSearchWindow(maya_main_window())
-    NodeSearchWindow.instance.show()
+        startupTimings['window'] = time.time() - startTime
+    return NodeSearchWindow.instance
+
+def show():
+    getInstance().show()
 
 def hide():
     if NodeSearchWindow.instance is not None:
         NodeSearchWindow.instance.close()
 
-
-
-class SilentArgumentParser(argparse.ArgumentParser):
+def prewarm():
     """
-    ArgumentParser with silent erroring and no exiting
+    Build the node search window, its query parser and node cache
+    during idle time, so that the first `show` is fast.
+    Intended to be called from userSetup.py after Maya starts.
+
+    Each phase is deferred separately to keep Maya responsive,
+    and their times are recorded in `startupTimings`.
     """
-    def exit(self, status=0, message=None): # override
-        pass
+    def buildWindow():
+        getInstance()
+        maya.utils.executeDeferred(buildQueryParser)
 
-    def error(self, message): # override
-        pass
+    def buildQueryParser():
+        engine = NodeSearchWindow.instance.searchModel.engine
+        startTime = time.time()
+        engine.nodeTypeTable.getAllTypes()
+        engine.queryParser.getLongName('')
+        startupTimings['queryParser'] = time.time() - startTime
+        maya.utils.executeDeferred(buildNodeCache)
+
+    def buildNodeCache():
+        model = NodeSearchWindow.instance.searchModel
+        startTime = time.time()
+        model.updateNodeTable()
+        startupTimings['nodeCache'] = time.time() - startTime
+
+    maya.utils.executeDeferred(buildWindow)
 
 
 
 class NodeSearchModel(SearchModelBase):
     """
-    A SearchModelBase object that searches for nodes in the maya scene
+    A SearchModelBase object that searches for nodes in the maya scene.
+    Listing and matching nodes is done by a NodeSearchEngine,
+    this model only displays its results.
     """
 
     def __init__(self, parent=None):
         super(NodeSearchModel, self).__init__(parent)
-        # cached list of nodes for faster searching
-        # only needs to be updated when nodeKwargs change
-        self.cachedNodeList = []
-
-        # `ls` command kwargs that are necessary for the search to work
-        self.persistentNodeKwargs = dict(
-            long=True, recursive=True
-        )
-        # `ls` command kwargs that can be set by the user
-        self.nodeKwargs = {}
-        # `ls` command kwargs that are gathered from the search query
-        self.nodeKwargsFromQuery = {}
-
-        # list of `ls` boolean kwargs that can be set by the user
-        self.boolNodeKwargKeys = [
-            'assemblies', 'cameras', 'dagObjects',
-            'geometry', 'invisible', 'lights',
-            'live', 'lockedNodes', 'materials',
-            'modified', 'partitions', 'planes',
-            'readOnly', 'referencedNodes', 'selection',
-            'sets', 'shapes', 'textures',
-            'transforms', 'untemplated', 'visible',
-        ]
-        # list of `ls` kwargs that expect node types as values
-        self.typeNodeKwargKeys = [
-            'type', 'exactType', 'excludeType'
-        ]
-        self.allValidKwargKeys = self.boolNodeKwargKeys + self.typeNodeKwargKeys
-        # mapping of short names to long names for accepted ls flags
-        self.nodeKwargLongNameMap = {
-            'ca':'cameras', 'dag':'dagObjects',
-            'g':'geometry', 'iv':'invisible', 'lt':'lights',
-            'lv':'live', 'ln':'lockedNodes', 'mat':'materials',
-            'mod':'modified', 'pr':'partitions', 'pl':'planes',
-            'ro':'readOnly', 'rn':'referencedNodes', 'sl':'selection',
-            'set':'sets', 's':'shapes', 'tex':'textures',
-            'tr':'transforms', 'ut':'untemplated', 'v':'visible',
-            # query kwargs long name mapping
-            'typ':'type', 'et':'exactType', 'ext':'excludeType',
-        }
+        # the engine that lists and searches nodes, see `getNewSearchEngine`
+        self.engine = self.getNewSearchEngine()
+        # share the results cache of the engine, so that
+        # both are limited together and cleared together
+        self.resultsCache = self.engine.resultsCache
+        # the node table that the current results refer to, which may be
+        # older than the engine node table while an async search is still running
+        self.resultsNodeTable = NodeTable()
+        # the engine node table generation that has been displayed
+        self._nodeTableGeneration = self.engine.nodeTableGeneration
+        # the last prepared search of the current query
+        self._preparedSearch = None
+
+        # mapping of node table rows to their row in the results,
+        # only contains the results that have been prepared for display
+        self._resultRowsByNodeRow = {}
+        # the results that `_resultRowsByNodeRow` was built for
+        self._resultRowsSource = None
+
+        # search on a worker thread, only parsing the query
+        # and listing nodes is done on the main thread
+        self.asyncSearch = True
+        # milliseconds to wait after typing stops before listing the nodes that
+        # have an attribute that ends the query, which may still be being typed.
+        # only used with async search, see `NodeSearchEngine.prepare`
+        self.attributeDebounceTime = 400
+        self._listIncompleteAttributes = False
+        self._attributeTimer = QtCore.QTimer(self)
+        self._attributeTimer.setSingleShot(True)
+        self._attributeTimer.timeout.connect(self._onAttributeTimeout)
+
         # define common set of node kwargs to be listed as options
         self.commonNodeKwargKeys = [
             'transforms', 'shapes', 'lights',
             'cameras', 'materials', 'textures',
             'geometry', 'dagObjects', 'selection'
         ]
-        # setup an arg parser for the search query to handle advanced kwargs
-        allNodeTypes = pm.cmds.allNodeTypes()
-        self.queryParser = SilentArgumentParser(prog='maya_quicksearch_nodesearch')
-        for key in self.boolNodeKwargKeys:
-            self.queryParser.add_argument('-{0}'.format(key), action='store_true')
-        for key in self.typeNodeKwargKeys:
-            self.queryParser.add_argument('-{0}'.format(key), choices=allNodeTypes, nargs='+')
-        for key, val in self.nodeKwargLongNameMap.items():
-            if val in self.boolNodeKwargKeys:
-                self.queryParser.add_argument('-{0}'.format(key), dest=val, action='store_true')
-            elif val in self.typeNodeKwargKeys:
-                self.queryParser.add_argument('-{0}'.format(key), dest=val, choices=allNodeTypes, nargs='+')
+
+    def getNewSearchEngine(self):
+        """
+        Return a new NodeSearchEngine to list and search nodes with.
+        Override to search a different NodeSource.
+        """
+        return NodeSearchEngine(MayaNodeSource())
 
     def resetNodeKwargs(self):
         """
         Reset user customizeable node kwargs to their defaults
         """
-        self.nodeKwargs = {}
+        self.engine.nodeKwargs = {}
         self.forceUpdateResults()
 
     def getNodeKwargValue(self, key):
@@ -108,156 +135,188 @@ class NodeSearchModel(SearchModelBase):
         Return the current value that will be given for a
         node kwarg key. Considers all node kwargs.
         """
-        if key in self.nodeKwargLongNameMap:
-            key = self.nodeKwargLongNameMap[key]
+        if key in self.engine.nodeKwargLongNameMap:
+            key = self.engine.nodeKwargLongNameMap[key]
         kwargs = self.getFullNodeKwargs()
         if key in kwargs:
             return kwargs[key]
 
+    @property
+    def cachedNodeList(self):
+        """
+        A read-only sequence of the long names of all nodes listed for the
+        current node kwargs, in the order they are searched
+        """
+        nodeTable = self.engine.nodeTable
+        return nodeTable.longNames if nodeTable is not None else []
+
     def getFullNodeKwargs(self):
         """
         Return the combine set of node kwargs that will be used
         to retrieve the full list of nodes.
         """
-        result = {}
-        result.update(self.nodeKwargsFromQuery)
-        result.update(self.nodeKwargs)
-        result.update(self.persistentNodeKwargs)
-        return result
+        return self.engine.getFullNodeKwargs()
 
     def setNodeKwargs(self, **kwargs):
         """
         Set one or more user customizeable node kwargs.
         """
-        didChange = False
-        lastNodeKwargs = self.nodeKwargs.copy()
-        self._setNodeKwargsInternal(self.nodeKwargs, **kwargs)
-        if lastNodeKwargs != self.nodeKwargs:
+        if self.engine.setNodeKwargs(**kwargs):
             self.forceUpdateResults()
 
-    def _setNodeKwargsInternal(self, obj, **kwargs):
+    def getItemData(self, index, role=QtCore.Qt.DisplayRole): # override
         """
-        Set node kwargs on the given object.
-        Convert short name flags to long ones and
-        make sure the keys are valid node kwargs.
-        Also prunes values that are defaults.
+        Return the result at the index, split from a long node name to a short name
         """
-        for key, val in kwargs.items():
-            # convert to long name if applicable
-            if key in self.nodeKwargLongNameMap:
-                key = self.nodeKwargLongNameMap[key]
-            # make sure its a valid key
-            if key in self.allValidKwargKeys:
-                if val:
-                    obj[key] = val
-                elif key in obj:
-                    del obj[key]
+        if role == QtCore.Qt.DisplayRole:
+            return self.resultsNodeTable.getShortName(self.results[index.row()])
 
+    def getResultId(self, row): # override
+        return self.getResultNode(row)
 
-    def getItemData(self, index, role=QtCore.Qt.DisplayRole): # override
+    def getResultNode(self, row):
         """
-        Return the result at the index, split from a long node name to a short name
+        Return the long name of the node in the given row of the results
         """
-        longName = self.results[index.row()]
-        if role == QtCore.Qt.DisplayRole:
-            shortName = longName.split('|')[-1]
-            return shortName
+        return self.resultsNodeTable.getLongName(self.results[row])
 
     def _updateResults(self): # override
         """
-        Perform a simple string-contains search
-        on the cached node list and store as results
-        """
-        lastQueryKwargs = self.nodeKwargsFromQuery.copy()
-        queryBody, self.nodeKwargsFromQuery = self.parseQueryString(self.query)
-        if lastQueryKwargs != self.nodeKwargsFromQuery:
-            # kwargs have changed, we need to update the node list
-            self._updateCachedNodeList()
-        if queryBody or self.nodeKwargsFromQuery:
-            # create results if kwargs exist, even if main query is empty
-            self.results = [n for n in self.cachedNodeList if queryBody.strip() in n.lower()]
-        else:
-            self.results = []
+        Search the nodes for the current query and store as results
+        """
+        prepared = self._prepareSearch()
+        self.resultsNodeTable = prepared.nodeTable
+        results = self.engine.getCachedResults(prepared, self._stats)
+        if results is None:
+            results = self.engine.search(prepared, stats=self._stats)
+            self.engine.cacheResults(prepared, results)
+        self.results = results
+
+    def _getSearchJob(self): # override
+        engine = self.engine
+        prepared = self._prepareSearch()
+        cachedResults = engine.getCachedResults(prepared, self._stats)
+        stats = self._stats
+
+        def job(isCancelled):
+            if cachedResults is not None:
+                return prepared, cachedResults
+            results = engine.search(prepared, isCancelled, stats)
+            if results is not None:
+                return prepared, results
+
+        return job
+
+    def _applySearchJobResults(self, results): # override
+        prepared, self.results = results
+        self.resultsNodeTable = prepared.nodeTable
+        self.engine.cacheResults(prepared, self.results)
+
+    def _prepareSearch(self):
+        """
+        Parse the current query and update the node table if the nodes
+        or the query kwargs have changed. Must be called on the main thread.
 
-    def parseQueryString(self, queryString):
+        Returns:
+            `PreparedSearch`
         """
-        Parse the given query string and return its body and kwargs.
-        Uses an arg parser, but retrieves the body by simply splitting at the first
-        '-' character so that if the argparser fails we still have a body.
+        listIncompleteAttributes = not self.asyncSearch or self._listIncompleteAttributes
+        self._listIncompleteAttributes = False
+        self._preparedSearch = self.engine.prepare(self.query, self._stats, listIncompleteAttributes)
+        if self._preparedSearch.attributesIncomplete:
+            self._attributeTimer.start(self.attributeDebounceTime)
+        else:
+            self._attributeTimer.stop()
+        self._onNodeTableUpdated()
+        return self._preparedSearch
 
-        >>> parseQueryString('my search -flag1 -flag2 -invalidFlag ignored text')
-        ('my search', {'flag1': True, 'flag2': True})
+    def _onAttributeTimeout(self):
+        """
+        Search again, listing the nodes of the attribute that ends the query
+        """
+        self._listIncompleteAttributes = True
+        self.setQuery()
+
+    def _onNodeTableUpdated(self):
+        if self.engine.nodeTableGeneration != self._nodeTableGeneration:
+            self._nodeTableGeneration = self.engine.nodeTableGeneration
+            # emitting results change even though it might be called again later
+            # because we want accurate status text, etc
+            self.resultsChanged.emit()
+
+    def prepareResults(self, count): # override
+        if isinstance(self.results, RankedResults):
+            self.results.rankTo(count)
+        # index the newly displayed results by node table row
+        if self._resultRowsSource is not self.results:
+            self._resultRowsSource = self.results
+            self._resultRowsByNodeRow = {}
+        resultRows = self._resultRowsByNodeRow
+        results = self.results
+        for row in range(len(resultRows), min(count, len(results))):
+            resultRows[results[row]] = row
+
+    def getResultRow(self, longName):
+        """
+        Return the row in the results of the node with the given long name,
+        or None if the node is not in the displayed results
+        """
+        nodeRow = self.resultsNodeTable.getRow(longName)
+        if nodeRow is not None and self._resultRowsSource is self.results:
+            row = self._resultRowsByNodeRow.get(nodeRow)
+            if row is not None and row < self.numItemsDisplayed:
+                return row
 
-        Returns:
-            `str`, `dict`
-                query body, query kwargs
-        """
-        argsIndex = queryString.find('-')
-        if argsIndex < 0:
-            # no kwargs
-            return queryString, {}
-        # split into body and args string
-        resultBody = queryString[:argsIndex]
-        queryArgsString = queryString[argsIndex:]
-        resultKwargs = {}
-        try:
-            # run argparser on the rest of the query string
-            result = self.queryParser.parse_known_args(queryArgsString.split(' '))
-            if result:
-                # break result into parsed args and unknown
-                args, unknown = result
-                self._setNodeKwargsInternal(resultKwargs, **dict(args._get_kwargs()))
-                # prune any values that already exist in nodeKwargs,
-                # or aren't valid values
-                for key, val in resultKwargs.items():
-                    if key in self.nodeKwargs and val == self.nodeKwargs[key]:
-                        del resultKwargs[key]
-                    elif key in self.typeNodeKwargKeys and val is None:
-                        del resultKwargs[key]
-        except Exception as e:
-            import inspect
-            print(inspect.stack())
-            print(e)
-        return resultBody, resultKwargs
+    def setFuzzyMatching(self, fuzzyMatching):
+        """
+        Set whether to use fuzzy matching and update the results
+        """
+        if fuzzyMatching != self.engine.fuzzyMatching:
+            self.engine.fuzzyMatching = fuzzyMatching
+            self.forceUpdateResults()
 
     def forceUpdateResults(self): # override
         """
-        Update both the cached node list and the search results.
+        Update both the node table and the search results.
         """
-        self._updateCachedNodeList()
+        self.updateNodeTable()
         super(NodeSearchModel, self).forceUpdateResults()
 
+    def updateNodeTable(self):
+        """
+        List the nodes for the current `ls` kwargs and update the node table if they changed
+        """
+        self.engine.updateNodeTable()
+        self._onNodeTableUpdated()
+
     def getStatusText(self):
         """
         Return the results count as well as the current node list kwargs
         """
+        engine = self.engine
+
         def formatKwarg(key, value):
-            if key in self.typeNodeKwargKeys:
+            if key in engine.typeNodeKwargKeys:
                 return '-{0} {1}'.format(key, ' '.join(list(value)))
             elif value is True:
                 return '-{0}'.format(key)
             return ''
 
-        count = len(self.results)
+        count = self.getResultCountText()
         # show non-default `ls` command kwargs
-        flags = [formatKwarg(k, v) for k, v in self.getFullNodeKwargs().items() if v and k not in self.persistentNodeKwargs]
+        flags = [formatKwarg(k, v) for k, v in self.getFullNodeKwargs().items() if v and k not in engine.persistentNodeKwargs]
+        prepared = self._preparedSearch
+        if prepared is not None:
+            if prepared.namespaces:
+                flags.append('-namespace {0}'.format(' '.join(prepared.namespaces)))
+            if prepared.underSelection:
+                flags.append('-underSelection')
+            if prepared.attributes:
+                flags.append('-attribute {0}'.format(' '.join(prepared.attributes)))
         if flags:
-            return '{0} ( {1} )'.format(count, ' '.join(flags))
+            return '{0} ( {1} ){2}'.format(count, ' '.join(flags), self.getTimingText())
         else:
-            return count
-
-    def _updateCachedNodeList(self):
-        """
-        Perform the node list in maya and cache the results
-        """
-        try:
-            nodes = pm.cmds.ls('*', **self.getFullNodeKwargs())
-        except:
-            nodes = []
-        self.cachedNodeList = sorted(nodes)
-        # emitting data change even though it might be called again later
-        # because we want accurate status text, etc
-        self.dataChanged.emit(QtCore.QModelIndex(), QtCore.QModelIndex(), None)
+            return count + self.getTimingText()
 
 
 
@@ -269,27 +328,70 @@ class NodeSelectionModel(QtCore.QItemSelectionModel):
     """
 
     def __init__(self, parent=None):
+        import maya.api.OpenMaya as om
         super(NodeSelectionModel, self).__init__(parent)
-        parent.dataChanged.connect(self.updateSelection)
+        parent.resultsChanged.connect(self.updateSelection)
         self.selectionChanged.connect(self.updateSceneSelection)
+        # cached list of selected nodes in the scene,
+        # or None if the selection has changed since it was listed
+        self._sceneSelection = None
+        callbackId = om.MEventMessage.addEventCallback('SelectionChanged', self._onSceneSelectionChanged)
+        self.destroyed.connect(functools.partial(om.MMessage.removeCallback, callbackId))
+
+    def _onSceneSelectionChanged(self, clientData=None):
+        self.clearSceneSelection()
+
+    def clearSceneSelection(self):
+        """
+        Forget the listed scene selection, so that it is listed again when next needed
+        """
+        self._sceneSelection = None
+
+    def getSceneSelection(self):
+        """
+        Return the long names of all selected nodes in the scene
+        """
+        if self._sceneSelection is None:
+            self._sceneSelection = cmds.ls(sl=True, long=True) or []
+        return self._sceneSelection
 
     def updateSelection(self, topLeft=None, bottomRight=None):
-        self.reset()
-        sel = pm.cmds.ls(sl=True, long=True)
-        results = self.model().results
+        with self.model().recordPhase('selectionSync'):
+            self._updateSelection()
+
+    def _updateSelection(self):
+        model = self.model()
+        rows = []
+        for s in self.getSceneSelection():
+            row = model.getResultRow(s)
+            if row is not None:
+                rows.append(row)
+        # select consecutive rows as ranges
+        selection = QtCore.QItemSelection()
+        rows.sort()
+        start = None
+        for i, row in enumerate(rows):
+            if start is None:
+                start = row
+            if i + 1 == len(rows) or rows[i + 1] != row + 1:
+                selection.select(model.index(start), model.index(row))
+                start = None
         # block signals so they dont recursively affect selection
         self.blockSignals(True)
-        for s in sel:
-            if s in results:
-                i = self.model().index(results.index(s))
-                self.select(i, QtCore.QItemSelectionModel.SelectionFlag.Select)
+        self.select(selection, QtCore.QItemSelectionModel.SelectionFlag.ClearAndSelect)
         self.blockSignals(False)
 
     def updateSceneSelection(self):
-        results = self.model().results
+        with self.model().recordPhase('selectionSync'):
+            self._updateSceneSelection()
+
+    def _updateSceneSelection(self):
         # get nodes at matching indeces of the results
-        nodes = [results[i.row()] for i in self.selectedRows()]
-        pm.select(nodes)
+        nodes = [self.model().getResultNode(i.row()) for i in self.selectedRows()]
+        if nodes:
+            cmds.select(nodes, replace=True)
+        else:
+            cmds.select(clear=True)
 
 
 
@@ -371,3 +473,14 @@ class NodeSearchWindow(SearchWindowBase):
         self.optsNodeKwargsAdvancedLabel.setText('additional flags are supported: e.g. `-type joint`')
         self.optsNodeKwargsAdvancedLabel.setObjectName('optsNodeKwargsAdvancedLabel')
         self.optsVLayout.addWidget(self.optsNodeKwargsAdvancedLabel)
+
+        # toggle for fuzzy or exact substring matching
+        self.optsFuzzyMatchingCheck = QtWidgets.QCheckBox(parent)
+        self.optsFuzzyMatchingCheck.setText('Fuzzy Matching')
+        self.optsFuzzyMatchingCheck.setChecked(self.searchModel.engine.fuzzyMatching)
+        self.optsFuzzyMatchingCheck.toggled.connect(self.searchModel.setFuzzyMatching)
+        self.optsFuzzyMatchingCheck.setObjectName('optsFuzzyMatchingCheck')
+        self.optsVLayout.addWidget(self.optsFuzzyMatchingCheck)
+
+
+startupTimings['import'] = time.time() - _importStartTime
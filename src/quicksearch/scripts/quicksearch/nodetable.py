@@ -0,0 +1,568 @@
+
+import logging
+import time
+from array import array
+
+from matching import fuzzyScore, getFuzzyRegex
+from pathtable import PathTable
+
+
+__all__ = [
+    'getNamespace',
+    'NodeTable',
+    'PartitionedTrigramIndex',
+    'TrigramIndex',
+]
+
+LOG = logging.getLogger(__name__)
+
+
+def getNamespace(longName):
+    """
+    Return the namespace of a node from its long name, without a leading ':'.
+    Only the short name is considered, since parents can be in other namespaces.
+
+    >>> getNamespace('|char01:root|char01:arm:ctl')
+    'char01:arm'
+    """
+    shortName = longName[longName.rfind('|') + 1:]
+    index = shortName.rfind(':')
+    return shortName[:index].lstrip(':') if index >= 0 else ''
+
+
+
+class NodeTable(object):
+    """
+    A compact table of nodes built once every time the node list
+    is refreshed. Stores the lower case search key of every node, and
+    its entry in a PathTable, which stores long names as interned segments
+    so that short names are available without splitting, and full paths
+    are only built when needed.
+
+    Rows in the table are referenced by index, search results
+    should be stored as lists of row indices into this table.
+    Nodes are ordered by namespace first, so the rows of each
+    namespace are contiguous and can be searched on their own.
+
+    A table is never modified once built, so it can be safely
+    searched from a worker thread while a new table is being built.
+    """
+
+    # number of rows searched between checks for cancellation
+    chunkSize = 50000
+
+    def __init__(self, longNames=None, useTrigramIndex=False, nodeTypes=None, paths=None):
+        # the store of node long names, may be shared with other tables
+        self.paths = paths if paths is not None else PathTable()
+        # the path entry of each node
+        self.pathEntries = array('l')
+        # list of the type of each node, if known
+        self.nodeTypes = None
+        # list of lower case long names used for searching
+        self.searchKeys = []
+        # mapping of path entries to their row in the table, built when needed
+        self._rowsByEntry = None
+        # optional trigram index over the search keys, for large tables
+        self.trigramIndex = None
+        # mapping of node types to the rows of nodes of that type, built when needed
+        self._rowsByType = None
+        # list of (namespace, start row, end row), built when needed
+        self._namespaceRanges = None
+        # all search keys joined by newlines, and the offset of each key, built when needed
+        self._keyBuffer = None
+        if longNames:
+            self.build(longNames, useTrigramIndex, nodeTypes)
+
+    def __len__(self):
+        return len(self.pathEntries)
+
+    @property
+    def longNames(self):
+        """
+        A read-only sequence of the long names of all nodes, built as accessed
+        """
+        return _LongNameList(self.paths, self.pathEntries)
+
+    def build(self, longNames, useTrigramIndex=False, nodeTypes=None):
+        """
+        Rebuild the table from the given list of node long names.
+        The names are expected to already be sorted, see `getSortKey`.
+
+        Args:
+            longNames : `list` of `str`
+                the sorted node long names
+            useTrigramIndex : `bool`
+                if True, also build a trigram index for faster substring search
+            nodeTypes : `list` of `str`
+                the type of each node, required for filtering by type
+        """
+        addPath = self.paths.add
+        self.pathEntries = array('l', [addPath(n) for n in longNames])
+        self.searchKeys = [n.lower() for n in longNames]
+        self._buildIndices(useTrigramIndex, nodeTypes)
+
+    def _buildIndices(self, useTrigramIndex, nodeTypes):
+        self.nodeTypes = list(nodeTypes) if nodeTypes is not None else None
+        self._rowsByEntry = None
+        self._rowsByType = None
+        self._namespaceRanges = None
+        self._keyBuffer = None
+        self.trigramIndex = None
+        if useTrigramIndex:
+            self.trigramIndex = TrigramIndex(self.searchKeys)
+
+    @staticmethod
+    def getSortKey(longName):
+        """
+        Return the key that node long names should be sorted by before building a table
+        """
+        return (getNamespace(longName), longName)
+
+    @classmethod
+    def concatenate(cls, partitions, useTrigramIndex=False):
+        """
+        Return a new table containing the rows of several tables one after another,
+        reusing their already computed search keys and path entries.
+        The tables should share the same PathTable, otherwise their
+        names are added to the path table of the first one.
+
+        The trigram index of the new table reuses the trigram index of each
+        partition, so only partitions that don't have one yet are indexed.
+
+        Args:
+            partitions : `list` of (`str`, `NodeTable`)
+                the namespace and table of each partition, sorted by namespace
+            useTrigramIndex : `bool`
+                if True, the new table has a trigram index for faster substring search
+        """
+        table = cls(paths=partitions[0][1].paths if partitions else None)
+        nodeTypes = []
+        namespaceRanges = []
+        trigramIndices = []
+        for namespace, partition in partitions:
+            start = len(table)
+            if useTrigramIndex:
+                trigramIndex = partition.trigramIndex
+                if trigramIndex is None:
+                    trigramIndex = TrigramIndex(partition.searchKeys)
+                trigramIndices.append((start, trigramIndex))
+            if partition.paths is table.paths:
+                table.pathEntries.extend(partition.pathEntries)
+            else:
+                table.pathEntries.extend([table.paths.add(n) for n in partition.longNames])
+            table.searchKeys.extend(partition.searchKeys)
+            if nodeTypes is not None and partition.nodeTypes is not None:
+                nodeTypes.extend(partition.nodeTypes)
+            else:
+                nodeTypes = None
+            namespaceRanges.append((namespace, start, len(table)))
+        table._buildIndices(False, nodeTypes)
+        table._namespaceRanges = namespaceRanges
+        if useTrigramIndex:
+            table.trigramIndex = PartitionedTrigramIndex(trigramIndices)
+        return table
+
+    def getSubTable(self, rows, useTrigramIndex=False):
+        """
+        Return a new table containing only the given rows of this table,
+        reusing the already computed search keys and path entries.
+
+        Args:
+            rows : `list` of `int`
+                sorted rows to include in the new table
+        """
+        table = NodeTable(paths=self.paths)
+        table.pathEntries = array('l', [self.pathEntries[i] for i in rows])
+        table.searchKeys = [self.searchKeys[i] for i in rows]
+        nodeTypes = None
+        if self.nodeTypes is not None:
+            nodeTypes = [self.nodeTypes[i] for i in rows]
+        table._buildIndices(useTrigramIndex, nodeTypes)
+        return table
+
+    def getRowsByType(self):
+        """
+        Return a dict mapping each node type in the table to the
+        rows of all nodes of that type. Requires node types.
+        """
+        if self._rowsByType is None:
+            rowsByType = {}
+            for row, nodeType in enumerate(self.nodeTypes):
+                rows = rowsByType.get(nodeType)
+                if rows is None:
+                    rows = rowsByType[nodeType] = array('l')
+                rows.append(row)
+            self._rowsByType = rowsByType
+        return self._rowsByType
+
+    def getNamespaceRanges(self):
+        """
+        Return a list of (namespace, start row, end row) for each run of
+        consecutive nodes in the same namespace. Since tables are sorted
+        by namespace, there is usually one range per namespace.
+        """
+        if self._namespaceRanges is None:
+            namespaceRanges = []
+            namespace = None
+            start = 0
+            getShortName = self.paths.getShortName
+            for row, entry in enumerate(self.pathEntries):
+                rowNamespace = getNamespace(getShortName(entry))
+                if rowNamespace != namespace:
+                    if row > start:
+                        namespaceRanges.append((namespace, start, row))
+                    namespace = rowNamespace
+                    start = row
+            if len(self) > start:
+                namespaceRanges.append((namespace, start, len(self)))
+            self._namespaceRanges = namespaceRanges
+        return self._namespaceRanges
+
+    def getNamespaceRows(self, isInScope):
+        """
+        Return the sorted rows of all nodes in namespaces accepted by `isInScope`,
+        a function that is called once per namespace with its name.
+        """
+        rows = []
+        for namespace, start, end in self.getNamespaceRanges():
+            if isInScope(namespace):
+                rows.extend(range(start, end))
+        return rows
+
+    def getKeyBuffer(self):
+        """
+        Return a single string of all search keys each followed by a newline,
+        and an array of the offset of each key in the string, plus the total length.
+        Used to match a term against every key in a single pass.
+
+        Returns:
+            `str`, `array` of `int`
+        """
+        keyBuffer = self._keyBuffer
+        if keyBuffer is None:
+            lineStarts = array('l', [0])
+            total = 0
+            for key in self.searchKeys:
+                total += len(key) + 1
+                lineStarts.append(total)
+            keyBuffer = self._keyBuffer = ('\n'.join(self.searchKeys) + '\n', lineStarts)
+        return keyBuffer
+
+    def getMemoryUsage(self):
+        """
+        Return a rough estimate of the memory used by this table in bytes
+        """
+        # search keys and path entries, plus string, list and array overhead.
+        # the path table is counted in full, even though it may be shared
+        size = sum([len(k) for k in self.searchKeys])
+        size += len(self) * 70
+        size += self.paths.getMemoryUsage()
+        if self.trigramIndex is not None:
+            size += self.trigramIndex.getMemoryUsage()
+        return size
+
+    def getMemoryReport(self):
+        """
+        Return a dict comparing the memory used by the path table of this
+        table with a plain list of its long names, see `PathTable.getMemoryReport`
+        """
+        return self.paths.getMemoryReport(self.pathEntries)
+
+    def getLongName(self, row):
+        return self.paths.getLongName(self.pathEntries[row])
+
+    def getShortName(self, row):
+        return self.paths.getShortName(self.pathEntries[row])
+
+    def getRow(self, longName):
+        """
+        Return the row of the given node long name, or None if
+        the node is not in the table.
+        """
+        entry = self.paths.getEntry(longName)
+        if entry is None:
+            return None
+        return self._getRowsByEntry().get(entry)
+
+    def _getRowsByEntry(self):
+        if self._rowsByEntry is None:
+            self._rowsByEntry = dict((e, i) for i, e in enumerate(self.pathEntries))
+        return self._rowsByEntry
+
+    def _iterChunks(self, rows, isCancelled):
+        """
+        Yield the given rows in chunks, or all rows in the table if rows is None.
+        Yields None and stops if `isCancelled` returns True between chunks.
+        """
+        if rows is None:
+            rows = range(len(self))
+        if isCancelled is None:
+            yield rows
+            return
+        for start in range(0, len(rows), self.chunkSize):
+            if isCancelled():
+                yield None
+                return
+            yield rows[start:start + self.chunkSize]
+
+    def _getKeys(self, shortNames):
+        if shortNames:
+            return _ShortKeyList(self.searchKeys)
+        return self.searchKeys
+
+    def getHierarchyRows(self, pattern, anchored=False, roots=None):
+        """
+        Return the sorted rows of all nodes matching a hierarchy pattern,
+        see `PathTable.findEntries`, walking only the matching subtrees.
+
+        Args:
+            pattern : `list` of `str`
+                the lower case glob segments of the pattern, if empty,
+                every node below `roots` is matched instead
+            anchored : `bool`
+                if True, the pattern starts at the dag root
+            roots : `list` of `str`
+                if given, only return nodes below these long names
+        """
+        paths = self.paths
+        if pattern:
+            entries = paths.findEntries(pattern, anchored)
+        else:
+            entries = None
+        if roots is not None:
+            rootEntries = [paths.getEntry(n) for n in roots]
+            descendants = paths.getDescendants([e for e in rootEntries if e is not None])
+            if entries is None:
+                entries = descendants
+            else:
+                entries = set(entries).intersection(descendants)
+        rowsByEntry = self._getRowsByEntry()
+        return sorted([rowsByEntry[e] for e in entries or [] if e in rowsByEntry])
+
+    def search(self, searchTerm, rows=None, isCancelled=None, shortNames=False):
+        """
+        Return the rows of all nodes whose search key contains the given term.
+
+        Args:
+            searchTerm : `str`
+                lower case string to search for
+            rows : `list` of `int`
+                if given, only search these rows instead of the whole table
+            isCancelled : `callable`
+                if given, called periodically and the search is
+                abandoned when it returns True
+            shortNames : `bool`
+                if True, only search the short name of each node
+
+        Returns:
+            `list` of `int`, or None if the search was cancelled
+        """
+        keys = self._getKeys(shortNames)
+        if self.trigramIndex is not None and len(searchTerm) >= TrigramIndex.size:
+            # only check the candidates from the index, unless
+            # the given rows are already a smaller set to check
+            candidates = self.trigramIndex.getCandidates(searchTerm)
+            if rows is None:
+                rows = candidates
+            elif len(candidates) < len(rows):
+                # the rows may be a namespace scope rather than a superset
+                # of the results, so keep only the candidates within them
+                rowSet = set(rows)
+                rows = [i for i in candidates if i in rowSet]
+        results = []
+        for chunk in self._iterChunks(rows, isCancelled):
+            if chunk is None:
+                return None
+            results.extend([i for i in chunk if searchTerm in keys[i]])
+        return results
+
+    def searchFuzzy(self, pattern, rows=None, isCancelled=None, shortNames=False):
+        """
+        Return the rows of all nodes whose search key contains
+        the characters of the given pattern in order.
+        See `search` for a description of the arguments.
+        """
+        keys = self._getKeys(shortNames)
+        match = getFuzzyRegex(pattern).search
+        results = []
+        for chunk in self._iterChunks(rows, isCancelled):
+            if chunk is None:
+                return None
+            results.extend([i for i in chunk if match(keys[i])])
+        return results
+
+    def getRowMatcher(self, searchTerm, fuzzyMatching=False, shortNames=False):
+        """
+        Return a function that returns True if the node at
+        a row matches the given search term.
+        """
+        keys = self._getKeys(shortNames)
+        if fuzzyMatching:
+            match = getFuzzyRegex(searchTerm).search
+            return lambda row: match(keys[row]) is not None
+        return lambda row: searchTerm in keys[row]
+
+    def getScores(self, pattern, rows, shortNames=False):
+        """
+        Return the fuzzy match score of the given pattern for each row.
+        Every row must already be known to match the pattern.
+        """
+        keys = self._getKeys(shortNames)
+        getName = self.getShortName if shortNames else self.getLongName
+        return [fuzzyScore(pattern, keys[i], getName(i)) for i in rows]
+
+
+
+class _ShortKeyList(object):
+    """
+    A read-only list of the short name part of search keys, built as accessed
+    """
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        key = self.keys[index]
+        return key[key.rfind('|') + 1:]
+
+
+
+class _LongNameList(object):
+    """
+    A read-only list of long names of path table entries, built as accessed
+    """
+
+    def __init__(self, paths, entries):
+        self.paths = paths
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.paths.getLongName(e) for e in self.entries[index]]
+        return self.paths.getLongName(self.entries[index])
+
+    def __iter__(self):
+        getLongName = self.paths.getLongName
+        for entry in self.entries:
+            yield getLongName(entry)
+
+
+
+class TrigramIndex(object):
+    """
+    An inverted index of every three character sequence in a list
+    of search keys, mapped to the rows of the keys that contain it.
+
+    Any key containing a search term must contain every trigram of that term,
+    so intersecting the posting lists of the term's trigrams gives a small
+    set of candidate rows that only need to be checked with a substring test.
+    """
+
+    # number of characters in each gram
+    size = 3
+
+    def __init__(self, keys):
+        # mapping of trigrams to sorted arrays of rows
+        self.postings = {}
+        # time in seconds it took to build the index
+        self.buildTime = 0.0
+        self.build(keys)
+
+    def build(self, keys):
+        """
+        Rebuild the index for the given list of search keys
+        """
+        startTime = time.time()
+        size = self.size
+        postings = {}
+        for row, key in enumerate(keys):
+            for gram in set([key[i:i + size] for i in range(len(key) - size + 1)]):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array('l')
+                posting.append(row)
+        self.postings = postings
+        self.buildTime = time.time() - startTime
+        LOG.info('Built trigram index of {0} keys, {1} trigrams in {2:.3f}s'.format(
+            len(keys), len(postings), self.buildTime))
+
+    def getMemoryUsage(self):
+        """
+        Return a rough estimate of the memory used by this index in bytes
+        """
+        size = len(self.postings) * 120
+        for posting in self.postings.values():
+            size += len(posting) * posting.itemsize
+        return size
+
+    def getCandidates(self, searchTerm):
+        """
+        Return a sorted list of rows that contain every trigram
+        of the given search term, and therefore might contain the term.
+        The term must be at least `size` characters long.
+        """
+        size = self.size
+        grams = set([searchTerm[i:i + size] for i in range(len(searchTerm) - size + 1)])
+        postings = []
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                # no key contains this trigram
+                return []
+            postings.append(posting)
+        # intersect starting with the smallest posting list
+        postings.sort(key=len)
+        if len(postings) == 1:
+            return list(postings[0])
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return sorted(candidates)
+
+
+
+class PartitionedTrigramIndex(object):
+    """
+    A trigram index over the rows of several tables placed one after another,
+    see `NodeTable.concatenate`, made of the trigram index of each table.
+    Candidates are looked up in each index and offset to the rows of the
+    combined table, so that no index has to be built again when only some
+    of the tables change.
+    """
+
+    def __init__(self, parts):
+        """
+        Args:
+            parts : `list` of (`int`, `TrigramIndex`)
+                the first row and the index of each table, sorted by first row
+        """
+        self.parts = list(parts)
+        # time in seconds it took to build the indices
+        self.buildTime = sum([index.buildTime for _, index in self.parts])
+
+    def getMemoryUsage(self):
+        """
+        Return a rough estimate of the memory used by the indices in bytes,
+        they are counted in full even though they may be shared
+        """
+        return sum([index.getMemoryUsage() for _, index in self.parts])
+
+    def getCandidates(self, searchTerm):
+        """
+        Return a sorted list of rows that might contain the given search term,
+        see `TrigramIndex.getCandidates`
+        """
+        candidates = []
+        for offset, index in self.parts:
+            rows = index.getCandidates(searchTerm)
+            if rows:
+                candidates.extend([row + offset for row in rows] if offset else rows)
+        return candidates
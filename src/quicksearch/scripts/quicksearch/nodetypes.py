@@ -0,0 +1,85 @@
+
+__all__ = [
+    'NodeTypeTable',
+]
+
+
+
+class NodeTypeTable(object):
+    """
+    A table of all node types and their inheritance, used to filter
+    nodes by type in memory instead of listing them again with `ls`.
+
+    Every node type is assigned a bit, and the types each node type
+    inherits from (including itself) are stored as a bitmask, so checking
+    whether a type inherits any of several types is a single `&`.
+    The table is only built the first time it is used, and inherited
+    masks are computed once per type when first needed.
+    """
+
+    def __init__(self, listNodeTypes, listInheritedTypes):
+        """
+        Args:
+            listNodeTypes : `callable`
+                returns a list of all node type names, including abstract types
+            listInheritedTypes : `callable`
+                returns the list of types a node type inherits from, including itself
+        """
+        self.listNodeTypes = listNodeTypes
+        self.listInheritedTypes = listInheritedTypes
+        # mapping of node type names to their bit, or None if not built yet
+        self._typeBits = None
+        # mapping of node type names to a mask of all the types they inherit
+        self._inheritedMasks = {}
+
+    def _getTypeBits(self):
+        if self._typeBits is None:
+            self._typeBits = dict((t, 1 << i) for i, t in enumerate(self.listNodeTypes()))
+        return self._typeBits
+
+    def reset(self):
+        """
+        Clear the table so that it is rebuilt when next used,
+        e.g. after plugins have registered new node types.
+        """
+        self._typeBits = None
+        self._inheritedMasks = {}
+
+    def getAllTypes(self):
+        """
+        Return a set-like view of all node type names
+        """
+        return self._getTypeBits().keys()
+
+    def isValidType(self, nodeType):
+        return nodeType in self._getTypeBits()
+
+    def getTypesMask(self, nodeTypes):
+        """
+        Return a mask of the given node types. Unknown types are ignored.
+        """
+        typeBits = self._getTypeBits()
+        mask = 0
+        for nodeType in nodeTypes:
+            mask |= typeBits.get(nodeType, 0)
+        return mask
+
+    def getInheritedMask(self, nodeType):
+        """
+        Return a mask of the given node type and all types it inherits from
+        """
+        mask = self._inheritedMasks.get(nodeType)
+        if mask is None:
+            try:
+                inheritedTypes = self.listInheritedTypes(nodeType) or []
+            except Exception:
+                inheritedTypes = []
+            mask = self.getTypesMask(list(inheritedTypes) + [nodeType])
+            self._inheritedMasks[nodeType] = mask
+        return mask
+
+    def inheritsAny(self, nodeType, mask):
+        """
+        Return True if the node type is or inherits from any of the types in a mask
+        """
+        return bool(self.getInheritedMask(nodeType) & mask)
@@ -0,0 +1,224 @@
+
+import atexit
+import bisect
+import logging
+import os
+import re
+import sys
+from array import array
+
+from matching import fuzzyScore, getFuzzyRegexSource
+
+
+__all__ = [
+    'getMayapyExecutable',
+    'ParallelMatcher',
+]
+
+LOG = logging.getLogger(__name__)
+
+# all matchers that have not been closed yet, closed when python exits
+_openMatchers = set()
+
+
+@atexit.register
+def _closeMatchers():
+    for matcher in list(_openMatchers):
+        matcher.close()
+
+
+def getMayapyExecutable():
+    """
+    Return the path to mayapy if running inside the maya gui, since worker
+    processes cannot be spawned using the maya executable itself.
+    """
+    exeDir, exeName = os.path.split(sys.executable)
+    if exeName.lower().startswith('maya') and not exeName.lower().startswith('mayapy'):
+        for name in ('mayapy.exe', 'mayapy'):
+            path = os.path.join(exeDir, name)
+            if os.path.isfile(path):
+                return path
+
+
+def _searchShard(args):
+    """
+    Search one shard of a packed name buffer in a worker process.
+
+    Returns:
+        `list` of `int`, `list` of `int`
+            the matching rows and their scores
+    """
+    from multiprocessing import shared_memory
+    namesName, offsetsName, rowStart, rowEnd, searchTerm, fuzzyMatching = args
+    namesShm = shared_memory.SharedMemory(name=namesName)
+    offsetsShm = shared_memory.SharedMemory(name=offsetsName)
+    try:
+        itemSize = array('q').itemsize
+        offsets = array('q')
+        offsets.frombytes(bytes(offsetsShm.buf[rowStart * itemSize:(rowEnd + 1) * itemSize]))
+        start = offsets[0]
+        names = bytes(namesShm.buf[start:offsets[-1]])
+    finally:
+        namesShm.close()
+        offsetsShm.close()
+    keys = names.lower()
+    # line offsets relative to the start of the shard
+    lineStarts = [o - start for o in offsets]
+    term = searchTerm.encode('utf-8')
+    if fuzzyMatching:
+        regex = re.compile(getFuzzyRegexSource(searchTerm, '\n').encode('utf-8'))
+        find = lambda pos: _regexFind(regex, keys, pos)
+    else:
+        find = lambda pos: keys.find(term, pos)
+    rows = []
+    scores = []
+    pos = find(0)
+    while pos >= 0:
+        line = bisect.bisect_right(lineStarts, pos) - 1
+        lineStart, lineEnd = lineStarts[line], lineStarts[line + 1] - 1
+        key = keys[lineStart:lineEnd].decode('utf-8')
+        name = names[lineStart:lineEnd].decode('utf-8')
+        rows.append(rowStart + line)
+        scores.append(fuzzyScore(searchTerm, key, name))
+        # continue from the next line
+        pos = find(lineEnd + 1)
+    return rows, scores
+
+
+def _regexFind(regex, data, pos):
+    match = regex.search(data, pos)
+    return match.start() if match else -1
+
+
+
+class ParallelMatcher(object):
+    """
+    Searches and scores node names across a pool of worker processes.
+
+    The names of a node table are packed once into a shared memory buffer,
+    separated by newlines, along with the offset of each name. Each search
+    splits the rows into shards that are matched in parallel, and the per-shard
+    results are merged back in their original order.
+
+    Only available on python 3.8+, see `isAvailable`. multiprocessing is only
+    imported when a matcher is used, since most searches never need it.
+    """
+
+    def __init__(self, processes=None):
+        import multiprocessing
+        # number of worker processes, defaults to the number of cpus
+        self.processes = processes or multiprocessing.cpu_count()
+        # number of shards per process, more shards balance the load better
+        self.shardsPerProcess = 2
+        # the node table whose names are currently packed
+        self.nodeTable = None
+        self._pool = None
+        self._namesShm = None
+        self._offsetsShm = None
+
+    @staticmethod
+    def isAvailable():
+        try:
+            from multiprocessing import shared_memory
+        except ImportError:
+            # requires python 3.8+
+            return False
+        return True
+
+    def _getPool(self):
+        if self._pool is None:
+            import multiprocessing
+            context = multiprocessing.get_context('spawn')
+            executable = getMayapyExecutable()
+            if executable:
+                context.set_executable(executable)
+            self._pool = context.Pool(self.processes)
+            _openMatchers.add(self)
+        return self._pool
+
+    def load(self, nodeTable):
+        """
+        Pack the names of a node table into shared memory for searching.
+        Does nothing if the table is already loaded.
+        """
+        if nodeTable is self.nodeTable:
+            return
+        from multiprocessing import shared_memory
+        self._releaseMemory()
+        encoded = [n.encode('utf-8') for n in nodeTable.longNames]
+        offsets = array('q', [0])
+        total = 0
+        for name in encoded:
+            total += len(name) + 1
+            offsets.append(total)
+        names = b'\n'.join(encoded) + b'\n'
+        self._namesShm = shared_memory.SharedMemory(create=True, size=max(len(names), 1))
+        self._namesShm.buf[:len(names)] = names
+        offsetsBytes = offsets.tobytes()
+        self._offsetsShm = shared_memory.SharedMemory(create=True, size=len(offsetsBytes))
+        self._offsetsShm.buf[:len(offsetsBytes)] = offsetsBytes
+        _openMatchers.add(self)
+        self.nodeTable = nodeTable
+        # start the workers now, instead of on the first search
+        self._getPool()
+
+    def search(self, nodeTable, searchTerm, fuzzyMatching, isCancelled=None):
+        """
+        Return the rows of all nodes in the table that match a search term,
+        and the fuzzy match score of each row.
+
+        Returns:
+            `list` of `int`, `list` of `int`
+                rows and scores, or None if the table is not loaded,
+                the search was cancelled, or it failed
+        """
+        if nodeTable is not self.nodeTable or self._namesShm is None:
+            return None
+        rowCount = len(nodeTable)
+        numShards = self.processes * self.shardsPerProcess
+        shardSize = max(1, -(-rowCount // numShards))
+        shards = [
+            (self._namesShm.name, self._offsetsShm.name, start, min(start + shardSize, rowCount),
+             searchTerm, fuzzyMatching)
+            for start in range(0, rowCount, shardSize)
+        ]
+        try:
+            asyncResult = self._getPool().map_async(_searchShard, shards)
+            while not asyncResult.ready():
+                if isCancelled is not None and isCancelled():
+                    # stop the workers instead of letting them finish the abandoned search
+                    self._terminatePool()
+                    return None
+                asyncResult.wait(0.01)
+            shardResults = asyncResult.get()
+        except Exception:
+            LOG.exception('Parallel search failed')
+            return None
+        rows = []
+        scores = []
+        for shardRows, shardScores in shardResults:
+            rows.extend(shardRows)
+            scores.extend(shardScores)
+        return rows, scores
+
+    def _releaseMemory(self):
+        for shm in (self._namesShm, self._offsetsShm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._namesShm = None
+        self._offsetsShm = None
+        self.nodeTable = None
+
+    def _terminatePool(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def close(self):
+        """
+        Stop the worker processes and release the shared memory
+        """
+        self._releaseMemory()
+        self._terminatePool()
+        _openMatchers.discard(self)
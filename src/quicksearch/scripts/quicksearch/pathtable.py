@@ -0,0 +1,276 @@
+
+import fnmatch
+import sys
+import threading
+from array import array
+
+
+__all__ = [
+    'PathTable',
+]
+
+_intern = getattr(sys, 'intern', None) or intern
+
+
+
+class PathTable(object):
+    """
+    A compact store of node long names, as a table of path entries that
+    each point to their parent entry and to an interned name segment.
+
+    Deep hierarchies repeat the same parent paths for every node below them,
+    so storing each parent once and every distinct segment once uses far less
+    memory than a list of full paths. Short names are available directly,
+    full paths are only joined when needed, e.g. for display or selection.
+
+    Entries are only ever added, so a table can be safely read from a worker
+    thread while more names are being added on the main thread.
+
+    The children of each entry and the entries of each segment are indexed
+    when first needed, so that hierarchy patterns such as 'rigA|*|hand' only
+    walk the subtrees below the matching entries, see `findEntries`.
+    """
+
+    # entry id of the root of all dag paths, whose segment is empty
+    WORLD = 0
+
+    def __init__(self, longNames=None):
+        # list of distinct name segments, shared by all entries
+        self.segments = ['']
+        # mapping of segments to their index in `segments`
+        self.segmentIds = {'': 0}
+        # the parent entry of each entry, -1 for dependency nodes and the world
+        self.parents = array('l', [-1])
+        # the segment of each entry
+        self.entrySegments = array('l', [0])
+        # mapping of (parent entry, segment) keys to entries, see `_getKey`
+        self._entries = {}
+        # mapping of entries to their child entries, and of segments to their
+        # entries, and the number of entries indexed so far in both
+        self._children = {}
+        self._entriesBySegment = {}
+        self._numIndexed = 0
+        # the index may be updated from the search worker thread
+        self._indexLock = threading.Lock()
+        if longNames:
+            for longName in longNames:
+                self.add(longName)
+
+    def __len__(self):
+        return len(self.parents)
+
+    @staticmethod
+    def _getKey(parent, segment):
+        # a single int is much smaller than a tuple as a dict key
+        return ((parent + 1) << 32) | segment
+
+    def _getSegmentId(self, segment):
+        segmentId = self.segmentIds.get(segment)
+        if segmentId is None:
+            segmentId = len(self.segments)
+            self.segments.append(_intern(segment))
+            self.segmentIds[segment] = segmentId
+        return segmentId
+
+    def add(self, longName):
+        """
+        Add a node long name to the table if it doesn't exist yet,
+        along with all of its parents, and return its entry.
+        """
+        if longName.startswith('|'):
+            parent = self.WORLD
+            names = longName[1:].split('|')
+        else:
+            parent = -1
+            names = [longName]
+        entries = self._entries
+        for name in names:
+            segment = self._getSegmentId(name)
+            key = self._getKey(parent, segment)
+            entry = entries.get(key)
+            if entry is None:
+                entry = entries[key] = len(self.parents)
+                self.parents.append(parent)
+                self.entrySegments.append(segment)
+            parent = entry
+        return parent
+
+    def getEntry(self, longName):
+        """
+        Return the entry of a node long name, or None if it is not in the table
+        """
+        if longName.startswith('|'):
+            parent = self.WORLD
+            names = longName[1:].split('|')
+        else:
+            parent = -1
+            names = [longName]
+        for name in names:
+            segment = self.segmentIds.get(name)
+            if segment is None:
+                return None
+            parent = self._entries.get(self._getKey(parent, segment))
+            if parent is None:
+                return None
+        return parent
+
+    def getParent(self, entry):
+        """
+        Return the parent entry of an entry, or -1 if it has no parent node
+        """
+        parent = self.parents[entry]
+        return -1 if parent == self.WORLD else parent
+
+    def getShortName(self, entry):
+        return self.segments[self.entrySegments[entry]]
+
+    def _updateHierarchyIndex(self):
+        """
+        Index the children and segments of all entries added since the last update
+        """
+        with self._indexLock:
+            children = self._children
+            entriesBySegment = self._entriesBySegment
+            parents = self.parents
+            entrySegments = self.entrySegments
+            numEntries = len(parents)
+            for entry in range(self._numIndexed, numEntries):
+                children.setdefault(parents[entry], []).append(entry)
+                entriesBySegment.setdefault(entrySegments[entry], []).append(entry)
+            self._numIndexed = numEntries
+
+    def getChildren(self, entry):
+        """
+        Return the child entries of an entry. Use `WORLD` to get all dag root entries.
+        """
+        self._updateHierarchyIndex()
+        return self._children.get(entry, [])
+
+    def getDescendants(self, entries):
+        """
+        Return all entries below the given entries, not including themselves
+        """
+        self._updateHierarchyIndex()
+        children = self._children
+        result = []
+        stack = list(entries)
+        while stack:
+            entryChildren = children.get(stack.pop())
+            if entryChildren:
+                result.extend(entryChildren)
+                stack.extend(entryChildren)
+        return result
+
+    def _getMatchingSegments(self, pattern):
+        """
+        Return the set of segments matching a lower case glob pattern, case insensitive.
+        Namespaces are ignored unless the pattern contains one.
+        """
+        ignoreNamespace = ':' not in pattern
+        result = set()
+        for i, segment in enumerate(self.segments):
+            segment = segment.lower()
+            if ignoreNamespace:
+                segment = segment[segment.rfind(':') + 1:]
+            if fnmatch.fnmatchcase(segment, pattern):
+                result.add(i)
+        return result
+
+    def findEntries(self, pattern, anchored=False):
+        """
+        Return the entries matching a hierarchy pattern, by walking only
+        the subtrees of entries that match the first segment of the pattern.
+
+        Each segment of the pattern is a lower case glob matched against
+        a single name segment, except for '**', which matches any number
+        of segments, including none.
+
+        >>> findEntries(['riga', '*', 'hand*'])
+
+        Args:
+            pattern : `list` of `str`
+                the segments of the pattern
+            anchored : `bool`
+                if True, the first segment only matches dag root entries,
+                otherwise it can match an entry at any depth
+        """
+        self._updateHierarchyIndex()
+        if not pattern:
+            return []
+        if anchored:
+            entries = [self.WORLD]
+        else:
+            # the first segment can match anywhere, start from every entry with a matching segment
+            first = pattern[0]
+            if first == '**':
+                entries = [self.WORLD] + self.getDescendants([self.WORLD])
+            else:
+                entries = []
+                for segment in self._getMatchingSegments(first):
+                    entries.extend(self._entriesBySegment.get(segment, []))
+            pattern = pattern[1:]
+        children = self._children
+        for segmentPattern in pattern:
+            if segmentPattern == '**':
+                entries = entries + self.getDescendants(entries)
+                continue
+            childEntries = []
+            for entry in entries:
+                childEntries.extend(children.get(entry, []))
+            if segmentPattern != '*':
+                segments = self._getMatchingSegments(segmentPattern)
+                entrySegments = self.entrySegments
+                childEntries = [e for e in childEntries if entrySegments[e] in segments]
+            entries = childEntries
+        # remove duplicates from overlapping '**' matches, and the world itself
+        return sorted(set(entries) - set([self.WORLD]))
+
+    def getLongName(self, entry):
+        """
+        Return the full path of an entry, joined from the segments of its parents
+        """
+        segments = self.segments
+        entrySegments = self.entrySegments
+        parents = self.parents
+        names = []
+        while entry >= 0:
+            names.append(segments[entrySegments[entry]])
+            entry = parents[entry]
+        names.reverse()
+        return '|'.join(names)
+
+    def getMemoryUsage(self):
+        """
+        Return a rough estimate of the memory used by this table in bytes
+        """
+        size = sum([len(s) for s in self.segments]) + len(self.segments) * 130
+        size += len(self.parents) * (self.parents.itemsize + self.entrySegments.itemsize + 100)
+        return size
+
+    def getMemoryReport(self, entries=None):
+        """
+        Return a dict comparing the memory used by this table with the memory
+        used by a plain list of the long names of the given entries.
+        Measures actual object sizes, so is slow for large tables.
+
+        Args:
+            entries : `list` of `int`
+                the entries of the nodes to compare, defaults to all entries
+        """
+        if entries is None:
+            entries = range(1, len(self))
+        listSize = sys.getsizeof([None] * len(entries))
+        for entry in entries:
+            listSize += sys.getsizeof(self.getLongName(entry))
+        tableSize = sys.getsizeof(self.segments) + sys.getsizeof(self.segmentIds)
+        tableSize += sum([sys.getsizeof(s) for s in self.segments])
+        tableSize += sys.getsizeof(self.parents) + sys.getsizeof(self.entrySegments)
+        tableSize += sys.getsizeof(self._entries) + len(self._entries) * sys.getsizeof(1 << 40)
+        return dict(
+            numNodes=len(entries),
+            numEntries=len(self),
+            numSegments=len(self.segments),
+            listBytes=listSize,
+            tableBytes=tableSize,
+            ratio=float(tableSize) / listSize if listSize else 0.0,
+        )
@@ -0,0 +1,105 @@
+
+from caching import LRUCache
+
+
+__all__ = [
+    'QueryFlagParser',
+]
+
+
+
+class QueryFlagParser(object):
+    """
+    Parses the flags portion of a search query, e.g. '-transforms -type joint'.
+
+    Boolean flags take no values, type flags take one or more node type
+    names up to the next flag, and value flags take any values up to the
+    next flag. Flags can be given by long name, short name, or any unique
+    prefix of a long name. Unknown flags and invalid type names are ignored,
+    so that partially typed queries still parse.
+
+    Results are memoized per flags string, since the same flags are
+    parsed again on every keystroke in the query body.
+    """
+
+    def __init__(self, boolKeys, typeKeys, shortNames, isValidType, valueKeys=(), cacheSize=256):
+        """
+        Args:
+            boolKeys : `list` of `str`
+                long names of flags that take no values
+            typeKeys : `list` of `str`
+                long names of flags that take node type names
+            shortNames : `dict`
+                mapping of short flag names to long names
+            isValidType : `callable`
+                returns True if a string is a valid node type name,
+                only called once a type flag is used
+            valueKeys : `list` of `str`
+                long names of flags that take values that are not validated
+        """
+        self.boolKeys = set(boolKeys)
+        self.typeKeys = set(typeKeys)
+        self.valueKeys = set(valueKeys)
+        self.shortNames = dict(shortNames)
+        self.isValidType = isValidType
+        # mapping of every accepted flag name to its long name
+        self._flagNames = None
+        self._cache = LRUCache(cacheSize)
+
+    def _getFlagNames(self):
+        if self._flagNames is None:
+            longNames = sorted(self.boolKeys | self.typeKeys | self.valueKeys)
+            prefixes = {}
+            for name in longNames:
+                for i in range(1, len(name)):
+                    prefix = name[:i]
+                    # None marks ambiguous prefixes
+                    prefixes[prefix] = None if prefix in prefixes else name
+            flagNames = dict([(p, n) for p, n in prefixes.items() if n is not None])
+            flagNames.update((n, n) for n in longNames)
+            flagNames.update(self.shortNames)
+            self._flagNames = flagNames
+        return self._flagNames
+
+    def getLongName(self, flag):
+        """
+        Return the long name of a flag, or None if the flag is not recognized
+        """
+        return self._getFlagNames().get(flag)
+
+    def parse(self, flagsString):
+        """
+        Parse a flags string and return a dict of the flag values by long name.
+        Boolean flags are True, type and value flags are lists of values.
+        The returned dict must not be modified.
+
+        >>> parse('-tr -type joint -invalidFlag ignored')
+        {'transforms': True, 'type': ['joint']}
+        """
+        result = self._cache.get(flagsString)
+        if result is None:
+            result = self._parse(flagsString)
+            self._cache.set(flagsString, result)
+        return result
+
+    def _parse(self, flagsString):
+        result = {}
+        # long name of the type or value flag currently receiving values
+        valuesKey = None
+        for token in flagsString.split():
+            if token.startswith('-'):
+                valuesKey = None
+                key = self.getLongName(token[1:])
+                if key in self.boolKeys:
+                    result[key] = True
+                elif key in self.typeKeys or key in self.valueKeys:
+                    # a repeated flag replaces the previous values
+                    valuesKey = key
+                    result[key] = []
+            elif valuesKey is not None:
+                if valuesKey in self.valueKeys or self.isValidType(token):
+                    result[valuesKey].append(token)
+        # remove flags that received no valid values
+        for key in [k for k, v in result.items() if v == []]:
+            del result[key]
+        return result
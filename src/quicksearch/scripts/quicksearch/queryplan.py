@@ -0,0 +1,402 @@
+
+import bisect
+import re
+
+from caching import LRUCache
+from instrumentation import NULL_STATS
+from matching import MatchStream, RankedResults, getFuzzyRegexSource
+
+
+__all__ = [
+    'isSimpleQuery',
+    'QueryCompiler',
+    'QueryPlan',
+    'QueryTerm',
+]
+
+
+def isSimpleQuery(query):
+    """
+    Return True if a query is a single plain search term,
+    that doesn't need to be compiled into a QueryPlan.
+    """
+    return not (query.startswith('!') or query.startswith('/') or
+                '*' in query or '?' in query or len(query.split()) > 1)
+
+
+
+class QueryTerm(object):
+    """
+    A single term of a query, matched against the search keys of nodes.
+
+    Literal terms match keys containing the term, or its characters in order
+    when fuzzy matching. Glob terms match the whole short name, the same
+    way `ls` patterns do. Regex terms match anywhere in the key.
+    """
+
+    LITERAL = 'literal'
+    GLOB = 'glob'
+    REGEX = 'regex'
+
+    def __init__(self, kind, text, negated=False, fuzzy=False):
+        # the kind of term, one of LITERAL, GLOB or REGEX
+        self.kind = kind
+        # the text of the term, lower case unless it is a regex
+        self.text = text
+        # when True, nodes matching the term are excluded
+        self.negated = negated
+        # when True, a literal term matches its characters in order
+        self.fuzzy = fuzzy and kind == self.LITERAL
+        # compiled patterns for searching a single key, and a
+        # joined buffer of keys, by whether only short names are matched
+        self._patterns = {}
+
+    def __repr__(self):
+        return '<QueryTerm {0}{1} {2!r}>'.format('!' if self.negated else '', self.kind, self.text)
+
+    @property
+    def isScored(self):
+        """
+        True if the term contributes to the score of a match
+        """
+        return self.kind == self.LITERAL and not self.negated
+
+    def getSelectivity(self):
+        """
+        Return a sort key that orders more selective terms first.
+        Positive terms run before negated ones, which only filter,
+        and longer literals are expected to match fewer nodes.
+        """
+        kindOrder = {self.LITERAL: 0, self.GLOB: 1, self.REGEX: 2}[self.kind]
+        fixedChars = len([c for c in self.text if c not in '*?'])
+        return (self.negated, self.fuzzy, kindOrder, -fixedChars)
+
+    def getPattern(self, shortNames=False):
+        """
+        Return a compiled regex that finds the term in a buffer of keys
+        joined by newlines, or in a single key. If `shortNames` is True,
+        only matches within the short name part of each key.
+        """
+        pattern = self._patterns.get(shortNames)
+        if pattern is None:
+            # characters that a match must not cross
+            stop = '|\n' if shortNames else '\n'
+            if self.kind == self.GLOB:
+                parts = []
+                for c in self.text:
+                    if c == '*':
+                        parts.append('[^|\n]*')
+                    elif c == '?':
+                        parts.append('[^|\n]')
+                    else:
+                        parts.append(re.escape(c))
+                source = '(?:^|\\|){0}$'.format(''.join(parts))
+            elif self.kind == self.REGEX:
+                source = '(?:{0})'.format(self.text)
+                if shortNames:
+                    source += '[^|\n]*$'
+            elif self.fuzzy:
+                source = getFuzzyRegexSource(self.text, stop)
+                if shortNames:
+                    source += '[^|\n]*$'
+            else:
+                source = re.escape(self.text)
+                if shortNames:
+                    source += '[^|\n]*$'
+            flags = re.MULTILINE | (re.IGNORECASE if self.kind == self.REGEX else 0)
+            pattern = self._patterns[shortNames] = re.compile(source, flags)
+        return pattern
+
+    def getKeyMatcher(self, shortNames=False):
+        """
+        Return a function that returns True if a single key contains the term
+        """
+        if self.kind == self.LITERAL and not self.fuzzy and not shortNames:
+            text = self.text
+            return lambda key: text in key
+        search = self.getPattern(shortNames).search
+        return lambda key: search(key) is not None
+
+
+
+class QueryPlan(object):
+    """
+    A query compiled into terms that are all ANDed together, ordered so
+    that the most selective term runs first and later terms only have to
+    check the rows that are still candidates.
+
+    While there are many candidates, a term is matched in a single pass over
+    a buffer of all search keys joined by newlines, see `NodeTable.getKeyBuffer`,
+    instead of calling a python function per key. Once the candidates are
+    few enough, the remaining terms check them one by one.
+
+    Query syntax, terms are separated by spaces:
+        ctrl        keys containing 'ctrl' (or its characters in order, if fuzzy)
+        !fk         keys not containing 'fk', negated terms are never fuzzy
+        l_*_ctrl    short names matching a glob, the same as `ls` patterns
+        /ik\\d+/     keys matching a regular expression, case insensitive
+    """
+
+    # once fewer than 1 / scanRatio of all rows are candidates,
+    # terms are checked per row instead of with a buffer pass
+    scanRatio = 8
+
+    def __init__(self, query, fuzzyMatching=False):
+        """
+        Args:
+            query : `str`
+                the query to compile
+            fuzzyMatching : `bool`
+                if True, positive literal terms use fuzzy matching
+        """
+        self.query = query
+        self.terms = self._compile(query, fuzzyMatching)
+        self.terms.sort(key=lambda t: t.getSelectivity())
+
+    def __repr__(self):
+        return '<QueryPlan {0!r}>'.format(self.terms)
+
+    @staticmethod
+    def _compile(query, fuzzyMatching):
+        terms = []
+        for token in query.split():
+            negated = token.startswith('!')
+            if negated:
+                token = token[1:]
+            if not token:
+                continue
+            if len(token) > 2 and token.startswith('/') and token.endswith('/'):
+                try:
+                    re.compile(token[1:-1])
+                except re.error:
+                    # partially typed regex, match it literally until it is valid
+                    terms.append(QueryTerm(QueryTerm.LITERAL, token.lower(), negated, False))
+                    continue
+                terms.append(QueryTerm(QueryTerm.REGEX, token[1:-1], negated))
+            elif '*' in token or '?' in token:
+                terms.append(QueryTerm(QueryTerm.GLOB, token.lower(), negated))
+            else:
+                terms.append(QueryTerm(QueryTerm.LITERAL, token.lower(), negated, fuzzyMatching and not negated))
+        return terms
+
+    @property
+    def isScored(self):
+        """
+        True if any term contributes to the score of matches,
+        otherwise all matches are equal and need no ranking
+        """
+        return bool([t for t in self.terms if t.isScored])
+
+    def search(self, nodeTable, rows=None, isCancelled=None, shortNames=False):
+        """
+        Return the rows of all nodes in a node table that match every term.
+
+        Args:
+            nodeTable : `NodeTable`
+                the table to search
+            rows : `list` of `int`
+                if given, only search these sorted rows instead of the whole table
+            isCancelled : `callable`
+                if given, called periodically and the search is
+                abandoned when it returns True
+            shortNames : `bool`
+                if True, only match the short name of each node
+
+        Returns:
+            `list` of `int`, or None if the search was cancelled
+        """
+        numRows = len(nodeTable)
+        keys = nodeTable.searchKeys
+        candidates = rows
+        for term, estimate in self._getOrderedTerms(nodeTable):
+            if isCancelled is not None and isCancelled():
+                return None
+            if candidates is not None and not candidates:
+                break
+            numCandidates = numRows if candidates is None else len(candidates)
+            # a buffer pass costs about as much as checking every row, plus a
+            # little per match, so only use it for many candidates and few matches
+            useBuffer = (numCandidates * self.scanRatio > numRows and
+                         (estimate is None or estimate * self.scanRatio < numCandidates))
+            if useBuffer:
+                matched = self._scanBuffer(nodeTable, term, shortNames)
+                if term.negated:
+                    matchedSet = set(matched)
+                    if candidates is None:
+                        candidates = range(numRows)
+                    candidates = [i for i in candidates if i not in matchedSet]
+                elif candidates is None:
+                    candidates = matched
+                else:
+                    candidateSet = set(candidates)
+                    candidates = [i for i in matched if i in candidateSet]
+            else:
+                match = term.getKeyMatcher(shortNames)
+                negated = term.negated
+                results = []
+                for chunk in nodeTable._iterChunks(candidates, isCancelled):
+                    if chunk is None:
+                        return None
+                    results.extend([i for i in chunk if match(keys[i]) != negated])
+                candidates = results
+        if candidates is None:
+            return list(range(numRows))
+        return list(candidates)
+
+    def _getOrderedTerms(self, nodeTable):
+        """
+        Return a list of (term, estimated matches) ordered so that the most
+        selective term runs first. The number of matches of exact literal terms
+        is estimated by counting their occurrences in the key buffer, which is
+        much faster than searching, others are ordered by `getSelectivity`.
+        """
+        buffer = None
+        result = []
+        for term in self.terms:
+            estimate = None
+            if term.kind == QueryTerm.LITERAL and not term.fuzzy:
+                if buffer is None:
+                    buffer = nodeTable.getKeyBuffer()[0]
+                estimate = buffer.count(term.text)
+            result.append((term, estimate))
+        # positive terms first, terms with an estimate before others of the same kind
+        result.sort(key=lambda item: (item[0].negated, item[1] is None, item[1], item[0].getSelectivity()))
+        return result
+
+    @staticmethod
+    def _scanBuffer(nodeTable, term, shortNames):
+        """
+        Return the sorted rows of all keys containing a term, ignoring negation,
+        found in a single pass over the joined key buffer of a node table.
+        """
+        buffer, lineStarts = nodeTable.getKeyBuffer()
+        rows = []
+        if term.kind == QueryTerm.LITERAL and not term.fuzzy and not shortNames:
+            text = term.text
+            pos = buffer.find(text)
+            while pos >= 0:
+                row = bisect.bisect_right(lineStarts, pos) - 1
+                rows.append(row)
+                # continue from the start of the next line
+                pos = buffer.find(text, lineStarts[row + 1])
+            return rows
+        search = term.getPattern(shortNames).search
+        keyMatch = None
+        if term.kind == QueryTerm.REGEX:
+            # a regex may match across lines, such matches are checked again per key
+            keyMatch = term.getKeyMatcher(shortNames)
+        numRows = len(lineStarts) - 1
+        match = search(buffer)
+        while match:
+            row = bisect.bisect_right(lineStarts, match.start()) - 1
+            if row >= numRows:
+                # an empty match at the end of the buffer, after the last key
+                break
+            nextLineStart = lineStarts[row + 1]
+            if keyMatch is None or match.end() < nextLineStart or keyMatch(nodeTable.searchKeys[row]):
+                rows.append(row)
+            match = search(buffer, nextLineStart)
+        return rows
+
+    def getRowMatcher(self, nodeTable, shortNames=False):
+        """
+        Return a function that returns True if the node at a row matches every term
+        """
+        keys = nodeTable.searchKeys
+        matchers = [(t.getKeyMatcher(shortNames), t.negated) for t in self.terms]
+        return lambda row: all([match(keys[row]) != negated for match, negated in matchers])
+
+    def getScores(self, nodeTable, rows, shortNames=False):
+        """
+        Return the score of each row, the sum of the fuzzy match scores
+        of all positive literal terms. Every row must already match.
+        """
+        scoredTerms = [t.text for t in self.terms if t.isScored]
+        scores = [0] * len(rows)
+        for text in scoredTerms:
+            termScores = nodeTable.getScores(text, rows, shortNames)
+            scores = [s + (t or 0) for s, t in zip(scores, termScores)]
+        return scores
+
+
+
+class QueryCompiler(object):
+    """
+    Compiles queries into QueryPlans, memoizing the plans of recent queries
+    since the same query is searched again whenever the node list changes.
+    """
+
+    def __init__(self, cacheSize=256):
+        self._cache = LRUCache(cacheSize)
+
+    def compile(self, query, fuzzyMatching=False):
+        key = (query, fuzzyMatching)
+        plan = self._cache.get(key)
+        if plan is None:
+            plan = QueryPlan(query, fuzzyMatching)
+            self._cache.set(key, plan)
+        return plan
+
+    def search(self, nodeTable, query, fuzzyMatching=False, minRankedTermLength=2, rows=None,
+               isCancelled=None, shortNames=False, stats=NULL_STATS):
+        """
+        Return the rows of all nodes in a node table that match a query, ranked by
+        how well they match. Queries that are a single plain term shorter than
+        `minRankedTermLength`, or that have no scored terms, are streamed in table
+        order instead, since only as many results as are displayed are needed.
+
+        Args:
+            nodeTable : `NodeTable`
+                the table to search
+            query : `str`
+                a plain search term, or any query, see `QueryPlan`
+            fuzzyMatching : `bool`
+                if True, match the characters of plain terms in order
+            minRankedTermLength : `int`
+                plain terms shorter than this are streamed
+            rows : `list` of `int`
+                if given, only search these sorted rows instead of the whole table
+            isCancelled : `callable`
+                if given, called periodically and the search is
+                abandoned when it returns True
+            shortNames : `bool`
+                if True, only match the short name of each node
+            stats : `SearchStats`
+                records the time spent searching and scoring, and the number of rows scanned
+
+        Returns:
+            `RankedResults` or `MatchStream` or None, `list` of `int` or None
+                the results, or None if the search was cancelled, and the unranked
+                rows that matched a plain term, which later searches for longer terms
+                can be narrowed down to, or None
+        """
+        numScanned = len(nodeTable) if rows is None else len(rows)
+        if not isSimpleQuery(query):
+            plan = self.compile(query, fuzzyMatching)
+            if not plan.isScored:
+                # nothing to rank by, only search for as many results as are displayed
+                stream = MatchStream(rows if rows is not None else range(len(nodeTable)),
+                                     plan.getRowMatcher(nodeTable, shortNames))
+                return stream, None
+            stats.count('nodesScanned', numScanned)
+            with stats.phase('search'):
+                results = plan.search(nodeTable, rows, isCancelled, shortNames)
+            if results is None:
+                return None, None
+            with stats.phase('score'):
+                return RankedResults(results, plan.getScores(nodeTable, results, shortNames)), None
+        query = query.lower()
+        if len(query) < minRankedTermLength:
+            # broad search, only search for as many results as are displayed
+            match = nodeTable.getRowMatcher(query, fuzzyMatching, shortNames) if query else None
+            return MatchStream(rows if rows is not None else range(len(nodeTable)), match), None
+        stats.count('nodesScanned', numScanned)
+        with stats.phase('search'):
+            if fuzzyMatching:
+                results = nodeTable.searchFuzzy(query, rows, isCancelled, shortNames)
+            else:
+                results = nodeTable.search(query, rows, isCancelled, shortNames)
+        if results is None:
+            return None, None
+        with stats.phase('score'):
+            return RankedResults(results, nodeTable.getScores(query, results, shortNames)), results
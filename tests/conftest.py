@@ -0,0 +1,12 @@
+"""
+Tests for the parts of quicksearch that do not need maya,
+run with pytest from the root of the repository.
+Tests that need Qt are skipped when it is not available.
+"""
+
+import os
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                           'src', 'quicksearch', 'scripts', 'quicksearch')
+sys.path.insert(0, os.path.normpath(SCRIPTS_DIR))
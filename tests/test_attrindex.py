@@ -0,0 +1,86 @@
+
+from engine import NodeSearchEngine, StaticNodeSource
+
+
+NODES = [
+    ('|rig', 'transform'),
+    ('|rig|arm_ctl', 'transform'),
+    ('|rig|leg_ctl', 'transform'),
+    ('|rig|root', 'joint'),
+    ('|rig|root|arm_jnt', 'joint'),
+]
+
+
+class CountingNodeSource(StaticNodeSource):
+    """
+    A StaticNodeSource that records every attribute it lists nodes for
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CountingNodeSource, self).__init__(*args, **kwargs)
+        self.listedAttributes = []
+        # the nodes checked for each listed attribute, or None if the whole scene was listed
+        self.checkedNodes = []
+
+    def listNodesWithAttribute(self, name, nodeTypes=None, nodes=None): # override
+        self.listedAttributes.append(name)
+        self.checkedNodes.append(sorted(nodes) if nodes is not None else None)
+        return super(CountingNodeSource, self).listNodesWithAttribute(name, nodeTypes, nodes)
+
+
+def getEngine():
+    source = CountingNodeSource(
+        NODES, typeAttributes={'transform': ['translate', 't'], 'joint': ['translate', 't', 'ikBlend']},
+        dynamicAttributes={'|rig|arm_ctl': ['ikBlend', 'ikb']})
+    return NodeSearchEngine(source), source
+
+
+def searchNodes(engine, query, **kwargs):
+    prepared = engine.prepare(query, **kwargs)
+    return sorted([prepared.nodeTable.getLongName(row) for row in engine.search(prepared)]), prepared
+
+
+def test_static_and_dynamic_attributes():
+    engine, source = getEngine()
+    assert searchNodes(engine, '-attr translate')[0] == [n for n, _ in sorted(NODES)]
+    assert source.listedAttributes == []
+    assert searchNodes(engine, '-attr ikBlend')[0] == ['|rig|arm_ctl', '|rig|root', '|rig|root|arm_jnt']
+    assert searchNodes(engine, 'ctl -attr ikb')[0] == ['|rig|arm_ctl']
+    # nodes are listed once per attribute name, not per node
+    assert source.listedAttributes == ['ikBlend', 'ikb']
+
+
+def test_attribute_changes_clear_listed_nodes():
+    engine, source = getEngine()
+    assert searchNodes(engine, '-attr ikb')[0] == ['|rig|arm_ctl']
+    source.dynamicAttributes['|rig|leg_ctl'] = ['ikb']
+    engine.nodeCache.eventSource.emitAttributesChanged()
+    assert searchNodes(engine, '-attr ikb')[0] == ['|rig|arm_ctl', '|rig|leg_ctl']
+
+
+def test_incomplete_attribute_is_not_listed():
+    engine, source = getEngine()
+    results, prepared = searchNodes(engine, '-attr ikB', listIncompleteAttributes=False)
+    assert prepared.attributesIncomplete
+    assert source.listedAttributes == []
+    # static attributes still match while typing
+    assert searchNodes(engine, '-attr ikBlend', listIncompleteAttributes=False)[0] == ['|rig|root', '|rig|root|arm_jnt']
+    # a space after the attribute completes it
+    results, prepared = searchNodes(engine, '-attr ikBlend ', listIncompleteAttributes=False)
+    assert not prepared.attributesIncomplete
+    assert results == ['|rig|arm_ctl', '|rig|root', '|rig|root|arm_jnt']
+
+
+def test_node_changes_update_listed_nodes():
+    engine, source = getEngine()
+    eventSource = engine.nodeCache.eventSource
+    assert searchNodes(engine, '-attr ikb')[0] == ['|rig|arm_ctl']
+    source.addNodes([('|rig|hand_ctl', 'transform'), ('|rig|hand_jnt', 'joint')], {'|rig|hand_ctl': ['ikb']})
+    assert searchNodes(engine, '-attr ikb')[0] == ['|rig|arm_ctl', '|rig|hand_ctl']
+    # only the added nodes are checked
+    assert source.checkedNodes == [None, ['|rig|hand_ctl', '|rig|hand_jnt']]
+    eventSource.emitNodeRenamed('|rig', '|char')
+    eventSource.emitNodesRemoved(['|char|hand_ctl'])
+    assert searchNodes(engine, '-attr ikb')[0] == ['|char|arm_ctl']
+    # renamed and removed nodes are updated without listing nodes again
+    assert source.listedAttributes == ['ikb', 'ikb']
@@ -0,0 +1,54 @@
+
+from commandindex import CommandIndex
+
+
+COMMANDS = [
+    (CommandIndex.MEL, 'polyCube', 'polyCube'),
+    (CommandIndex.MENU_ITEM, 'MayaWindow|Create|Polygon Primitives|Cube', 'Cube\tand\nmore'),
+    (CommandIndex.RUNTIME, 'CreatePolygonCube', 'Create Polygon Cube'),
+]
+
+
+class CommandLister(object):
+
+    def __init__(self):
+        self.cacheKey = 'maya2024'
+        self.calls = 0
+
+    def getCacheKey(self):
+        return self.cacheKey
+
+    def listCommands(self):
+        self.calls += 1
+        return list(COMMANDS)
+
+
+def test_index_is_saved_and_loaded(tmp_path):
+    path = str(tmp_path / 'prefs' / 'commandIndex.txt')
+    lister = CommandLister()
+    index = CommandIndex(path, lister.getCacheKey, lister.listCommands)
+    assert index.update()
+    assert lister.calls == 1
+    kinds, names, labels = index.getEntries()
+    assert names == [c[1] for c in COMMANDS]
+    # labels are stored on a single line
+    assert labels[1] == 'Cube and more'
+    # another session loads the saved index instead of listing commands
+    loaded = CommandIndex(path, lister.getCacheKey, lister.listCommands)
+    assert loaded.update()
+    assert lister.calls == 1
+    assert loaded.getEntries() == index.getEntries()
+    assert not loaded.update()
+
+
+def test_index_is_rebuilt_when_cache_key_changes(tmp_path):
+    path = str(tmp_path / 'commandIndex.txt')
+    lister = CommandLister()
+    index = CommandIndex(path, lister.getCacheKey, lister.listCommands)
+    index.update()
+    generation = index.generation
+    lister.cacheKey = 'maya2025'
+    assert index.update()
+    assert lister.calls == 2
+    assert index.generation > generation
+    assert len(index) == len(COMMANDS)
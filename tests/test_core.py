@@ -0,0 +1,113 @@
+
+import threading
+
+import pytest
+
+pytest.importorskip('Qt')
+
+from Qt import QtCore
+
+from core import SearchModelBase, SearchWorker
+from engine import NodeSearchEngine, StaticNodeSource
+
+
+NODES = [('|grp{0}|arm_ctl{0}'.format(i), 'transform') for i in range(100)]
+
+
+
+class ListSearchModel(SearchModelBase):
+    """
+    A SearchModelBase that searches a list of strings,
+    and records the row signals it emits
+    """
+
+    def __init__(self, items):
+        super(ListSearchModel, self).__init__()
+        self.items = items
+        self.numItemsInitiallyDisplayed = 4
+        self.numItemsToFetch = 3
+        self.signals = []
+        self.rowsInserted.connect(lambda parent, first, last: self.signals.append(('insert', first, last)))
+        self.rowsRemoved.connect(lambda parent, first, last: self.signals.append(('remove', first, last)))
+        self.modelReset.connect(lambda: self.signals.append('reset'))
+
+    def _updateResults(self): # override
+        self.results = [item for item in self.items if self.query in item]
+
+    def getItemData(self, index, role=QtCore.Qt.DisplayRole): # override
+        return self.results[index.row()]
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def test_worker_only_runs_latest_job():
+    worker = SearchWorker()
+    started = threading.Event()
+    release = threading.Event()
+    finished = threading.Event()
+    results = []
+
+    def blockingJob(isCancelled):
+        started.set()
+        release.wait(5)
+        return 'first'
+
+    def job(name):
+        return lambda isCancelled: name
+
+    worker.submit(blockingJob, lambda: False, results.append)
+    worker.start()
+    assert started.wait(5)
+    # jobs submitted while the worker is busy replace each other
+    worker.submit(job('second'), lambda: False, results.append)
+    worker.submit(job('third'), lambda: False, lambda r: (results.append(r), finished.set()))
+    release.set()
+    assert finished.wait(5)
+    assert results == ['first', 'third']
+    # cancelled jobs never report results
+    cancelled = threading.Event()
+    worker.submit(job('cancelled'), lambda: cancelled.set() or True, results.append)
+    assert cancelled.wait(5)
+    assert results == ['first', 'third']
+
+
+def test_cancelled_search_returns_none():
+    engine = NodeSearchEngine(StaticNodeSource(NODES))
+    engine.fuzzyMatching = False
+    prepared = engine.prepare('arm_ctl')
+    assert engine.search(prepared, lambda: True) is None
+    # a cancelled search is not used to narrow down the next one
+    assert len(engine.search(engine.prepare('arm_ctl1'))) == 11
+
+
+def test_model_emits_minimal_row_signals(app):
+    model = ListSearchModel(['abc', 'abcd', 'abcde', 'ab', 'b', 'bc', 'xb'])
+
+    def setQuery(query):
+        del model.signals[:]
+        model.setQuery(query)
+        return model.signals
+
+    assert setQuery('abc') == [('insert', 0, 2)]
+    # rows added at the end
+    assert setQuery('ab') == [('insert', 3, 3)]
+    assert model.rowCount() == 4
+    # rows removed from the end
+    assert setQuery('abc') == [('remove', 3, 3)]
+    # the same rows displayed again
+    assert setQuery('abc') == []
+    # any other change resets the model
+    assert setQuery('d') == ['reset']
+    assert setQuery('b') == ['reset']
+    assert [model.data(model.index(row)) for row in range(model.rowCount())] == ['abc', 'abcd', 'abcde', 'ab']
+    # fetching more rows inserts exactly the new rows
+    assert model.canFetchMore(QtCore.QModelIndex())
+    del model.signals[:]
+    model.fetchMore(QtCore.QModelIndex())
+    assert model.signals == [('insert', 4, 6)]
+    assert model.rowCount() == 7
+    assert not model.canFetchMore(QtCore.QModelIndex())
+    assert setQuery('') == [('remove', 0, 6)]
@@ -0,0 +1,189 @@
+
+import pytest
+
+from caching import LRUCache
+from engine import NodeSearchEngine, StaticNodeSource
+from instrumentation import SearchStats
+
+
+NODES = [('|grp{0}|{1}_{2}_ctl{0}'.format(i, side, part), 'transform')
+         for i in range(20) for side in ('L', 'R') for part in ('arm', 'leg', 'armor')]
+
+# queries typed one character at a time, then erased and typed again
+TYPED = ['a', 'ar', 'arm', 'arm_', 'arm_c', 'arm_ct', 'ar', 'arm', 'l_arm', 'l_armo', 'ctl1', 'ctl12']
+
+
+def getResults(engine, query, stats=None):
+    stats = stats or SearchStats(query)
+    prepared = engine.prepare(query, stats)
+    return [prepared.nodeTable.getLongName(row) for row in engine.search(prepared, stats=stats)]
+
+
+@pytest.mark.parametrize('fuzzyMatching', [False, True])
+def test_narrowing_matches_fresh_search(fuzzyMatching):
+    engine = NodeSearchEngine(StaticNodeSource(NODES))
+    engine.fuzzyMatching = fuzzyMatching
+    narrowed = 0
+    for query in TYPED:
+        stats = SearchStats(query)
+        results = getResults(engine, query, stats)
+        narrowed += stats.counters.get('narrowed', 0)
+        fresh = NodeSearchEngine(StaticNodeSource(NODES))
+        fresh.fuzzyMatching = fuzzyMatching
+        assert results == getResults(fresh, query), query
+    # extending a term, also in the middle, only searches the last results
+    assert narrowed
+
+
+def test_cached_results_follow_scene_changes():
+    engine = NodeSearchEngine(StaticNodeSource(NODES))
+    prepared = engine.prepare('arm_ctl1')
+    results = engine.search(prepared)
+    engine.cacheResults(prepared, results)
+    assert engine.getCachedResults(engine.prepare('arm_ctl1')) is results
+    # other ls kwargs are cached separately
+    assert engine.getCachedResults(engine.prepare('arm_ctl1 -type transform')) is None
+    # the nodes changed, so the cache key of the same query changes too
+    engine.nodeCache.eventSource.emitNodesAdded([('|grp1|L_arm_ctl100', 'transform')])
+    prepared = engine.prepare('arm_ctl1')
+    assert engine.getCachedResults(prepared) is None
+    assert '|grp1|L_arm_ctl100' in [prepared.nodeTable.getLongName(row) for row in engine.search(prepared)]
+
+
+def test_node_tables_are_cached_per_ls_kwargs():
+    source = StaticNodeSource(NODES + [('|grp0|L_arm_ctl0|L_arm_ctlShape0', 'nurbsCurve')],
+                              inheritedTypes={'nurbsCurve': ['shape']})
+    engine = NodeSearchEngine(source)
+    # only keep two node tables
+    engine.nodeTableCache = LRUCache(2)
+    engine.updateNodeTable({})
+    allNodes = engine.nodeTable
+    engine.updateNodeTable({'shapes': True})
+    shapes = engine.nodeTable
+    assert list(shapes.longNames) == ['|grp0|L_arm_ctl0|L_arm_ctlShape0']
+    # switching back to a recent filter reuses its table
+    assert engine.updateNodeTable({})
+    assert engine.nodeTable is allNodes
+    # the least recently used table is evicted
+    engine.updateNodeTable({'transforms': True})
+    assert len(engine.nodeTableCache) == 2
+    engine.updateNodeTable({'shapes': True})
+    assert engine.nodeTable is not shapes
+    shapes = engine.nodeTable
+    engine.updateNodeTable({})
+    assert engine.nodeTable is not allNodes
+    # changing the nodes invalidates every cached table
+    source.addNodes([('|grp1|L_arm_ctl1|L_arm_ctlShape1', 'nurbsCurve')])
+    engine.updateNodeTable({'shapes': True})
+    assert engine.nodeTable is not shapes
+    assert len(engine.nodeTable) == 2
+
+
+TYPED_NODES = [
+    ('|rig', 'transform'),
+    ('|rig|root', 'joint'),
+    ('|rig|root|arm', 'joint'),
+    ('|rig|arm_ctl', 'transform'),
+    ('|rig|arm_ctl|arm_ctlShape', 'nurbsCurve'),
+    ('|body', 'transform'),
+    ('|body|bodyShape', 'mesh'),
+    ('lambert1', 'lambert'),
+]
+
+INHERITED_TYPES = {
+    'transform': ['dagNode'],
+    'joint': ['dagNode', 'transform'],
+    'nurbsCurve': ['dagNode', 'shape', 'geometryShape'],
+    'mesh': ['dagNode', 'shape', 'geometryShape'],
+    'lambert': ['shadingDependNode'],
+}
+
+
+class CountingNodeSource(StaticNodeSource):
+    """
+    A StaticNodeSource that records the kwargs of every node listing
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CountingNodeSource, self).__init__(*args, **kwargs)
+        self.listedKwargs = []
+
+    def listNodes(self, kwargs): # override
+        self.listedKwargs.append(dict(kwargs))
+        return super(CountingNodeSource, self).listNodes(kwargs)
+
+
+@pytest.mark.parametrize('flags', [
+    '-type transform', '-type shape lambert', '-exactType transform', '-et transform -typ shape',
+    '-excludeType joint', '-type dagNode -ext geometryShape', '-tr -ext joint',
+])
+def test_type_filters_match_ls(flags):
+    source = CountingNodeSource(TYPED_NODES, INHERITED_TYPES)
+    engine = NodeSearchEngine(source)
+    engine.updateNodeTable({})
+    listings = len(source.listedKwargs)
+    prepared = engine.prepare(flags)
+    kwargs = engine.getFullNodeKwargs()
+    types = kwargs.get('type', [])
+    exactTypes = kwargs.get('exactType', [])
+    excludeTypes = kwargs.get('excludeType', [])
+    baseKwargs = dict([(k, v) for k, v in kwargs.items() if k not in engine.typeNodeKwargKeys])
+    expected = []
+    for longName, nodeType in source.listNodes(baseKwargs):
+        if (types or exactTypes) and not (nodeType in exactTypes or source.inheritsAny(nodeType, types)):
+            continue
+        if excludeTypes and source.inheritsAny(nodeType, excludeTypes):
+            continue
+        expected.append(longName)
+    assert types or exactTypes or excludeTypes
+    assert sorted(prepared.nodeTable.longNames) == sorted(expected)
+    # type filters never list nodes again
+    assert all(set(k).isdisjoint(engine.typeNodeKwargKeys) for k in source.listedKwargs[listings:])
+
+
+HIERARCHY_NODES = [
+    ('|rigA', 'transform'),
+    ('|rigA|arm', 'transform'),
+    ('|rigA|arm|hand', 'transform'),
+    ('|rigA|arm|hand|hand_ctl', 'transform'),
+    ('|rigA|leg', 'transform'),
+    ('|rigA|leg|foot', 'transform'),
+    ('|rigB', 'transform'),
+    ('|rigB|arm', 'transform'),
+    ('|rigB|arm|hand', 'transform'),
+    ('|grp', 'transform'),
+    ('|grp|rigA', 'transform'),
+    ('|grp|rigA|arm', 'transform'),
+    ('|grp|rigA|arm|hand', 'transform'),
+    ('|char:rigC', 'transform'),
+    ('|char:rigC|char:arm', 'transform'),
+    ('|char:rigC|char:arm|char:hand', 'transform'),
+]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('riga|*|hand', ['|rigA|arm|hand', '|grp|rigA|arm|hand']),
+    ('|riga|*|hand', ['|rigA|arm|hand']),
+    ('riga|**|hand', ['|rigA|arm|hand', '|rigA|arm|hand|hand_ctl', '|grp|rigA|arm|hand']),
+    ('rig*|arm|hand', ['|rigA|arm|hand', '|rigB|arm|hand', '|grp|rigA|arm|hand', '|char:rigC|char:arm|char:hand']),
+    ('char:rig?|*|hand', ['|char:rigC|char:arm|char:hand']),
+    ('rigb|*', ['|rigB|arm']),
+    ('|*|*|f', ['|rigA|leg|foot']),
+    ('riga|*|*ctl', []),
+])
+def test_hierarchy_scopes(query, expected):
+    engine = NodeSearchEngine(StaticNodeSource(HIERARCHY_NODES))
+    engine.fuzzyMatching = False
+    assert sorted(getResults(engine, query)) == sorted(expected)
+
+
+@pytest.mark.parametrize('query, selection, expected', [
+    ('-us', ['|rigA|arm|hand'], ['|rigA|arm|hand|hand_ctl']),
+    ('hand -us', ['|rigA', '|rigB'], ['|rigA|arm|hand', '|rigA|arm|hand|hand_ctl', '|rigB|arm|hand']),
+    ('arm|*|*ctl -us', ['|rigA'], ['|rigA|arm|hand|hand_ctl']),
+    ('hand -us', [], []),
+])
+def test_under_selection_scopes(query, selection, expected):
+    engine = NodeSearchEngine(StaticNodeSource(HIERARCHY_NODES, selection=selection))
+    engine.fuzzyMatching = False
+    assert sorted(getResults(engine, query)) == sorted(expected)
@@ -0,0 +1,38 @@
+
+import random
+
+import pytest
+
+from matching import MatchStream, RankedResults
+
+
+@pytest.mark.parametrize('numItems', [0, 1, 99, 100, 101, 1000])
+def test_ranked_results_match_sorted(numItems):
+    rand = random.Random(numItems)
+    items = list(range(numItems))
+    rand.shuffle(items)
+    scores = [rand.randint(0, 20) for _ in items]
+    expected = [item for item, _ in sorted(zip(items, scores), key=lambda pair: -pair[1])]
+    results = RankedResults(items, scores)
+    assert len(results) == numItems
+    # only the first page is ranked, and later pages are ranked as they are requested
+    for count in (1, 10, 150, numItems):
+        results.rankTo(count)
+        assert results.numRanked >= min(count, numItems)
+        assert results.numRanked == numItems or results.numRanked <= max(2 * count, RankedResults.minRankCount)
+        assert [results[i] for i in range(results.numRanked)] == expected[:results.numRanked]
+    assert list(results) == expected
+
+
+def test_match_stream_count():
+    stream = MatchStream(list(range(50000)), lambda i: i % 3 == 0)
+    stream.fetchTo(10)
+    assert stream.getCount() is None
+    assert stream.countAll(lambda: True) is None
+    count = stream.countAll()
+    assert count == len([i for i in range(50000) if i % 3 == 0])
+    # counting does not change the fetched results
+    assert len(stream) < count and stream.getCount() is None
+    stream.setCount(count)
+    assert stream.getCount() == count
+    assert list(stream) == list(range(0, 50000, 3))
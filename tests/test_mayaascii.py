@@ -0,0 +1,67 @@
+import os
+
+from mayaascii import MayaAsciiIndex, parseMayaAscii
+
+
+RIG = '''//Maya ASCII 2024 scene
+requires maya "2024";
+createNode transform -n "rig";
+createNode transform -n "hip" -p "rig";
+createNode joint -n "root" -p "hip";
+\taddAttr -ci true -sn "ikb" -ln "ikBlend" -at "double";
+createNode transform -n "pSphere1";
+createNode mesh -n "pSphereShape1" -p "pSphere1";
+createNode transform -n "pSphere2";
+parent -s -nc -r -add "|pSphere1|pSphereShape1" "pSphere2";
+createNode transform -n "loose";
+parent -r "loose" "|rig|hip";
+createNode transform -n "group1" -p "rig";
+parent -w "group1";
+createNode lambert -n "skin";
+setAttr ".c" -type "float3" 1 0.5 0.5;
+'''
+
+SHOT = '''//Maya ASCII 2024 scene
+file -r -ns "char01" -dr 1 "rig.ma";
+file -r -ns "char02" "rig.ma";
+createNode transform -n "cam";
+createNode locator -n "marker" -p "char02:hip";
+'''
+
+
+def writeFile(directory, name, text):
+    path = os.path.join(str(directory), name)
+    with open(path, 'w') as fp:
+        fp.write(text)
+    return path
+
+
+def test_parse(tmp_path):
+    result = parseMayaAscii(writeFile(tmp_path, 'rig.ma', RIG))
+    assert result.names == ['rig', 'hip', 'root', 'pSphere1', 'pSphereShape1', 'pSphere2', 'loose', 'group1', 'skin']
+    assert result.types[2] == 'joint'
+    assert result.attributes == {2: ['ikb', 'ikBlend']}
+    # reparented, and parented to the world
+    assert result.parents[6] == 1
+    assert result.parents[7] == -1
+    assert result.instanceParents == {4: [5]}
+
+
+def test_nodes_include_references_and_instances(tmp_path):
+    rigPath = writeFile(tmp_path, 'rig.ma', RIG)
+    shotPath = writeFile(tmp_path, 'shot.ma', SHOT)
+    for cacheDir in (None, str(tmp_path / 'cache'), str(tmp_path / 'cache')):
+        index = MayaAsciiIndex(cacheDir, processes=1)
+        assert index.update([shotPath])
+        assert index.getFile(rigPath) is not None
+        nodes = dict((longName, (nodeType, isReferenced)) for longName, nodeType, attributes, isReferenced
+                     in index.getNodes(shotPath))
+        rigNodes = ['|rig', '|rig|hip', '|rig|hip|root', '|rig|hip|loose', '|group1', 'skin', '|pSphere1',
+                    '|pSphere1|pSphereShape1', '|pSphere2', '|pSphere2|pSphereShape1']
+        # the deferred reference is not loaded
+        assert sorted(nodes) == sorted(['|cam', '|char02:rig|char02:hip|marker'] + [
+            '|'.join([s and 'char02:' + s for s in n.split('|')]) for n in rigNodes])
+        assert nodes['|char02:rig|char02:hip|marker'] == ('locator', False)
+        assert nodes['|char02:pSphere1|char02:pSphereShape1'] == ('mesh', True)
+        # the file is unchanged, and not indexed again
+        assert not index.update([shotPath])
@@ -0,0 +1,97 @@
+
+import pytest
+
+from engine import NodeSearchEngine, StaticNodeSource
+from nodetable import NodeTable, PartitionedTrigramIndex
+
+
+WORDS = ['arm', 'leg', 'ctl', 'jnt', 'root', 'spine']
+
+NODES = sorted([
+    ('|{0}grp{1}|{0}{2}_{3}_{1}'.format(ns, i, WORDS[i % 6], WORDS[(i * 7) % 6]), 'transform')
+    for ns in ('', 'char01:', 'char02:', 'char02:sub:') for i in range(30)
+], key=lambda node: NodeTable.getSortKey(node[0]))
+
+TERMS = ['arm', 'arm_ctl', 'ctl_1', 'grp2', 'char02:sub', 'xyz', 'a', 'jnt_2']
+
+
+def getPartitions(useTrigramIndex):
+    partitions = {}
+    for longName, nodeType in NODES:
+        partitions.setdefault(NodeTable.getSortKey(longName)[0], []).append(longName)
+    return [(ns, NodeTable(names, useTrigramIndex)) for ns, names in sorted(partitions.items())]
+
+
+@pytest.mark.parametrize('term', TERMS)
+def test_concatenated_trigram_index(term):
+    table = NodeTable([n for n, _ in NODES])
+    indexed = NodeTable.concatenate(getPartitions(True), useTrigramIndex=True)
+    assert isinstance(indexed.trigramIndex, PartitionedTrigramIndex)
+    assert indexed.searchKeys == table.searchKeys
+    assert indexed.search(term) == table.search(term)
+    # partitions without their own index are indexed when concatenated
+    assert NodeTable.concatenate(getPartitions(False), useTrigramIndex=True).search(term) == table.search(term)
+
+
+@pytest.mark.parametrize('fuzzyMatching', [False, True])
+def test_partitioned_table_matches_fresh_table(fuzzyMatching):
+    queries = TERMS + ['arm !ctl', '/_[0-9]$/', 'char01:*_1', 'char02:ctl']
+    engine = NodeSearchEngine(StaticNodeSource(NODES))
+    engine.trigramIndexMinNodes = 10
+    engine.fuzzyMatching = fuzzyMatching
+    assert isinstance(engine.prepare('arm').nodeTable.trigramIndex, PartitionedTrigramIndex)
+    # change a single partition
+    added = [('|char01:grp1|char01:arm_ctl_new', 'transform')]
+    engine.nodeCache.eventSource.emitNodesAdded(added)
+    engine.nodeCache.eventSource.emitNodesRemoved(['|char02:grp2|char02:spine_jnt_2'])
+    expectedNodes = [n for n in NODES if n[0] != '|char02:grp2|char02:spine_jnt_2'] + added
+    fresh = NodeSearchEngine(StaticNodeSource(expectedNodes))
+    fresh.trigramIndexMinNodes = None
+    fresh.fuzzyMatching = fuzzyMatching
+    assert engine.searchMany(queries) == fresh.searchMany(queries)
+
+
+def test_table_rows_resolve_nodes():
+    names = [n for n, _ in NODES]
+    table = NodeTable(names)
+    assert list(table.longNames) == names
+    assert table.searchKeys == [n.lower() for n in names]
+    for row, longName in enumerate(names):
+        assert table.getRow(longName) == row
+        assert table.getShortName(row) == longName.split('|')[-1]
+    assert table.getRow('|char01:grp1|missing') is None
+    # results are rows into the table
+    engine = NodeSearchEngine(StaticNodeSource(NODES))
+    engine.fuzzyMatching = False
+    prepared = engine.prepare('arm_')
+    rows = list(engine.search(prepared))
+    assert rows and all(isinstance(row, int) for row in rows)
+    assert sorted(prepared.nodeTable.getLongName(row) for row in rows) == sorted(
+        n for n in names if 'arm_' in n.lower())
+
+
+@pytest.mark.parametrize('term', TERMS + ['ar', 'm_c', 'spine_'])
+def test_trigram_index_matches_scan(term):
+    names = [n for n, _ in NODES]
+    table = NodeTable(names)
+    indexed = NodeTable(names, useTrigramIndex=True)
+    assert indexed.search(term) == table.search(term)
+    # only the candidates within the given rows are checked
+    rows = list(range(0, len(names), 3))
+    assert indexed.search(term, rows) == table.search(term, rows)
+    if len(term) >= 3:
+        candidates = indexed.trigramIndex.getCandidates(term)
+        assert set(table.search(term)).issubset(candidates)
+
+
+def test_rows_of_derived_tables():
+    partitions = getPartitions(False)
+    table = NodeTable.concatenate(partitions)
+    names = [n for n, _ in NODES]
+    assert [table.getRow(n) for n in names] == list(range(len(names)))
+    # sub tables share the path table, but only find their own rows
+    rows = list(range(1, len(names), 2))
+    subTable = table.getSubTable(rows)
+    assert subTable.paths is table.paths
+    for row, longName in enumerate(names):
+        assert subTable.getRow(longName) == (rows.index(row) if row in rows else None)
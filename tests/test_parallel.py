@@ -0,0 +1,61 @@
+
+import pytest
+
+from engine import NodeSearchEngine, StaticNodeSource
+from parallel import ParallelMatcher
+
+
+pytestmark = pytest.mark.skipif(not ParallelMatcher.isAvailable(), reason='requires multiprocessing.shared_memory')
+
+NODES = [('|{0}grp{1}|{0}{2}_{3}_ctl{1}'.format(ns, i, side, part), 'transform')
+         for ns in ('', 'char01:') for i in range(50) for side in ('L', 'R') for part in ('arm', 'leg', 'hand')]
+
+TERMS = ['arm', 'l_arm', 'ctl1', 'char01:r_hand', 'lgc', 'xyz']
+
+
+
+class RecordingParallelMatcher(ParallelMatcher):
+    """
+    A ParallelMatcher that records the terms it searched successfully
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingParallelMatcher, self).__init__(*args, **kwargs)
+        self.searchedTerms = []
+
+    def search(self, nodeTable, searchTerm, fuzzyMatching, isCancelled=None): # override
+        results = super(RecordingParallelMatcher, self).search(nodeTable, searchTerm, fuzzyMatching, isCancelled)
+        if results is not None:
+            self.searchedTerms.append(searchTerm)
+        return results
+
+
+def getResults(engine, query):
+    prepared = engine.prepare(query)
+    results = engine.search(prepared)
+    return [prepared.nodeTable.getLongName(results[i]) for i in range(len(results))]
+
+
+@pytest.fixture(scope='module')
+def parallelEngine():
+    engine = NodeSearchEngine(StaticNodeSource(NODES))
+    engine.parallelMatcher = RecordingParallelMatcher(2)
+    engine.parallelMatchingMinNodes = 1
+    engine.updateNodeTable()
+    yield engine
+    engine.close()
+
+
+@pytest.mark.parametrize('fuzzyMatching', [False, True])
+@pytest.mark.parametrize('term', TERMS)
+def test_parallel_results_match_serial_results(parallelEngine, term, fuzzyMatching):
+    serialEngine = NodeSearchEngine(StaticNodeSource(NODES))
+    serialEngine.parallelMatchingMinNodes = None
+    serialEngine.fuzzyMatching = fuzzyMatching
+    parallelEngine.fuzzyMatching = fuzzyMatching
+    # search the whole table again instead of narrowing down the last results
+    parallelEngine.clearLastSearch()
+    results = getResults(parallelEngine, term)
+    # namespace scoped searches only search their namespace, in this process
+    assert (parallelEngine.parallelMatcher.searchedTerms[-1:] == [term]) == (':' not in term)
+    assert results == getResults(serialEngine, term)
@@ -0,0 +1,45 @@
+
+from pathtable import PathTable
+
+
+NAMES = [
+    '|world',
+    '|world|char01:rig',
+    '|world|char01:rig|char01:root_jnt',
+    '|world|char01:rig|char01:root_jnt|char01:spine_jnt',
+    '|world|char02:rig',
+    '|world|char02:rig|char02:root_jnt',
+    '|other|char01:rig',
+    'lambert1',
+    'char01:lambert1',
+]
+
+
+def test_paths_are_stored_as_interned_segments():
+    table = PathTable(NAMES)
+    entries = [table.getEntry(n) for n in NAMES]
+    assert [table.getLongName(e) for e in entries] == NAMES
+    assert [table.getShortName(e) for e in entries] == [n.split('|')[-1] for n in NAMES]
+    # each parent path and each distinct segment is stored once
+    assert len(table) == len(NAMES) + 2
+    assert len(table.segments) == len(set(s for n in NAMES for s in n.split('|')))
+    assert table.add('|world|char01:rig') == entries[1]
+    assert table.getParent(entries[3]) == entries[2]
+    assert table.getParent(entries[0]) == -1
+    assert table.getParent(entries[7]) == -1
+    # the same segment under different parents has a different entry
+    assert entries[1] != entries[6]
+    assert table.getShortName(entries[1]) is table.getShortName(entries[6])
+    assert table.getEntry('|world|char03:rig') is None
+    assert table.getEntry('|other|char01:rig|char01:root_jnt') is None
+
+
+def test_memory_report():
+    # deep hierarchies repeat the same long parent paths
+    names = ['|character_main|rig_controls_grp|limb_grp{0}|offset_grp{1}|control{2}'.format(i, j, k)
+             for i in range(5) for j in range(5) for k in range(20)]
+    table = PathTable(names)
+    report = table.getMemoryReport([table.getEntry(n) for n in names])
+    assert report['numNodes'] == len(names)
+    assert report['numSegments'] == 1 + 2 + 5 + 5 + 20
+    assert report['tableBytes'] < report['listBytes']
@@ -0,0 +1,52 @@
+
+import pytest
+
+from queryparser import QueryFlagParser
+
+
+NODE_TYPES = set(['transform', 'joint', 'mesh'])
+
+
+def getParser(checkedTypes=None):
+    def isValidType(name):
+        if checkedTypes is not None:
+            checkedTypes.append(name)
+        return name in NODE_TYPES
+
+    return QueryFlagParser(
+        ['transforms', 'shapes', 'selection', 'sets'], ['type', 'exactType', 'excludeType'],
+        {'tr': 'transforms', 's': 'shapes', 'et': 'exactType', 'ext': 'excludeType'},
+        isValidType, ['namespace'])
+
+
+@pytest.mark.parametrize('flags, expected', [
+    ('-tr -type joint', {'transforms': True, 'type': ['joint']}),
+    # unique prefixes of long names
+    ('-trans -ty joint mesh', {'transforms': True, 'type': ['joint', 'mesh']}),
+    ('-na char01 char02', {'namespace': ['char01', 'char02']}),
+    # short names take precedence over prefixes
+    ('-s', {'shapes': True}),
+    ('-et joint -ext mesh', {'exactType': ['joint'], 'excludeType': ['mesh']}),
+    # ambiguous prefixes and unknown flags are ignored
+    ('-e joint -se', {}),
+    ('-ex joint -invalidFlag -tr', {'transforms': True}),
+    # invalid type names are ignored, and flags without valid values removed
+    ('-type jnt joint', {'type': ['joint']}),
+    ('-type jnt', {}),
+    # a repeated flag replaces the previous values
+    ('-type joint -type mesh', {'type': ['mesh']}),
+])
+def test_parse_flags(flags, expected):
+    assert getParser().parse(flags) == expected
+
+
+def test_parse_is_memoized():
+    checkedTypes = []
+    parser = getParser(checkedTypes)
+    # node types are only checked once a type flag is used
+    assert parser.parse('-tr -sel') == {'transforms': True, 'selection': True}
+    assert checkedTypes == []
+    result = parser.parse('-type joint mesh')
+    assert checkedTypes == ['joint', 'mesh']
+    assert parser.parse('-type joint mesh') is result
+    assert checkedTypes == ['joint', 'mesh']
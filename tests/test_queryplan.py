@@ -0,0 +1,97 @@
+
+import fnmatch
+import re
+
+import pytest
+
+from engine import NodeSearchEngine, StaticNodeSource
+from nodetable import NodeTable
+from queryplan import QueryPlan, QueryTerm
+
+
+NODES = [
+    ('|rig', 'transform'),
+    ('|rig|arm_ctl', 'transform'),
+    ('|rig|arm_ctlShape', 'nurbsCurve'),
+    ('|rig|root', 'joint'),
+    ('|rig|root|arm_jnt', 'joint'),
+    ('|char:body', 'transform'),
+    ('|char:body|char:body_ctl', 'transform'),
+    ('lambert1', 'lambert'),
+]
+
+
+@pytest.fixture
+def engine():
+    engine = NodeSearchEngine(StaticNodeSource(NODES))
+    yield engine
+    engine.close()
+
+
+def search(plan, nodeTable):
+    return sorted([nodeTable.getLongName(row) for row in plan.search(nodeTable)])
+
+
+@pytest.mark.parametrize('query', ['/x*/', '!/x*/', '/a*/ -type joint', 'ctl /x*/'])
+def test_empty_matching_regex(engine, query):
+    # a regex that matches the empty string also matches at the end of the key buffer
+    results = engine.searchMany([query])[query]
+    prepared = engine.prepare(query)
+    assert [prepared.nodeTable.getLongName(r) for r in engine.search(prepared)] == results
+
+
+def test_empty_matching_regex_scan():
+    nodeTable = NodeTable([name for name, _ in NODES])
+    plan = QueryPlan('/x*/')
+    assert search(plan, nodeTable) == sorted([name for name, _ in NODES])
+    assert search(QueryPlan('!/x*/'), nodeTable) == []
+
+
+def test_compile_terms():
+    plan = QueryPlan('Arm !FK l_*_ctl? /ik\\d+/ /[unclosed/', fuzzyMatching=True)
+    terms = dict((t.text, t) for t in plan.terms)
+    assert sorted(terms) == ['/[unclosed/', 'arm', 'fk', 'ik\\d+', 'l_*_ctl?']
+    assert terms['arm'].kind == QueryTerm.LITERAL and terms['arm'].fuzzy
+    # negated terms are never fuzzy, and only filter
+    assert terms['fk'].negated and not terms['fk'].fuzzy and not terms['fk'].isScored
+    assert terms['l_*_ctl?'].kind == QueryTerm.GLOB
+    assert terms['ik\\d+'].kind == QueryTerm.REGEX
+    # a regex that doesn't compile yet is matched literally
+    assert terms['/[unclosed/'].kind == QueryTerm.LITERAL
+    # negated terms run last
+    assert plan.terms[-1].negated
+
+
+def matchesQuery(longName, query):
+    key = longName.lower()
+    shortName = key.split('|')[-1]
+    for token in query.split():
+        negated = token.startswith('!')
+        token = token.lstrip('!')
+        if token.startswith('/'):
+            matched = re.search(token[1:-1], key, re.IGNORECASE) is not None
+        elif '*' in token or '?' in token:
+            matched = fnmatch.fnmatchcase(shortName, token.lower())
+        else:
+            matched = token.lower() in key
+        if matched == negated:
+            return False
+    return True
+
+
+@pytest.mark.parametrize('query', [
+    'arm', 'arm !fk', '!ctl', 'l_* !fk', '*_ik?_ctl', 'arm /ik[0-9]$/', '!/^\\|l_/', 'CTL !/JNT/ l_*',
+])
+@pytest.mark.parametrize('scanRatio', [1, 8, 1000])
+def test_plan_matches_every_term(query, scanRatio):
+    names = ['|{0}_grp|{0}_{1}_{2}{3}_{4}'.format(side, part, kind, i, suffix)
+             for side in ('L', 'R') for part in ('arm', 'leg') for kind in ('fk', 'ik')
+             for i in range(4) for suffix in ('ctl', 'jnt')]
+    nodeTable = NodeTable(names)
+    plan = QueryPlan(query)
+    plan.scanRatio = scanRatio
+    expected = sorted([n for n in names if matchesQuery(n, query)])
+    assert search(plan, nodeTable) == expected
+    # searching only some rows
+    rows = list(range(0, len(names), 3))
+    assert plan.search(nodeTable, rows) == [r for r in rows if matchesQuery(nodeTable.getLongName(r), query)]